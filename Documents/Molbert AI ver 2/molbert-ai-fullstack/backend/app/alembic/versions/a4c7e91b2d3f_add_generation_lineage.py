@@ -0,0 +1,47 @@
+"""Add generation lineage (parent generation and source key)
+
+Revision ID: a4c7e91b2d3f
+Revises: 8merge1a31_7c2
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "a4c7e91b2d3f"
+down_revision = "8merge1a31_7c2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "generationlog",
+        sa.Column("parent_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.add_column(
+        "generationlog",
+        sa.Column("source_key", sa.String(length=255), nullable=True),
+    )
+    op.create_index(
+        op.f("ix_generationlog_parent_id"), "generationlog", ["parent_id"]
+    )
+    op.create_foreign_key(
+        "generationlog_parent_id_fkey",
+        "generationlog",
+        "generationlog",
+        ["parent_id"],
+        ["id"],
+        ondelete="SET NULL",
+    )
+
+
+def downgrade():
+    op.drop_constraint(
+        "generationlog_parent_id_fkey", "generationlog", type_="foreignkey"
+    )
+    op.drop_index(op.f("ix_generationlog_parent_id"), table_name="generationlog")
+    op.drop_column("generationlog", "source_key")
+    op.drop_column("generationlog", "parent_id")
@@ -0,0 +1,28 @@
+"""Index generation log storage keys for lifecycle sweeps
+
+Revision ID: b8e3f6a1c2d4
+Revises: a4c7e91b2d3f
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b8e3f6a1c2d4"
+down_revision = "a4c7e91b2d3f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        op.f("ix_generationlog_file_path"), "generationlog", ["file_path"]
+    )
+    op.create_index(
+        op.f("ix_generationlog_source_key"), "generationlog", ["source_key"]
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_generationlog_source_key"), table_name="generationlog")
+    op.drop_index(op.f("ix_generationlog_file_path"), table_name="generationlog")
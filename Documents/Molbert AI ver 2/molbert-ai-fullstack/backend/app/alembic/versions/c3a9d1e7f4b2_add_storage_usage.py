@@ -0,0 +1,39 @@
+"""Add per-user storage usage counters
+
+Revision ID: c3a9d1e7f4b2
+Revises: b8e3f6a1c2d4
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "c3a9d1e7f4b2"
+down_revision = "b8e3f6a1c2d4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "storageusage",
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("objects", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index(op.f("ix_storageusage_bytes"), "storageusage", ["bytes"])
+
+
+def downgrade():
+    op.drop_index(op.f("ix_storageusage_bytes"), table_name="storageusage")
+    op.drop_table("storageusage")
@@ -0,0 +1,36 @@
+"""Record direct uploads counted in storage usage
+
+Revision ID: e5b2c8d9a1f3
+Revises: c3a9d1e7f4b2
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "e5b2c8d9a1f3"
+down_revision = "c3a9d1e7f4b2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "countedupload",
+        sa.Column("key", sa.String(length=1024), nullable=False),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("key"),
+    )
+
+
+def downgrade():
+    op.drop_table("countedupload")
@@ -0,0 +1,143 @@
+"""
+/media mount for local storage.
+
+Stored files are named with a uuid and never rewritten, so they are served as
+immutable. Single byte ranges are answered with 206 (the pinned Starlette has
+no Range support in FileResponse). With MEDIA_SENDFILE_MODE the response only
+carries X-Accel-Redirect / X-Sendfile and the reverse proxy sends the bytes.
+Flat-layout URLs (/media/<name>) keep working after the file is moved into
+its shard directory.
+"""
+
+import os
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response, StreamingResponse
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from app.core.config import settings
+from app.services.storage import shard_dir
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Inclusive (start, end) of a single "bytes=" range, clamped to the file.
+    Returns None for anything else (multiple ranges, other units, garbage,
+    last < first), in which case the whole file is sent. Raises ValueError
+    only when the range starts at or past the end of the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # suffix range: the last N bytes
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if first and last and end < start:
+        # syntactically invalid (RFC 9110 14.1.1): ignore the header
+        return None
+    if start >= size:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+async def _read_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, "rb") as file:
+        await file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await file.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class MediaFiles(StaticFiles):
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is None and os.sep not in path:
+            shard = shard_dir(path)
+            if shard:
+                return super().lookup_path(os.path.join(*shard.split("/"), path))
+        return full_path, stat_result
+
+    def file_response(
+        self,
+        full_path: str | os.PathLike[str],
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        cache_headers = {
+            "Cache-Control": f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable"
+        }
+        if settings.MEDIA_SENDFILE_MODE != "off":
+            return self._offload(full_path, cache_headers)
+
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers.update(cache_headers)
+        response.headers["Accept-Ranges"] = "bytes"
+        request_headers = Headers(scope=scope)
+        range_header = request_headers.get("range")
+        if response.status_code != 200 or not range_header:
+            return response
+        # If-Range: only honour the range if the client's copy is still current
+        if_range = request_headers.get("if-range")
+        if if_range and if_range not in {
+            response.headers.get("etag"),
+            response.headers.get("last-modified"),
+        }:
+            return response
+
+        size = stat_result.st_size
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416, headers={"Content-Range": f"bytes */{size}"}
+            )
+        if byte_range is None:
+            return response
+        start, end = byte_range
+        headers = {
+            key: value
+            for key, value in response.headers.items()
+            if key in {"etag", "last-modified", "cache-control", "accept-ranges"}
+        }
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            _read_range(str(full_path), start, end),
+            status_code=206,
+            headers=headers,
+            media_type=response.media_type,
+        )
+
+    def _offload(
+        self, full_path: str | os.PathLike[str], headers: dict[str, str]
+    ) -> Response:
+        """Empty response telling the proxy which file to send."""
+        path = Path(full_path)
+        if settings.MEDIA_SENDFILE_MODE == "x-accel-redirect":
+            relative = path.relative_to(Path(str(self.directory)).resolve()).as_posix()
+            prefix = settings.MEDIA_ACCEL_PREFIX.rstrip("/")
+            headers["X-Accel-Redirect"] = f"{prefix}/{relative}"
+        else:
+            headers["X-Sendfile"] = str(path)
+        # Content-Type comes from the proxy's own mime map for the real file
+        return Response(headers=headers)
@@ -163,7 +163,9 @@ def yookassa_webhook(
         raise HTTPException(status_code=400, detail="Некорректная сумма платежа")
 
     if amount_kopeks != payment.amount or currency != "RUB":
-        raise HTTPException(status_code=400, detail="Несовпадение суммы или валюты платежа")
+        raise HTTPException(
+            status_code=400, detail="Несовпадение суммы или валюты платежа"
+        )
 
     if plan != payment.plan or credits != payment.credits:
         raise HTTPException(
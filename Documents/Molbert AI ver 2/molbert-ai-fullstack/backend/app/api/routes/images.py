@@ -1,70 +1,121 @@
 import datetime
-
-from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException
+import logging
+import uuid
+from collections.abc import Callable
+from functools import partial
+from typing import Any
+
+import httpx
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
+from PIL import UnidentifiedImageError
 from sqlalchemy import update
-from sqlmodel import func, select
+from sqlmodel import col, func, select
 
 from app.api import deps
-from app.models import GenerationLog, GenerationPublic, ImageResult, User
-from app.services.storage import save_bytes, to_public_url
+from app.models import (
+    FilterPreset,
+    GenerationEta,
+    GenerationLog,
+    GenerationPublic,
+    ImageResult,
+    MediaCookies,
+    Message,
+    User,
+)
+from app.services.adjustments import adjust_image_sync, classify_adjustment
+from app.services.admission import AdmissionRoute, admission
+from app.services.cancellation import job_registry
+from app.services.cdn_cookies import signed_cookies
+from app.services.derivatives import GENERATION_SOURCE_PREFIX, thumbnail_url
+from app.services.eta import eta_estimator
+from app.services.image_probe import (
+    ImageInfo,
+    ProbeError,
+    closest_aspect_ratio,
+    probe_image,
+)
+from app.services.imaging import (
+    RESOLUTION_LONG_EDGE,
+    NormalizedImage,
+    normalize_upload,
+    run_in_image_pool,
+)
+from app.services.jobs import GenerationJob
+from app.services.luts import apply_preset_sync, get_presets
+from app.services.metrics import UPLOAD_SIZE
+from app.services.storage import (
+    is_remote,
+    owns_key,
+    read_bytes,
+    save_bytes,
+    storage_key,
+    to_public_url,
+)
+from app.services.storage_usage import check_quota
 from app.services.task_queue import process_generation_task
+from app.services.uploads import (
+    ALLOWED_MIME_TYPES,
+    MAX_UPLOAD_SIZE_BYTES,
+    finalize_upload,
+    is_upload_key,
+)
 from app.core.config import settings
 
-router = APIRouter(prefix="/images", tags=["images"])
-
-ALLOWED_MIME_TYPES = {"image/png", "image/jpeg", "image/webp"}
-MAX_UPLOAD_SIZE_BYTES = 10 * 1024 * 1024  # 10 MB
-
-
-RETOUCH_TEMPLATE = """You are an expert photo editor AI. Apply a localized, realistic edit to the provided image.
-User Request: "{user_prompt}"
-Edit Location: Focus around pixel coordinates (x: {x}, y: {y}).
-
-Guidelines:
-- Keep the edit natural and seamless.
-- Do not change the rest of the image outside the localized area.
-- Accept standard skin tone changes (tan, lighter, darker).
-- Refuse requests that change fundamental race/ethnicity.
-
-Return only the final edited image."""
-
-
-FILTER_TEMPLATE = """You are an expert photo editor AI. Apply a stylistic filter to the entire image.
-Filter Request: "{user_prompt}"
-
-Guidelines:
-- Adjust colors/style without changing composition.
-- Do not change a person's race/ethnicity.
+logger = logging.getLogger(__name__)
 
-Return only the final filtered image."""
+router = APIRouter(prefix="/images", tags=["images"], route_class=AdmissionRoute)
 
 
-ADJUST_TEMPLATE = """You are an expert photo editor AI. Apply a global adjustment to the image.
-Adjustment Request: "{user_prompt}"
+def generation_job_id(x_job_id: uuid.UUID | None = Header(None)) -> str:
+    """Id of the generation job; send X-Job-Id to be able to cancel it."""
+    return (x_job_id or uuid.uuid4()).hex
 
-Guidelines:
-- The whole image should be adjusted and remain photorealistic.
-- Accept standard skin tone changes (tan, lighter, darker).
-- Refuse requests that change fundamental race/ethnicity.
 
-Return only the final adjusted image."""
+OUTPUT_MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "jpg": "image/jpeg",
+    "webp": "image/webp",
+}
 
 
-COMPOSE_TEMPLATE = """You are an expert photo compositor AI. Transform or compose the provided image based on the user's creative request.
-User Request: "{user_prompt}"
+def _output_mime(output_format: str) -> str:
+    mime = OUTPUT_MIME_TYPES.get(output_format)
+    if mime is None:
+        raise HTTPException(
+            status_code=400, detail="Неподдерживаемый формат результата"
+        )
+    return mime
 
-Guidelines:
-- Creatively transform, remix, or compose the image as requested.
-- You may combine elements, change style, add artistic effects, or create variations.
-- Maintain high quality and coherent composition.
-- Be creative while respecting the user's intent.
 
-Return only the final composed image."""
+async def _render_locally(func: Callable[..., bytes], *args: Any) -> bytes:
+    """
+    Run a local filter or adjustment in the image pool. A source Pillow cannot
+    decode (or a format it cannot write) is the client's error, not a 500.
+    """
+    try:
+        return await run_in_image_pool(func, *args)
+    except (UnidentifiedImageError, OSError, ValueError) as exc:
+        logger.warning("Не удалось обработать изображение локально: %s", exc)
+        raise HTTPException(status_code=400, detail="Не удалось прочитать изображение")
 
 
-async def _validate_upload(file: UploadFile) -> bytes:
+async def _validate_upload(file: UploadFile) -> tuple[bytes, ImageInfo]:
     """
     Ensure uploaded file is a small image of an allowed type.
+    Dimensions are read from the header only, so decompression bombs are
+    rejected before any decoder touches them.
     """
     content = await file.read()
     if len(content) > MAX_UPLOAD_SIZE_BYTES:
@@ -90,178 +141,516 @@ async def _validate_upload(file: UploadFile) -> bytes:
     ):
         raise HTTPException(status_code=400, detail="Файл не похож на WebP")
 
-    return content
+    try:
+        info = probe_image(content)
+    except ProbeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if info.pixels > settings.UPLOAD_MAX_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Изображение слишком большое: {info.width}×{info.height} пикселей",
+        )
+
+    UPLOAD_SIZE.labels("multipart").observe(len(content))
+    return content, info
+
+
+def _resolve_aspect_ratio(
+    aspect_ratio: str, image: NormalizedImage | ImageInfo | None
+) -> str:
+    if aspect_ratio != "auto" or image is None or not (image.width and image.height):
+        return aspect_ratio
+    return closest_aspect_ratio(image.width, image.height)
+
+
+async def _store_source(
+    session: deps.SessionDep, file: UploadFile, current_user: User, resolution: str
+) -> tuple[str, NormalizedImage]:
+    """
+    Validate, normalize (orientation, downscale, re-encode) and store an upload.
+    Returns the storage key and the normalization result.
+    """
+    content, info = await _validate_upload(file)
+    mime = file.content_type or "image/png"
+    if settings.UPLOAD_NORMALIZE_ENABLED:
+        try:
+            image = await normalize_upload(content, mime, resolution)
+        except Exception as exc:
+            logger.warning("Не удалось нормализовать загрузку: %s", exc)
+            raise HTTPException(
+                status_code=400, detail="Не удалось прочитать изображение"
+            )
+    else:
+        image = NormalizedImage(
+            content, mime, info.width, info.height, 1.0, len(content)
+        )
+    check_quota(session, current_user, len(image.data))
+    # the storage write and the usage UPSERT both block
+    stored_path = await run_in_threadpool(
+        partial(save_bytes, prefix="source"),
+        image.data,
+        image.mime,
+        str(current_user.id),
+    )
+    logger.info(
+        "Источник %s: %s -> %s байт (сэкономлено %s) за %.0f мс",
+        file.filename,
+        image.original_size,
+        len(image.data),
+        image.bytes_saved,
+        image.seconds * 1000,
+    )
+    return storage_key(stored_path), image
+
+
+def _resolve_reference(
+    session: deps.SessionDep,
+    current_user: User,
+    source_id: uuid.UUID | None,
+    source_key: str | None,
+) -> tuple[str, uuid.UUID | None]:
+    """
+    Resolve a previous result of the user into a source key for the next step.
+    Returns the key and the id of the generation that produced it, if known.
+    """
+    if source_id is not None:
+        parent = session.get(GenerationLog, source_id)
+        if parent is None or parent.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Генерация не найдена")
+        key = parent.file_path
+        return (key if is_remote(key) else storage_key(key)), parent.id
+
+    if not source_key:
+        raise HTTPException(
+            status_code=400, detail="Загрузите файл или укажите source_id / source_key"
+        )
+    parent = session.exec(
+        select(GenerationLog)
+        .where(
+            GenerationLog.user_id == current_user.id,
+            GenerationLog.file_path == source_key,
+        )
+        .order_by(GenerationLog.created_at.desc())
+    ).first()
+    # provider URLs are only accepted when they are one of the user's results
+    if parent is None and not owns_key(source_key, str(current_user.id)):
+        raise HTTPException(status_code=404, detail="Источник не найден")
+    key = source_key if is_remote(source_key) else storage_key(source_key)
+    return key, parent.id if parent else None
+
+
+async def _referenced_source(
+    session: deps.SessionDep,
+    current_user: User,
+    source_id: uuid.UUID | None,
+    source_key: str | None,
+) -> tuple[str, ImageInfo | None, uuid.UUID | None]:
+    """
+    Like _resolve_reference; direct uploads (see /uploads) are validated
+    from their header first, which also yields their dimensions.
+    """
+    key, parent_id = _resolve_reference(session, current_user, source_id, source_key)
+    if not is_upload_key(key):
+        return key, None, parent_id
+    info, _ = await run_in_threadpool(finalize_upload, key, str(current_user.id))
+    return key, info, parent_id
+
+
+async def _resolve_source(
+    session: deps.SessionDep,
+    current_user: User,
+    file: UploadFile | None,
+    source_id: uuid.UUID | None,
+    source_key: str | None,
+    resolution: str,
+) -> tuple[str, NormalizedImage | ImageInfo | None, uuid.UUID | None]:
+    """
+    Source of a single-image step: a multipart upload, or a storage key / earlier
+    result that is passed on as-is (no upload, normalization or storage write).
+    """
+    if file is not None:
+        key, image = await _store_source(session, file, current_user, resolution)
+        return key, image, None
+    return await _referenced_source(session, current_user, source_id, source_key)
+
+
+async def _source_content(
+    session: deps.SessionDep,
+    current_user: User,
+    file: UploadFile | None,
+    source_id: uuid.UUID | None,
+    source_key: str | None,
+) -> tuple[bytes, str | None, uuid.UUID | None]:
+    """
+    Source bytes for the local engines (LUT presets, adjustments).
+    """
+    if file is not None:
+        content, _ = await _validate_upload(file)
+        return content, None, None
+    key, _, parent_id = await _referenced_source(
+        session, current_user, source_id, source_key
+    )
+    if not is_remote(key):
+        return await run_in_threadpool(read_bytes, key), key, parent_id
+    async with httpx.AsyncClient(timeout=60) as client:
+        resp = await client.get(key)
+    if resp.status_code != 200:
+        raise HTTPException(
+            status_code=502, detail="Не удалось скачать исходное изображение"
+        )
+    return resp.content, key, parent_id
 
 
 @router.post("/edit", response_model=ImageResult)
 async def edit_image(
+    request: Request,
     session: deps.SessionDep,
     prompt: str = Form(...),
     x: int = Form(...),
     y: int = Form(...),
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    source_id: uuid.UUID | None = Form(None),
+    source_key: str | None = Form(None),
     aspect_ratio: str = Form("auto"),
     output_format: str = Form("png"),
     resolution: str = Form("1K"),
+    region_crop: bool = Form(False),
+    job_id: str = Depends(generation_job_id),
     current_user: User = Depends(deps.get_current_user),
 ) -> ImageResult:
+    """
+    Localized edit around (x, y). With region_crop the worker sends only a
+    window around the point to fal and blends the result into the original.
+    Instead of a file, source_id/source_key may reference an earlier result.
+    """
     _ensure_credits_available(session, current_user)
-    image_prompt = RETOUCH_TEMPLATE.format(user_prompt=prompt, x=x, y=y)
-    content = await _validate_upload(file)
-    stored_path = save_bytes(
-        content, file.content_type or "image/png", str(current_user.id), prefix="source"
+    source_key, image, parent_id = await _resolve_source(
+        session, current_user, file, source_id, source_key, resolution
     )
-    source_url = to_public_url(stored_path)
+    if isinstance(image, NormalizedImage):
+        # x/y are in the uploaded image's pixels; follow the downscale
+        x, y = round(x * image.scale), round(y * image.scale)
     fal_url = await process_generation_task(
-        {
-            "mode": "edit",
-            "prompt": image_prompt,
-            "image_url": source_url,
-            "image_path": stored_path,
-            "aspect_ratio": aspect_ratio,
-            "output_format": output_format,
-            "resolution": resolution,
-        }
+        GenerationJob(
+            job_id=job_id,
+            mode="edit",
+            template="retouch.v1",
+            params={"user_prompt": prompt, "x": x, "y": y},
+            source_keys=[source_key],
+            aspect_ratio=_resolve_aspect_ratio(aspect_ratio, image),
+            output_format=output_format,
+            resolution=resolution,
+            owner=str(current_user.id),
+            options={"crop": True} if region_crop else {},
+        ),
+        request=request,
+    )
+    generation_id = _log_generation(
+        session,
+        current_user,
+        "edit",
+        prompt,
+        fal_url,
+        parent_id=parent_id,
+        source_key=source_key,
     )
-    _log_generation(session, current_user, "edit", prompt, fal_url)
-    return ImageResult(image_data_url="", file_url=to_public_url(fal_url))
+    return ImageResult(
+        image_data_url="", file_url=to_public_url(fal_url), generation_id=generation_id
+    )
+
+
+@router.get(
+    "/filter/presets",
+    dependencies=[Depends(deps.get_current_user)],
+    response_model=list[FilterPreset],
+)
+def list_filter_presets() -> list[FilterPreset]:
+    return [
+        FilterPreset(id=preset.id, name=preset.name, description=preset.description)
+        for preset in get_presets().values()
+    ]
 
 
 @router.post("/filter", response_model=ImageResult)
 async def filter_image(
+    request: Request,
     session: deps.SessionDep,
-    prompt: str = Form(...),
-    file: UploadFile = File(...),
+    prompt: str = Form(""),
+    file: UploadFile | None = File(None),
+    source_id: uuid.UUID | None = Form(None),
+    source_key: str | None = Form(None),
+    preset: str | None = Form(None),
+    strength: float = Form(1.0, ge=0.0, le=1.0),
     aspect_ratio: str = Form("auto"),
     output_format: str = Form("png"),
     resolution: str = Form("1K"),
+    job_id: str = Depends(generation_job_id),
     current_user: User = Depends(deps.get_current_user),
 ) -> ImageResult:
-    _ensure_credits_available(session, current_user)
-    image_prompt = FILTER_TEMPLATE.format(user_prompt=prompt)
-    content = await _validate_upload(file)
-    stored_path = save_bytes(
-        content, file.content_type or "image/png", str(current_user.id), prefix="source"
+    """
+    Stylistic filter. A catalogue preset is applied locally as a 3D LUT;
+    a free-form prompt goes to fal.
+    """
+    # presets run locally and cost nothing; only the rate limit applies
+    _ensure_credits_available(session, current_user, charged=not preset)
+    if preset:
+        if preset not in get_presets():
+            raise HTTPException(status_code=400, detail="Неизвестный пресет фильтра")
+        mime = _output_mime(output_format)
+        content, used_key, parent_id = await _source_content(
+            session, current_user, file, source_id, source_key
+        )
+        result = await _render_locally(
+            apply_preset_sync,
+            content,
+            preset,
+            strength,
+            RESOLUTION_LONG_EDGE.get(resolution, RESOLUTION_LONG_EDGE["4K"]),
+            output_format,
+        )
+        check_quota(session, current_user, len(result))
+        stored_path = await run_in_threadpool(
+            partial(save_bytes, prefix="result"), result, mime, str(current_user.id)
+        )
+        generation_id = _log_generation(
+            session,
+            current_user,
+            "filter",
+            f"preset:{preset}",
+            storage_key(stored_path),
+            cost=0,
+            parent_id=parent_id,
+            source_key=used_key,
+        )
+        return ImageResult(
+            image_data_url="",
+            file_url=to_public_url(stored_path),
+            generation_id=generation_id,
+        )
+
+    if not prompt.strip():
+        raise HTTPException(status_code=400, detail="Укажите prompt или preset")
+    source_key, image, parent_id = await _resolve_source(
+        session, current_user, file, source_id, source_key, resolution
     )
-    source_url = to_public_url(stored_path)
     fal_url = await process_generation_task(
-        {
-            "mode": "filter",
-            "prompt": image_prompt,
-            "image_url": source_url,
-            "image_path": stored_path,
-            "aspect_ratio": aspect_ratio,
-            "output_format": output_format,
-            "resolution": resolution,
-        }
+        GenerationJob(
+            job_id=job_id,
+            mode="filter",
+            template="filter.v1",
+            params={"user_prompt": prompt},
+            source_keys=[source_key],
+            aspect_ratio=_resolve_aspect_ratio(aspect_ratio, image),
+            output_format=output_format,
+            resolution=resolution,
+            owner=str(current_user.id),
+        ),
+        request=request,
+    )
+    generation_id = _log_generation(
+        session,
+        current_user,
+        "filter",
+        prompt,
+        fal_url,
+        parent_id=parent_id,
+        source_key=source_key,
+    )
+    return ImageResult(
+        image_data_url="", file_url=to_public_url(fal_url), generation_id=generation_id
     )
-    _log_generation(session, current_user, "filter", prompt, fal_url)
-    return ImageResult(image_data_url="", file_url=to_public_url(fal_url))
 
 
 @router.post("/adjust", response_model=ImageResult)
 async def adjust_image(
+    request: Request,
     session: deps.SessionDep,
     prompt: str = Form(...),
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    source_id: uuid.UUID | None = Form(None),
+    source_key: str | None = Form(None),
     aspect_ratio: str = Form("auto"),
     output_format: str = Form("png"),
     resolution: str = Form("1K"),
+    job_id: str = Depends(generation_job_id),
     current_user: User = Depends(deps.get_current_user),
 ) -> ImageResult:
-    _ensure_credits_available(session, current_user)
-    image_prompt = ADJUST_TEMPLATE.format(user_prompt=prompt)
-    content = await _validate_upload(file)
-    stored_path = save_bytes(
-        content, file.content_type or "image/png", str(current_user.id), prefix="source"
+    """
+    Global adjustment. Plain requests (brighter, warmer, more contrast, ...)
+    are applied locally with NumPy; anything else goes to fal.
+    """
+    plan = classify_adjustment(prompt) if settings.LOCAL_ADJUST_ENABLED else None
+    _ensure_credits_available(session, current_user, charged=plan is None)
+    if plan is not None:
+        mime = _output_mime(output_format)
+        content, used_key, parent_id = await _source_content(
+            session, current_user, file, source_id, source_key
+        )
+        result = await _render_locally(
+            adjust_image_sync,
+            content,
+            plan,
+            RESOLUTION_LONG_EDGE.get(resolution, RESOLUTION_LONG_EDGE["4K"]),
+            output_format,
+        )
+        check_quota(session, current_user, len(result))
+        stored_path = await run_in_threadpool(
+            partial(save_bytes, prefix="result"), result, mime, str(current_user.id)
+        )
+        logger.info("Локальная коррекция %s для %s", plan, current_user.id)
+        generation_id = _log_generation(
+            session,
+            current_user,
+            "adjust",
+            prompt,
+            storage_key(stored_path),
+            cost=0,
+            parent_id=parent_id,
+            source_key=used_key,
+        )
+        return ImageResult(
+            image_data_url="",
+            file_url=to_public_url(stored_path),
+            generation_id=generation_id,
+        )
+
+    source_key, image, parent_id = await _resolve_source(
+        session, current_user, file, source_id, source_key, resolution
     )
-    source_url = to_public_url(stored_path)
     fal_url = await process_generation_task(
-        {
-            "mode": "adjust",
-            "prompt": image_prompt,
-            "image_url": source_url,
-            "image_path": stored_path,
-            "aspect_ratio": aspect_ratio,
-            "output_format": output_format,
-            "resolution": resolution,
-        }
+        GenerationJob(
+            job_id=job_id,
+            mode="adjust",
+            template="adjust.v1",
+            params={"user_prompt": prompt},
+            source_keys=[source_key],
+            aspect_ratio=_resolve_aspect_ratio(aspect_ratio, image),
+            output_format=output_format,
+            resolution=resolution,
+            owner=str(current_user.id),
+        ),
+        request=request,
+    )
+    generation_id = _log_generation(
+        session,
+        current_user,
+        "adjust",
+        prompt,
+        fal_url,
+        parent_id=parent_id,
+        source_key=source_key,
+    )
+    return ImageResult(
+        image_data_url="", file_url=to_public_url(fal_url), generation_id=generation_id
     )
-    _log_generation(session, current_user, "adjust", prompt, fal_url)
-    return ImageResult(image_data_url="", file_url=to_public_url(fal_url))
 
 
 @router.post("/compose", response_model=ImageResult)
 async def compose_image(
+    request: Request,
     session: deps.SessionDep,
     prompt: str = Form(...),
-    files: list[UploadFile] = File(...),
+    files: list[UploadFile] | None = File(None),
+    source_keys: list[str] | None = Form(None),
     aspect_ratio: str = Form("auto"),
     output_format: str = Form("png"),
     resolution: str = Form("1K"),
+    job_id: str = Depends(generation_job_id),
     current_user: User = Depends(deps.get_current_user),
 ) -> ImageResult:
+    """
+    Compose up to 10 images, given as multipart files and/or storage keys
+    (direct uploads, earlier results); files come first.
+    """
     _ensure_credits_available(session, current_user)
 
-    if not files:
-        raise HTTPException(status_code=400, detail="Необходимо загрузить хотя бы одно изображение")
+    files = files or []
+    references = source_keys or []
+    if not files and not references:
+        raise HTTPException(
+            status_code=400, detail="Необходимо загрузить хотя бы одно изображение"
+        )
 
     # Validate and store all files
-    stored_paths: list[str] = []
-    source_urls: list[str] = []
+    keys: list[str] = []
+    images: list[NormalizedImage | ImageInfo | None] = []
 
     for file in files[:10]:  # Limit to 10 images
-        content = await _validate_upload(file)
-        stored_path = save_bytes(
-            content, file.content_type or "image/png", str(current_user.id), prefix="source"
-        )
-        stored_paths.append(stored_path)
-        source_urls.append(to_public_url(stored_path))
+        source_key, image = await _store_source(session, file, current_user, resolution)
+        keys.append(source_key)
+        images.append(image)
         # Reset file position for potential re-read
         await file.seek(0)
-
-    image_prompt = COMPOSE_TEMPLATE.format(user_prompt=prompt)
+    for reference in references[: 10 - len(keys)]:
+        source_key, info, _ = await _referenced_source(
+            session, current_user, None, reference
+        )
+        keys.append(source_key)
+        images.append(info)
 
     fal_url = await process_generation_task(
-        {
-            "mode": "compose",
-            "prompt": image_prompt,
-            "image_urls": source_urls,  # List of URLs for multiple images
-            "image_url": source_urls[0],  # Primary image for fallback
-            "image_path": stored_paths[0],
-            "aspect_ratio": aspect_ratio,
-            "output_format": output_format,
-            "resolution": resolution,
-        }
+        GenerationJob(
+            job_id=job_id,
+            mode="compose",
+            template="compose.v1",
+            params={"user_prompt": prompt},
+            source_keys=keys,
+            # the primary (first) image decides the output shape
+            aspect_ratio=_resolve_aspect_ratio(aspect_ratio, images[0]),
+            output_format=output_format,
+            resolution=resolution,
+            owner=str(current_user.id),
+        ),
+        request=request,
+    )
+    generation_id = _log_generation(session, current_user, "compose", prompt, fal_url)
+    return ImageResult(
+        image_data_url="", file_url=to_public_url(fal_url), generation_id=generation_id
     )
-    _log_generation(session, current_user, "compose", prompt, fal_url)
-    return ImageResult(image_data_url="", file_url=to_public_url(fal_url))
 
 
 @router.post("/text-to-image", response_model=ImageResult)
 async def text_to_image(
+    request: Request,
     session: deps.SessionDep,
     prompt: str = Form(...),
     aspect_ratio: str = Form("1:1"),
     resolution: str = Form("1K"),
     output_format: str = Form("png"),
+    job_id: str = Depends(generation_job_id),
     current_user: User = Depends(deps.get_current_user),
 ) -> ImageResult:
     _ensure_credits_available(session, current_user)
     fal_url = await process_generation_task(
-        {
-            "mode": "text-to-image",
-            "prompt": prompt,
-            "aspect_ratio": aspect_ratio,
-            "output_format": output_format,
-            "resolution": resolution,
-        }
+        GenerationJob(
+            job_id=job_id,
+            mode="text-to-image",
+            template="plain.v1",
+            params={"user_prompt": prompt},
+            aspect_ratio=aspect_ratio,
+            output_format=output_format,
+            resolution=resolution,
+            owner=str(current_user.id),
+        ),
+        request=request,
+    )
+    generation_id = _log_generation(
+        session, current_user, "text-to-image", prompt, fal_url
+    )
+    return ImageResult(
+        image_data_url="", file_url=to_public_url(fal_url), generation_id=generation_id
     )
-    _log_generation(session, current_user, "text-to-image", prompt, fal_url)
-    return ImageResult(image_data_url="", file_url=to_public_url(fal_url))
 
 
-def _ensure_credits_available(session: deps.SessionDep, current_user: User) -> None:
+def _ensure_credits_available(
+    session: deps.SessionDep, current_user: User, *, charged: bool = True
+) -> None:
+    """
+    Quota, rate limit and, for charged generations, the free daily allowance
+    or the paid balance. Free local work (cost=0) never uses up credits.
+    """
+    # every generation stores a result; its size is unknown until it is done
+    check_quota(session, current_user, 0)
     # В локальной среде не ограничиваем, чтобы не мешать тестам UI
     if settings.ENVIRONMENT == "local":
         return
@@ -288,6 +677,8 @@ def _ensure_credits_available(session: deps.SessionDep, current_user: User) -> N
             detail="Слишком много запросов. Попробуйте через минуту.",
         )
 
+    if not charged:
+        return
     if current_user.plan == "free":
         stmt = (
             select(func.count())
@@ -296,6 +687,7 @@ def _ensure_credits_available(session: deps.SessionDep, current_user: User) -> N
                 GenerationLog.user_id == current_user.id,
                 GenerationLog.created_at >= today_start,
                 GenerationLog.created_at < today_end,
+                col(GenerationLog.cost) > 0,
             )
         )
         used_today = session.exec(stmt).one()
@@ -318,8 +710,12 @@ def _log_generation(
     mode: str,
     prompt: str,
     file_path: str,
-) -> None:
-    if not current_user.is_superuser and current_user.plan != "free":
+    *,
+    cost: int = 1,
+    parent_id: uuid.UUID | None = None,
+    source_key: str | None = None,
+) -> uuid.UUID:
+    if cost and not current_user.is_superuser and current_user.plan != "free":
         stmt = (
             update(User)
             .where(User.id == current_user.id, User.credits_balance > 0)
@@ -339,10 +735,13 @@ def _log_generation(
         mode=mode,
         prompt=prompt[:255],
         file_path=file_path,
-        cost=1,
+        cost=cost,
+        parent_id=parent_id,
+        source_key=source_key,
     )
     session.add(log_entry)
     session.commit()
+    return log_entry.id
 
 
 @router.get("/history", response_model=list[GenerationPublic])
@@ -367,6 +766,88 @@ def list_history(
             prompt=log.prompt,
             file_url=to_public_url(log.file_path),
             created_at=log.created_at,
+            parent_id=log.parent_id,
+            thumbnail_url=thumbnail_url(
+                f"{GENERATION_SOURCE_PREFIX}{log.id}"
+                if is_remote(log.file_path)
+                else storage_key(log.file_path)
+            ),
         )
         for log in logs
     ]
+
+
+@router.get(
+    "/eta",
+    dependencies=[Depends(deps.get_current_user)],
+    response_model=GenerationEta,
+)
+async def estimate_generation(
+    mode: str = "edit", resolution: str = "1K"
+) -> GenerationEta:
+    """
+    Estimated start/completion time for a job submitted right now.
+    """
+    estimate = eta_estimator.estimate(
+        mode, resolution, queue_wait=await admission.queue_wait()
+    )
+    return GenerationEta(
+        mode=mode,
+        resolution=resolution,
+        queue_wait_seconds=round(estimate.queue_wait_seconds, 1),
+        service_seconds=round(estimate.service_seconds, 1),
+        estimated_start_at=estimate.estimated_start_at,
+        estimated_completion_at=estimate.estimated_completion_at,
+    )
+
+
+@router.get(
+    "/eta/report",
+    dependencies=[Depends(deps.get_current_active_superuser)],
+)
+def eta_report() -> dict[str, Any]:
+    """
+    Service-time histograms and prediction error of the ETA estimator (this process).
+    """
+    return eta_estimator.report()
+
+
+@router.delete("/jobs/{job_id}", status_code=202, response_model=Message)
+async def cancel_job(
+    job_id: uuid.UUID, current_user: User = Depends(deps.get_current_user)
+) -> Message:
+    """
+    Cancel a running or queued job started with this X-Job-Id. Nothing is
+    charged for a cancelled job.
+    """
+    requested_by = None if current_user.is_superuser else str(current_user.id)
+    await job_registry.cancel(job_id.hex, requested_by)
+    return Message(message="Задание отменяется")
+
+
+@router.get("/media-cookies", response_model=MediaCookies)
+def issue_media_cookies(
+    response: Response, current_user: User = Depends(deps.get_current_user)
+) -> MediaCookies:
+    """
+    Signed CDN cookies granting read access to all of the user's objects,
+    for S3_URL_MODE="signed-cookies" (one request instead of a signed URL each).
+    """
+    if settings.S3_URL_MODE != "signed-cookies":
+        raise HTTPException(
+            status_code=404, detail="Подписанные cookie не используются"
+        )
+    cookies, expires = signed_cookies(str(current_user.id))
+    for name, value in cookies.items():
+        response.set_cookie(
+            name,
+            value,
+            max_age=settings.CDN_COOKIE_TTL,
+            domain=settings.CDN_COOKIE_DOMAIN,
+            secure=True,
+            httponly=True,
+            samesite="none",
+        )
+    return MediaCookies(
+        expires_at=datetime.datetime.fromtimestamp(expires, datetime.timezone.utc)
+    )
@@ -0,0 +1,135 @@
+import hashlib
+import uuid
+
+import httpx
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from app.api import deps
+from app.core.config import settings
+from app.models import GenerationLog
+from app.services.derivatives import (
+    DERIVATIVE_MIME,
+    DERIVED_PREFIX,
+    GENERATION_SOURCE_PREFIX,
+    derivative_cache,
+    derivative_key,
+    negotiate_format,
+    parse_size,
+    resize_sync,
+    verify_derivative,
+)
+from app.services.imaging import run_in_image_pool
+from app.services.storage import is_remote, read_bytes, stat_key, storage_key
+
+# Served outside /api/v1, next to the /media mount of local storage
+router = APIRouter(prefix="/media", tags=["media"])
+
+MAX_SOURCE_BYTES = 50 * 1024 * 1024
+SOURCE_TOO_LARGE = "Исходное изображение слишком большое"
+
+
+def _read_stored(key: str) -> bytes:
+    """Blocking; the size comes from a stat/HEAD, before any bytes are read."""
+    if stat_key(key).size > MAX_SOURCE_BYTES:
+        raise HTTPException(status_code=413, detail=SOURCE_TOO_LARGE)
+    return read_bytes(key)
+
+
+async def _download(url: str) -> bytes:
+    """Provider-hosted result, refused by Content-Length or while streaming."""
+    async with httpx.AsyncClient(timeout=60, follow_redirects=True) as client:
+        async with client.stream("GET", url) as resp:
+            if resp.status_code != 200:
+                raise HTTPException(
+                    status_code=502, detail="Не удалось получить изображение"
+                )
+            length = resp.headers.get("content-length")
+            if length is not None and int(length) > MAX_SOURCE_BYTES:
+                raise HTTPException(status_code=413, detail=SOURCE_TOO_LARGE)
+            chunks: list[bytes] = []
+            received = 0
+            async for chunk in resp.aiter_bytes():
+                received += len(chunk)
+                if received > MAX_SOURCE_BYTES:
+                    raise HTTPException(status_code=413, detail=SOURCE_TOO_LARGE)
+                chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def _load_source(session: deps.SessionDep, key: str) -> bytes:
+    """
+    Bytes of a storage key, or of a generation result referenced as
+    ``generation/<id>`` (results kept at the provider have no storage key).
+    """
+    if key.startswith(f"{DERIVED_PREFIX}/"):
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    if not key.startswith(GENERATION_SOURCE_PREFIX):
+        return await run_in_threadpool(_read_stored, key)
+
+    try:
+        generation_id = uuid.UUID(key.removeprefix(GENERATION_SOURCE_PREFIX))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    log = session.get(GenerationLog, generation_id)
+    if log is None:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    if not is_remote(log.file_path):
+        return await run_in_threadpool(_read_stored, storage_key(log.file_path))
+    return await _download(log.file_path)
+
+
+@router.get("/resize/{size}/{key:path}")
+async def resize_media(
+    session: deps.SessionDep,
+    request: Request,
+    size: str,
+    key: str,
+    expires: int,
+    sig: str,
+) -> Response:
+    """
+    WebP/AVIF derivative of a stored image, fitted into one of the configured
+    sizes. Derivatives are cached in storage and served with a strong ETag.
+    Only URLs signed by the API (thumbnail_url) are served: <img> tags send
+    no bearer token, and the key alone must not grant access.
+    """
+    verify_derivative(size, key, expires, sig)
+    width, height = parse_size(size)
+    fmt = negotiate_format(request.headers.get("accept", ""))
+    derived = derivative_key(key, width, height, fmt)
+
+    data = await run_in_threadpool(derivative_cache.get, derived)
+    if data is None:
+        source = await _load_source(session, key)
+        try:
+            data = await run_in_image_pool(
+                resize_sync,
+                source,
+                width,
+                height,
+                fmt,
+                settings.MEDIA_DERIVATIVE_QUALITY,
+            )
+        except Exception:
+            raise HTTPException(
+                status_code=415, detail="Не удалось обработать изображение"
+            )
+        await run_in_threadpool(
+            derivative_cache.put, derived, data, DERIVATIVE_MIME[fmt]
+        )
+
+    etag = f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+    headers = {
+        "ETag": etag,
+        # sources are immutable (uuid keys), so are their derivatives; shared
+        # caches only get them when the sources are public too
+        "Cache-Control": (
+            f"{'public' if settings.S3_URL_MODE == 'public' else 'private'}, "
+            "max-age=31536000, immutable"
+        ),
+        "Vary": "Accept",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=DERIVATIVE_MIME[fmt], headers=headers)
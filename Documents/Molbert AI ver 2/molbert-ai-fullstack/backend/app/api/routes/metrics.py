@@ -0,0 +1,23 @@
+import secrets
+
+from fastapi import APIRouter, Header, HTTPException, Response
+
+from app.core.config import settings
+from app.services.metrics import render
+
+# Served outside /api/v1, where Prometheus expects it
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(authorization: str | None = Header(None)) -> Response:
+    """
+    Prometheus exposition of all API processes. Protected by METRICS_TOKEN
+    (sent as a bearer token), which settings require outside local.
+    """
+    if settings.METRICS_TOKEN and not secrets.compare_digest(
+        authorization or "", f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    body, content_type = render()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,115 @@
+import os
+import uuid
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+from app.api import deps
+from app.models import (
+    Message,
+    UploadedImage,
+    UploadFinalize,
+    UploadIntent,
+    UploadIntentCreate,
+    User,
+)
+from app.services.storage import local_path
+from app.services.storage_usage import check_quota
+from app.services.uploads import (
+    create_intent,
+    finalize_upload,
+    is_upload_key,
+    verify_local_upload,
+)
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+
+@router.post("/intent", response_model=UploadIntent)
+def create_upload_intent(
+    session: deps.SessionDep,
+    body: UploadIntentCreate,
+    current_user: User = Depends(deps.get_current_user),
+) -> UploadIntent:
+    """
+    Where to send an image directly: a presigned S3 POST/PUT, or a signed
+    backend URL for local storage. Finalize the returned key afterwards.
+    """
+    check_quota(session, current_user, body.size)
+    return create_intent(
+        str(current_user.id), body.content_type, body.size, body.method
+    )
+
+
+@router.put("/local/{key:path}", response_model=Message)
+async def upload_local(
+    key: str,
+    request: Request,
+    mime: str,
+    size: int,
+    expires: int,
+    sig: str,
+) -> Message:
+    """
+    Signed local-storage equivalent of a presigned PUT. The body is streamed
+    to disk and must match the signed size and content type. Like the S3
+    PUT (If-None-Match: *), it only creates the file: once uploaded, the
+    signed URL cannot overwrite it.
+    """
+    verify_local_upload(key, mime, size, expires, sig)
+    if request.headers.get("content-type") != mime or not is_upload_key(key):
+        raise HTTPException(status_code=400, detail="Неверный тип содержимого")
+    target = local_path(key)
+    if target is None:
+        raise HTTPException(status_code=404, detail="Локальная загрузка недоступна")
+
+    path = Path(target)
+    if path.exists():
+        raise HTTPException(status_code=409, detail="Файл уже загружен")
+    # new keys live in shard directories ("ab/cd/...") that may not exist yet
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    received = 0
+    try:
+        with open(tmp, "wb") as f:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > size:
+                    raise HTTPException(
+                        status_code=413, detail="Размер не совпадает с заявленным"
+                    )
+                await run_in_threadpool(f.write, chunk)
+        if received != size:
+            raise HTTPException(
+                status_code=400, detail="Размер не совпадает с заявленным"
+            )
+        try:
+            # unlike rename, a link never replaces an existing file
+            os.link(tmp, path)
+        except FileExistsError:
+            raise HTTPException(status_code=409, detail="Файл уже загружен")
+    finally:
+        tmp.unlink(missing_ok=True)
+    return Message(message="Загружено")
+
+
+@router.post("/finalize", response_model=UploadedImage)
+async def finalize(
+    body: UploadFinalize,
+    current_user: User = Depends(deps.get_current_user),
+) -> UploadedImage:
+    """
+    Validate a direct upload (size, magic bytes, dimensions) from a ranged read
+    of its header. The key can then be passed as source_key / source_keys.
+    """
+    info, size = await run_in_threadpool(
+        finalize_upload, body.key, str(current_user.id)
+    )
+    return UploadedImage(
+        key=body.key,
+        format=info.format,
+        width=info.width,
+        height=info.height,
+        size=size,
+    )
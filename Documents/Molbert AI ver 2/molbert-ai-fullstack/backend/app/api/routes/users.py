@@ -2,7 +2,7 @@ import uuid
 import datetime
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlmodel import col, delete, func, select
 
 from app import crud
@@ -28,6 +28,9 @@ from app.models import (
     GenerationLog,
     UsageInfo,
 )
+from app.services.admission import admission
+from app.services.eta import eta_estimator
+from app.services.lifecycle import purge_user_files, user_storage_refs
 from app.utils import generate_new_account_email, send_email
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -167,6 +170,10 @@ def read_usage(session: SessionDep, current_user: CurrentUser) -> UsageInfo:
         free_daily_used = session.exec(stmt).one()
         free_daily_remaining = max(free_daily_limit - free_daily_used, 0)
 
+    # no mode here: the average job, behind the last probed queue depth
+    estimate = eta_estimator.estimate(
+        None, "", queue_wait=admission.cached_queue_wait()
+    )
     return UsageInfo(
         plan=current_user.plan,
         credits_balance=current_user.credits_balance,
@@ -175,11 +182,15 @@ def read_usage(session: SessionDep, current_user: CurrentUser) -> UsageInfo:
         free_daily_remaining=free_daily_remaining,
         rate_limit_per_minute=settings.RATE_LIMIT_PER_MINUTE,
         used_last_minute=used_last_minute,
+        estimated_start_at=estimate.estimated_start_at,
+        estimated_completion_at=estimate.estimated_completion_at,
     )
 
 
 @router.delete("/me", response_model=Message)
-def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+def delete_user_me(
+    session: SessionDep, current_user: CurrentUser, background_tasks: BackgroundTasks
+) -> Any:
     """
     Delete own user.
     """
@@ -187,8 +198,13 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
+    user_id = current_user.id
+    refs = user_storage_refs(session, user_id)
+    statement = delete(GenerationLog).where(col(GenerationLog.user_id) == user_id)
+    session.exec(statement)  # type: ignore
     session.delete(current_user)
     session.commit()
+    background_tasks.add_task(purge_user_files, str(user_id), refs)
     return Message(message="User deleted successfully")
 
 
@@ -274,7 +290,10 @@ def update_user(
 
 @router.delete("/{user_id}", dependencies=[Depends(get_current_active_superuser)])
 def delete_user(
-    session: SessionDep, current_user: CurrentUser, user_id: uuid.UUID
+    session: SessionDep,
+    current_user: CurrentUser,
+    user_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
 ) -> Message:
     """
     Delete a user.
@@ -286,8 +305,12 @@ def delete_user(
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
+    refs = user_storage_refs(session, user_id)
     statement = delete(Item).where(col(Item.owner_id) == user_id)
     session.exec(statement)  # type: ignore
+    statement = delete(GenerationLog).where(col(GenerationLog.user_id) == user_id)
+    session.exec(statement)  # type: ignore
     session.delete(user)
     session.commit()
+    background_tasks.add_task(purge_user_files, str(user_id), refs)
     return Message(message="User deleted successfully")
@@ -1,8 +1,18 @@
-from fastapi import APIRouter, Depends
+from typing import Any
+
+from fastapi import APIRouter, BackgroundTasks, Depends
 from pydantic.networks import EmailStr
+from sqlmodel import Session
 
-from app.api.deps import get_current_active_superuser
-from app.models import Message
+from app.api.deps import SessionDep, get_current_active_superuser
+from app.core.db import engine
+from app.models import Message, StorageUsagesPublic
+from app.services.broker_connection import broker_supervisor
+from app.services.cancellation import job_registry
+from app.services.lifecycle import reconcile_usage
+from app.services.source_cache import worker_cache_report
+from app.services.storage import storage_status
+from app.services.storage_usage import top_consumers
 from app.utils import generate_test_email, send_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -29,3 +39,68 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get(
+    "/broker-status/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def broker_status() -> dict[str, Any]:
+    """
+    RabbitMQ connection state, flap counters, publish/RPC latency and the
+    source cache hit ratio reported by workers.
+    """
+    return {**broker_supervisor.status(), "source_cache": worker_cache_report()}
+
+
+@router.get(
+    "/generation-cancellations/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def generation_cancellations() -> dict[str, Any]:
+    """
+    Jobs cancelled by a client disconnect or a DELETE (this process), and the
+    estimated provider time that was not spent on them.
+    """
+    return job_registry.stats.report()
+
+
+@router.get(
+    "/storage-status/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def storage_status_route() -> dict[str, Any]:
+    """
+    Storage backend and per-operation latency (save/read/put/stat/...).
+    """
+    return storage_status()
+
+
+@router.get(
+    "/storage-usage/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=StorageUsagesPublic,
+)
+def storage_usage(session: SessionDep, limit: int = 20) -> StorageUsagesPublic:
+    """
+    Top storage consumers by bytes, from the incrementally kept counters.
+    """
+    return top_consumers(session, min(limit, 1000))
+
+
+def _reconcile_in_background() -> None:
+    with Session(engine) as session:
+        reconcile_usage(session)
+
+
+@router.post(
+    "/storage-usage/reconcile/",
+    dependencies=[Depends(get_current_active_superuser)],
+    status_code=202,
+)
+def reconcile_storage_usage(background_tasks: BackgroundTasks) -> Message:
+    """
+    Recount usage from a full storage listing, in the background.
+    """
+    background_tasks.add_task(_reconcile_in_background)
+    return Message(message="Пересчёт запущен")
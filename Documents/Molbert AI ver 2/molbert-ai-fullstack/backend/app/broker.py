@@ -2,4 +2,7 @@ from faststream.rabbit import RabbitBroker
 
 from app.core.config import settings
 
+GENERATION_QUEUE = "generation"
+GENERATION_DLQ = "generation.dlq"
+
 broker = RabbitBroker(str(settings.RABBIT_URL))
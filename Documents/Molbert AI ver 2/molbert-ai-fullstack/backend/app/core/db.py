@@ -1,10 +1,26 @@
+import time
+
+from sqlalchemy.pool import ConnectionPoolEntry, QueuePool
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
 from app.models import User, UserCreate
+from app.services.metrics import DB_POOL_CHECKOUT
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool reporting how long a checkout waits (including a new connect)."""
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT.observe(time.perf_counter() - started)
+
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI), poolclass=TimedQueuePool)
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
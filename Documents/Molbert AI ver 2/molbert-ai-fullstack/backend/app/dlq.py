@@ -0,0 +1,150 @@
+"""
+Inspect and replay dead-lettered generation jobs.
+
+    python -m app.dlq inspect [--limit 100]
+    python -m app.dlq replay [--limit 100] [--mode edit] [--code 429] --force
+
+Replay is an operator tool, not a recovery path for users: the API request
+that queued the job has long given up, so a replayed job runs with no
+reply_to and writes no generation log. The provider is paid, but the result
+reaches nobody's history and is not billed. Without --force, replay only
+lists what it would resend.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from typing import Any
+
+from aio_pika.abc import AbstractIncomingMessage
+
+from app.broker import GENERATION_QUEUE, broker
+from app.services.job_retry import (
+    ATTEMPT_HEADER,
+    ERROR_CODE_HEADER,
+    ERROR_DETAIL_HEADER,
+    FAILED_AT_HEADER,
+    dead_letter_queue,
+)
+from app.services.jobs import job_id, job_mode, job_owner
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def _fetch(limit: int) -> list[AbstractIncomingMessage]:
+    """
+    Pull up to ``limit`` messages without acking them.
+    They stay unacked until the caller acks/nacks, so the loop never sees
+    the same message twice.
+    """
+    queue = await broker.declare_queue(dead_letter_queue)
+    messages: list[AbstractIncomingMessage] = []
+    while len(messages) < limit:
+        message = await queue.get(no_ack=False, fail=False)
+        if message is None:
+            break
+        messages.append(message)
+    return messages
+
+
+def _summary(message: AbstractIncomingMessage) -> dict[str, Any]:
+    headers = message.headers or {}
+    try:
+        payload = json.loads(message.body)
+    except ValueError:
+        payload = {}
+    if not isinstance(payload, dict):
+        payload = {}
+    # v1 and compact v2 messages name the fields differently
+    return {
+        "correlation_id": message.correlation_id,
+        "job_id": job_id(payload),
+        "owner": job_owner(payload),
+        "mode": job_mode(payload) or None,
+        "attempts": headers.get(ATTEMPT_HEADER),
+        "code": headers.get(ERROR_CODE_HEADER),
+        "detail": headers.get(ERROR_DETAIL_HEADER),
+        "failed_at": headers.get(FAILED_AT_HEADER),
+    }
+
+
+def _matches(summary: dict[str, Any], mode: str | None, code: int | None) -> bool:
+    if mode and summary["mode"] != mode:
+        return False
+    if code is not None and summary["code"] != code:
+        return False
+    return True
+
+
+async def inspect(limit: int) -> None:
+    messages = await _fetch(limit)
+    for message in messages:
+        sys.stdout.write(json.dumps(_summary(message), ensure_ascii=False) + "\n")
+    for message in messages:
+        await message.nack(requeue=True)
+    logger.info("В DLQ просмотрено сообщений: %s", len(messages))
+
+
+async def replay(limit: int, mode: str | None, code: int | None, force: bool) -> None:
+    messages = await _fetch(limit)
+    replayed = 0
+    for message in messages:
+        summary = _summary(message)
+        if not _matches(summary, mode, code):
+            await message.nack(requeue=True)
+            continue
+        if not force:
+            sys.stdout.write(json.dumps(summary, ensure_ascii=False) + "\n")
+            await message.nack(requeue=True)
+            replayed += 1
+            continue
+        # Fresh retry budget; the original caller is long gone, so no reply_to
+        await broker.publish(
+            json.loads(message.body),
+            queue=GENERATION_QUEUE,
+            headers={"x-replayed-from": dead_letter_queue.name},
+            correlation_id=message.correlation_id,
+            persist=True,
+        )
+        await message.ack()
+        replayed += 1
+    if force:
+        logger.info("Из DLQ повторно отправлено заданий: %s", replayed)
+    else:
+        logger.info(
+            "Будет повторно отправлено заданий: %s. Результаты не попадут в "
+            "историю пользователей; для отправки добавьте --force",
+            replayed,
+        )
+
+
+async def _run(args: argparse.Namespace) -> None:
+    await broker.connect()
+    try:
+        if args.command == "inspect":
+            await inspect(args.limit)
+        else:
+            await replay(args.limit, args.mode, args.code, args.force)
+    finally:
+        await broker.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dead-letter queue tooling")
+    parser.add_argument("command", choices=["inspect", "replay"])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--mode", default=None)
+    parser.add_argument("--code", type=int, default=None)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="really resend; replayed results reach no user and are not billed",
+    )
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
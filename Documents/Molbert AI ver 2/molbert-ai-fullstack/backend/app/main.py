@@ -2,13 +2,18 @@ import sentry_sdk
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
-from fastapi.staticfiles import StaticFiles
 from starlette.middleware.cors import CORSMiddleware
 import logging
 
 from app.api.main import api_router
+from app.api.media_files import MediaFiles
+from app.api.routes import media, metrics
 from app.core.config import settings
 from app.broker import broker
+from app.services.admission import admission
+from app.services.broker_connection import broker_supervisor
+from app.services.imaging import shutdown_image_pool
+from app.services.metrics import MetricsMiddleware
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -26,10 +31,14 @@ app = FastAPI(
     generate_unique_id_function=custom_generate_unique_id,
 )
 
+# registered before the /media mount so the mount does not shadow it
+app.include_router(media.router)
+app.include_router(metrics.router)
+
 if settings.STORAGE_BACKEND == "local":
     storage_dir = Path(settings.STORAGE_PATH).resolve()
     storage_dir.mkdir(parents=True, exist_ok=True)
-    app.mount("/media", StaticFiles(directory=storage_dir), name="media")
+    app.mount("/media", MediaFiles(directory=storage_dir), name="media")
 
 # Set all CORS enabled origins
 if settings.all_cors_origins:
@@ -41,23 +50,29 @@ if settings.all_cors_origins:
         allow_headers=["*"],
     )
 
+# outermost, so the latency includes the other middleware
+app.add_middleware(MetricsMiddleware)
+
 
 @app.on_event("startup")
 async def connect_broker() -> None:
-    try:
-        await broker.connect()
-        logger.info("RabbitMQ broker connected")
-    except Exception as exc:  # pragma: no cover - defensive
-        logger.warning("Не удалось подключиться к RabbitMQ на старте: %s", exc)
+    # Connects in the background and keeps retrying with backoff
+    await broker_supervisor.start()
 
 
 @app.on_event("shutdown")
 async def disconnect_broker() -> None:
     try:
+        await broker_supervisor.stop()
         await broker.close()
         logger.info("RabbitMQ broker closed")
     except Exception:
         pass
+    try:
+        await admission.close()
+    except Exception:
+        pass
+    shutdown_image_pool()
 
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
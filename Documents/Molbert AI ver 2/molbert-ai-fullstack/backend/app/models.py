@@ -1,7 +1,9 @@
 import uuid
 import datetime
+from typing import Literal
 
 from pydantic import EmailStr
+from sqlalchemy import BigInteger
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -127,6 +129,8 @@ class NewPassword(SQLModel):
 class ImageResult(SQLModel):
     image_data_url: str
     file_url: str | None = None
+    # pass back as source_id to keep editing this result without re-uploading
+    generation_id: uuid.UUID | None = None
 
 
 class GenerationLog(SQLModel, table=True):
@@ -134,8 +138,14 @@ class GenerationLog(SQLModel, table=True):
     user_id: uuid.UUID = Field(foreign_key="user.id", nullable=False, index=True)
     mode: str = Field(max_length=50)
     prompt: str = Field(max_length=255)
-    file_path: str = Field(max_length=255)
+    # indexed: lifecycle sweeps look objects up by key
+    file_path: str = Field(max_length=255, index=True)
     cost: int = Field(default=1, ge=0)
+    # lineage of chained edits: the generation whose result was the source
+    parent_id: uuid.UUID | None = Field(
+        default=None, foreign_key="generationlog.id", ondelete="SET NULL", index=True
+    )
+    source_key: str | None = Field(default=None, max_length=255, index=True)
     created_at: datetime.datetime = Field(
         default_factory=lambda: datetime.datetime.now(datetime.timezone.utc)
     )
@@ -147,6 +157,44 @@ class GenerationPublic(SQLModel):
     prompt: str
     file_url: str
     created_at: datetime.datetime
+    parent_id: uuid.UUID | None = None
+    thumbnail_url: str | None = None
+
+
+# Bytes/objects a user keeps in storage, maintained incrementally on writes
+# and lifecycle deletes and corrected by reconciliation scans
+class StorageUsage(SQLModel, table=True):
+    user_id: uuid.UUID = Field(
+        foreign_key="user.id", primary_key=True, ondelete="CASCADE"
+    )
+    bytes: int = Field(default=0, index=True, sa_type=BigInteger)
+    objects: int = Field(default=0)
+    updated_at: datetime.datetime = Field(
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc)
+    )
+
+
+# Direct uploads already added to StorageUsage; the primary key makes a
+# repeated finalize (another API process, an evicted memo entry) count once
+class CountedUpload(SQLModel, table=True):
+    key: str = Field(primary_key=True, max_length=1024)
+    user_id: uuid.UUID = Field(foreign_key="user.id", ondelete="CASCADE")
+    created_at: datetime.datetime = Field(
+        default_factory=lambda: datetime.datetime.now(datetime.timezone.utc)
+    )
+
+
+class StorageUsagePublic(SQLModel):
+    user_id: uuid.UUID
+    email: str
+    bytes: int
+    objects: int
+    updated_at: datetime.datetime
+
+
+class StorageUsagesPublic(SQLModel):
+    data: list[StorageUsagePublic]
+    count: int
 
 
 class UsageInfo(SQLModel):
@@ -157,6 +205,55 @@ class UsageInfo(SQLModel):
     free_daily_remaining: int
     rate_limit_per_minute: int
     used_last_minute: int
+    estimated_start_at: datetime.datetime | None = None
+    estimated_completion_at: datetime.datetime | None = None
+
+
+class GenerationEta(SQLModel):
+    mode: str
+    resolution: str
+    queue_wait_seconds: float
+    service_seconds: float
+    estimated_start_at: datetime.datetime
+    estimated_completion_at: datetime.datetime
+
+
+class UploadIntentCreate(SQLModel):
+    content_type: str
+    size: int
+    method: Literal["post", "put"] = "post"
+
+
+class UploadIntent(SQLModel):
+    key: str
+    method: str
+    url: str
+    # form fields for POST, request headers for PUT
+    fields: dict[str, str] = Field(default_factory=dict)
+    headers: dict[str, str] = Field(default_factory=dict)
+    expires_at: datetime.datetime
+
+
+class UploadFinalize(SQLModel):
+    key: str
+
+
+class UploadedImage(SQLModel):
+    key: str
+    format: str
+    width: int
+    height: int
+    size: int
+
+
+class MediaCookies(SQLModel):
+    expires_at: datetime.datetime
+
+
+class FilterPreset(SQLModel):
+    id: str
+    name: str
+    description: str
 
 
 class Payment(SQLModel, table=True):
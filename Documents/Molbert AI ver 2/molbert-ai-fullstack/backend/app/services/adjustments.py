@@ -0,0 +1,151 @@
+"""
+Local engine for simple global adjustments (/images/adjust).
+
+A deterministic classifier maps plain requests such as "brighter, more
+contrast" or "сделай теплее" to parametric operations that are applied with
+NumPy. Anything it does not fully understand is left to fal.
+"""
+
+import re
+
+import numpy as np
+
+from app.services.imaging import FloatImage, decode_rgb, encode_rgb, luminance
+
+# Order in which operations are applied, regardless of the prompt order
+OPERATIONS = (
+    "white_balance",
+    "brightness",
+    "gamma",
+    "contrast",
+    "saturation",
+    "vibrance",
+)
+
+# (pattern, operation, signed base amount); amounts are scaled by intensifiers
+_RULES: list[tuple[re.Pattern[str], str, float]] = [
+    (re.compile(p), op, amount)
+    for p, op, amount in [
+        (r"^(more )?(bright(er|en)?|lighter|lighten)$", "brightness", 0.15),
+        (r"^(ярче|светлее|посветлее|поярче|осветли(ть)?)$", "brightness", 0.15),
+        (r"^(dark(er|en)|dimmer)$", "brightness", -0.15),
+        (r"^(темнее|потемнее|затемни(ть)?)$", "brightness", -0.15),
+        (r"^(more contrast|contrast(ier)?|increase contrast)$", "contrast", 0.25),
+        (
+            r"^(контрастнее|больше контраста|повысь контраст|добавь контраста)$",
+            "contrast",
+            0.25,
+        ),
+        (r"^(less contrast|lower contrast|flatter|reduce contrast)$", "contrast", -0.2),
+        (r"^(меньше контраста|понизь контраст|мягче)$", "contrast", -0.2),
+        (r"^(warm(er)?|more warm(th)?)$", "white_balance", 0.1),
+        (r"^(теплее|потеплее|тёплые тона|теплые тона)$", "white_balance", 0.1),
+        (r"^(cool(er)?|colder)$", "white_balance", -0.1),
+        (r"^(холоднее|прохладнее|холодные тона)$", "white_balance", -0.1),
+        (r"^(more saturat(ed|ion)|saturate|more colou?rful)$", "saturation", 0.3),
+        (r"^(насыщеннее|больше насыщенности|ярче цвета)$", "saturation", 0.3),
+        (r"^(less saturat(ed|ion)|desaturate|muted( colou?rs)?)$", "saturation", -0.3),
+        (
+            r"^(меньше насыщенности|приглуши цвета|приглушенные цвета)$",
+            "saturation",
+            -0.3,
+        ),
+        (r"^(more vibran(t|ce)|vibrance)$", "vibrance", 0.3),
+        (r"^(сочнее|сочные цвета)$", "vibrance", 0.3),
+        (r"^(lift shadows|brighter shadows)$", "gamma", -0.15),
+        (r"^(высветли тени|светлее тени)$", "gamma", -0.15),
+        (r"^(deeper shadows|darker shadows)$", "gamma", 0.15),
+        (r"^(глубже тени|темнее тени)$", "gamma", 0.15),
+    ]
+]
+
+_INTENSIFIERS: list[tuple[re.Pattern[str], float]] = [
+    (
+        re.compile(
+            r"^(a (little )?bit|slightly|a little|немного|чуть|чуть-чуть|слегка)\s+"
+        ),
+        0.5,
+    ),
+    (
+        re.compile(
+            r"^(much|very|a lot|way|significantly|гораздо|намного|сильно|сильнее|значительно)\s+"
+        ),
+        1.8,
+    ),
+]
+
+_FILLERS = re.compile(
+    r"^(please |make (it|the (image|photo|picture)) |пожалуйста |сделай(те)? |сделать |можно )+"
+)
+_SPLIT = re.compile(r"\s*(?:,|;|\band\b|\bи\b|\+|\.)\s*")
+
+
+def _parse_clause(clause: str) -> tuple[str, float] | None:
+    clause = _FILLERS.sub("", clause).strip()
+    factor = 1.0
+    for pattern, multiplier in _INTENSIFIERS:
+        match = pattern.match(clause)
+        if match:
+            factor = multiplier
+            clause = clause[match.end() :]
+            break
+    clause = _FILLERS.sub("", clause).strip()
+    for pattern, operation, amount in _RULES:
+        if pattern.match(clause):
+            return operation, amount * factor
+    return None
+
+
+def classify_adjustment(prompt: str) -> dict[str, float] | None:
+    """
+    Return operation amounts for a prompt made only of recognised clauses,
+    or None when any part of it is unknown (the request then goes to fal).
+    """
+    text = " ".join(prompt.lower().replace("ё", "е").split())
+    clauses = [c for c in _SPLIT.split(text) if c and c not in {"please", "пожалуйста"}]
+    if not clauses or len(clauses) > 6:
+        return None
+    plan: dict[str, float] = {}
+    for clause in clauses:
+        parsed = _parse_clause(clause)
+        if parsed is None:
+            return None
+        operation, amount = parsed
+        plan[operation] = plan.get(operation, 0.0) + amount
+    return plan
+
+
+def apply_plan(rgb: FloatImage, plan: dict[str, float]) -> FloatImage:
+    """Apply operations to a float32 HxWx3 array in [0, 1]."""
+    out = rgb
+    for operation in OPERATIONS:
+        amount = plan.get(operation)
+        if not amount:
+            continue
+        if operation == "white_balance":
+            gains = np.array([1 + amount, 1 + amount * 0.2, 1 - amount], np.float32)
+            out = out * gains
+        elif operation == "brightness":
+            # lift towards white / pull towards black, keeps blacks/whites anchored
+            out = out + (1 - out) * amount if amount > 0 else out * (1 + amount)
+        elif operation == "gamma":
+            out = np.power(np.clip(out, 0, 1), 1 + amount)
+        elif operation == "contrast":
+            out = (out - 0.5) * (1 + amount) + 0.5
+        elif operation == "saturation":
+            luma = luminance(out)
+            out = luma + (out - luma) * (1 + amount)
+        elif operation == "vibrance":
+            # boosts muted colours more than already saturated ones
+            saturation = (out.max(axis=-1) - out.min(axis=-1))[..., None]
+            luma = luminance(out)
+            out = luma + (out - luma) * (1 + amount * (1 - saturation))
+        out = np.clip(out, 0, 1)
+    return out
+
+
+def adjust_image_sync(
+    data: bytes, plan: dict[str, float], long_edge: int, output_format: str
+) -> bytes:
+    rgb, alpha = decode_rgb(data, long_edge)
+    return encode_rgb(apply_plan(rgb, plan), alpha, output_format)
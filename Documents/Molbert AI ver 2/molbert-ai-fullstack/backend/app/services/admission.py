@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Callable, Coroutine, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+import aio_pika
+import jwt
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.broker import GENERATION_QUEUE
+from app.core import security
+from app.core.config import settings
+from app.core.db import engine
+from app.models import User
+from app.services.eta import eta_estimator
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueueSnapshot:
+    depth: int
+    consumers: int
+    in_flight: int
+    taken_at: float
+
+
+class AdmissionController:
+    """
+    Decides whether a generation request should be accepted, based on a cached
+    snapshot of the generation queue (passive declare) and the number of jobs
+    this process is still waiting on.
+    """
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self._snapshot: QueueSnapshot | None = None
+        self._probed_at = 0.0
+        self._lock = asyncio.Lock()
+        self._connection: aio_pika.abc.AbstractRobustConnection | None = None
+        self._channel: aio_pika.abc.AbstractChannel | None = None
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def _probe(self) -> QueueSnapshot:
+        if self._connection is None or self._connection.is_closed:
+            self._connection = await aio_pika.connect_robust(
+                str(settings.RABBIT_URL), timeout=2
+            )
+            self._channel = None
+        if self._channel is None or self._channel.is_closed:
+            self._channel = await self._connection.channel()
+        queue = await self._channel.declare_queue(GENERATION_QUEUE, passive=True)
+        result = queue.declaration_result
+        return QueueSnapshot(
+            depth=result.message_count or 0,
+            consumers=result.consumer_count or 0,
+            in_flight=self.in_flight,
+            taken_at=time.monotonic(),
+        )
+
+    async def snapshot(self) -> QueueSnapshot | None:
+        """
+        Return the cached snapshot, refreshing it at most once per probe interval.
+        A failed probe is cached as well (None), so a broker outage does not
+        turn every request into a connection attempt.
+        """
+        if time.monotonic() - self._probed_at < settings.ADMISSION_PROBE_INTERVAL:
+            return self._snapshot
+        async with self._lock:
+            if time.monotonic() - self._probed_at < settings.ADMISSION_PROBE_INTERVAL:
+                return self._snapshot
+            try:
+                self._snapshot = await self._probe()
+            except Exception as exc:
+                logger.warning("Не удалось получить глубину очереди: %s", exc)
+                self._snapshot = None
+                self._channel = None
+            self._probed_at = time.monotonic()
+        return self._snapshot
+
+    def service_time(self) -> float:
+        return eta_estimator.mean_service_time()
+
+    def expected_wait(self, snapshot: QueueSnapshot) -> float:
+        """
+        Estimated seconds before a new job starts.
+        ``in_flight`` also covers jobs that already left the queue and are
+        being processed, so the backlog is whichever of the two is larger.
+        """
+        backlog = max(snapshot.depth, snapshot.in_flight)
+        return backlog * self.service_time() / max(snapshot.consumers, 1)
+
+    async def queue_wait(self) -> float:
+        await self.snapshot()
+        return self.cached_queue_wait()
+
+    def cached_queue_wait(self) -> float:
+        """Expected wait from the last snapshot, without probing the broker."""
+        snapshot = self._snapshot
+        return self.expected_wait(snapshot) if snapshot else 0.0
+
+    async def close(self) -> None:
+        if self._connection is not None and not self._connection.is_closed:
+            await self._connection.close()
+        self._connection = None
+        self._channel = None
+
+    async def check(self, request: Request) -> None:
+        if not settings.ADMISSION_CONTROL_ENABLED:
+            return
+        snapshot = await self.snapshot()
+        if snapshot is None:
+            # Broker state unknown: fail open, the RPC path reports real outages
+            return
+        if snapshot.consumers == 0:
+            raise _overloaded(
+                settings.ADMISSION_PROBE_INTERVAL, "Нет доступных воркеров"
+            )
+
+        wait = self.expected_wait(snapshot)
+        if wait > settings.ADMISSION_MAX_WAIT_SECONDS:
+            raise _overloaded(wait - settings.ADMISSION_MAX_WAIT_SECONDS)
+        if wait > settings.ADMISSION_FREE_MAX_WAIT_SECONDS:
+            # Only look the plan up when shedding is actually in effect
+            if await run_in_threadpool(_is_free_plan_request, request):
+                raise _overloaded(wait - settings.ADMISSION_FREE_MAX_WAIT_SECONDS)
+
+
+def _overloaded(
+    retry_after: float, detail: str = "Сервис перегружен, попробуйте позже"
+) -> HTTPException:
+    seconds = max(1, min(300, math.ceil(retry_after)))
+    return HTTPException(
+        status_code=503, detail=detail, headers={"Retry-After": str(seconds)}
+    )
+
+
+def _is_free_plan_request(request: Request) -> bool:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return True
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
+        )
+    except jwt.InvalidTokenError:
+        # Let the regular auth dependency produce the proper error
+        return False
+    with Session(engine) as session:
+        user = session.get(User, payload.get("sub"))
+    if user is None or user.is_superuser:
+        return False
+    return user.plan == "free"
+
+
+admission = AdmissionController()
+
+
+class AdmissionRoute(APIRoute):
+    """
+    Route class that runs admission control for POST requests before FastAPI
+    parses the request body, so rejected uploads are never read or stored.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        original_handler = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            if request.method == "POST":
+                await admission.check(request)
+            return await original_handler(request)
+
+        return handler
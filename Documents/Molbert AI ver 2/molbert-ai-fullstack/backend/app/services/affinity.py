@@ -0,0 +1,53 @@
+"""
+Session-affinity routing of generation jobs.
+
+Jobs of the same session (user) go through a consistent-hash exchange
+(rabbitmq_consistent_hash_exchange plugin) to the same worker, whose source
+cache is then warm. Every worker binds its own queue; a message that is not
+picked up within GENERATION_AFFINITY_MAX_WAIT (busy or dead worker) is
+dead-lettered into the shared generation queue, where any worker takes it.
+A queue of a worker that is gone expires and its binding leaves the ring.
+"""
+
+import socket
+
+from faststream.rabbit import ExchangeType, RabbitExchange, RabbitQueue
+
+from app.broker import GENERATION_QUEUE
+from app.core.config import settings
+from app.services.jobs import GenerationJob
+
+AFFINITY_EXCHANGE = "generation.affinity"
+
+affinity_exchange = RabbitExchange(
+    AFFINITY_EXCHANGE, type=ExchangeType.X_CONSISTENT_HASH, durable=True
+)
+
+
+def worker_id() -> str:
+    return settings.WORKER_ID or socket.gethostname()
+
+
+def worker_queue(worker: str) -> RabbitQueue:
+    max_wait_ms = int(settings.GENERATION_AFFINITY_MAX_WAIT * 1000)
+    return RabbitQueue(
+        f"{GENERATION_QUEUE}.w.{worker}",
+        # binding key of a consistent-hash exchange is the weight on the ring
+        routing_key="1",
+        arguments={
+            "x-message-ttl": max_wait_ms,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": GENERATION_QUEUE,
+            # outlive the TTL so queued messages still spill over after a crash
+            "x-expires": max(max_wait_ms * 4, 60_000),
+        },
+    )
+
+
+def affinity_key(job: GenerationJob) -> str | None:
+    """Hash key of the job's session: its owner, else its first source."""
+    if not settings.GENERATION_AFFINITY_ENABLED:
+        return None
+    if job.owner:
+        return job.owner
+    return job.source_keys[0] if job.source_keys else None
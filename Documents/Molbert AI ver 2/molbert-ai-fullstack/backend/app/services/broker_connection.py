@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any
+
+import aio_pika
+import orjson
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
+from aio_pika.pool import Pool
+from fastapi import HTTPException
+
+from app.broker import broker
+from app.core.config import settings
+from app.services.histogram import LATENCY_BUCKETS, Histogram
+from app.services.metrics import BROKER_PUBLISH
+
+logger = logging.getLogger(__name__)
+
+
+class BrokerSupervisor:
+    """
+    Owns the RabbitMQ connection lifecycle and the publisher-confirm channels
+    that fire-and-forget publishes (retries, dead letters, cancellations) go
+    through, in the API and the worker alike.
+
+    The connection state lives in memory and is updated from aio_pika's
+    close/reconnect callbacks, so request handlers only check a flag.
+    The initial connect is retried in the background with jittered backoff;
+    after that aio_pika's robust connection takes care of reconnecting.
+    """
+
+    def __init__(self) -> None:
+        self.connected = False
+        self.state_since = time.time()
+        self.flaps = 0
+        self.reconnects = 0
+        self.connect_failures = 0
+        self.publish_latency = Histogram(LATENCY_BUCKETS)
+        self.rpc_latency = Histogram(LATENCY_BUCKETS)
+        self._connection: AbstractRobustConnection | None = None
+        self._channel_pool: Pool[AbstractChannel] | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def _set_connected(self, connected: bool) -> None:
+        if connected == self.connected:
+            return
+        if not connected:
+            self.flaps += 1
+        self.connected = connected
+        self.state_since = time.time()
+        logger.info(
+            "RabbitMQ: %s", "подключено" if connected else "соединение потеряно"
+        )
+
+    def _on_close(self, *_: Any) -> None:
+        self._set_connected(False)
+
+    def _on_reconnect(self, *_: Any) -> None:
+        self.reconnects += 1
+        self._set_connected(True)
+
+    async def _open_channel(self) -> AbstractChannel:
+        assert self._connection is not None
+        return await self._connection.channel(publisher_confirms=True)
+
+    async def _connect_loop(self) -> None:
+        attempt = 0
+        while True:
+            try:
+                connection = await broker.connect()
+            except Exception as exc:
+                attempt += 1
+                self.connect_failures += 1
+                window = min(
+                    settings.BROKER_RECONNECT_MAX_DELAY,
+                    settings.BROKER_RECONNECT_BASE_DELAY * 2 ** (attempt - 1),
+                )
+                delay = window / 2 + random.uniform(0, window / 2)
+                logger.warning(
+                    "Не удалось подключиться к RabbitMQ (%s), повтор через %.1f с",
+                    exc,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            self._connection = connection
+            connection.close_callbacks.add(self._on_close)
+            connection.reconnect_callbacks.add(self._on_reconnect)
+            self._channel_pool = Pool(
+                self._open_channel, max_size=settings.BROKER_CHANNEL_POOL_SIZE
+            )
+            self._set_connected(True)
+            return
+
+    async def start(self, *, wait: bool = False) -> None:
+        """
+        Connect in the background; the API starts serving regardless. With
+        wait, return once connected (the worker, whose broker is up already).
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._connect_loop())
+        if wait:
+            await asyncio.shield(self._task)
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        if self._channel_pool is not None:
+            await self._channel_pool.close()
+            self._channel_pool = None
+        self._set_connected(False)
+
+    def ensure_connected(self) -> None:
+        """Hot-path check: no I/O, just the in-memory state."""
+        if not self.connected:
+            raise HTTPException(
+                status_code=503,
+                detail="Очередь недоступна",
+                headers={"Retry-After": "5"},
+            )
+
+    async def publish(
+        self,
+        body: dict[str, Any],
+        *,
+        target: str,
+        routing_key: str = "",
+        exchange: str = "",
+        headers: dict[str, Any] | None = None,
+        correlation_id: str | None = None,
+        reply_to: str | None = None,
+        expiration: float | None = None,
+    ) -> None:
+        """
+        Fire-and-forget publish on a pooled channel with publisher confirms:
+        returns once the broker has confirmed the message. ``exchange`` must
+        already be declared; ``target`` labels the latency metric.
+        """
+        self.ensure_connected()
+        assert self._channel_pool is not None
+        message = aio_pika.Message(
+            body=orjson.dumps(body),
+            content_type="application/json",
+            headers=headers or {},
+            correlation_id=correlation_id,
+            reply_to=reply_to,
+            expiration=expiration,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        )
+        started = time.perf_counter()
+        async with self._channel_pool.acquire() as channel:
+            destination = (
+                await channel.get_exchange(exchange, ensure=False)
+                if exchange
+                else channel.default_exchange
+            )
+            await destination.publish(message, routing_key=routing_key)
+        elapsed = time.perf_counter() - started
+        self.publish_latency.observe(elapsed)
+        BROKER_PUBLISH.labels(target).observe(elapsed)
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "state_since": self.state_since,
+            "flaps": self.flaps,
+            "reconnects": self.reconnects,
+            "connect_failures": self.connect_failures,
+            "publish_latency": self.publish_latency.summary(),
+            "rpc_latency": self.rpc_latency.summary(),
+        }
+
+
+broker_supervisor = BrokerSupervisor()
@@ -0,0 +1,184 @@
+"""
+Cancelling generation jobs.
+
+Every job carries an id; a client that wants to be able to cancel picks it
+itself (X-Job-Id header). A job is cancelled by a DELETE on it or by the
+client going away while the API waits for the result. The API then stops
+waiting and broadcasts the id on a fanout exchange. Each worker remembers
+cancelled ids for the RPC timeout, so a job that is still queued or waiting
+for a retry is dropped when it comes up; the worker running it cancels the
+task, which cancels the in-flight provider requests. Credits are charged only
+once a result is logged, so a cancelled job costs the user nothing.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import HTTPException
+from faststream.rabbit import ExchangeType, RabbitExchange, RabbitQueue
+
+from app.broker import GENERATION_QUEUE, broker
+from app.core.config import settings
+from app.services.broker_connection import broker_supervisor
+from app.services.metrics import CANCELLED
+
+logger = logging.getLogger(__name__)
+
+CANCEL_EXCHANGE = "generation.cancel"
+# nginx's "client closed request"; the client is gone or asked for this
+CLIENT_CLOSED_REQUEST = 499
+
+cancel_exchange = RabbitExchange(
+    CANCEL_EXCHANGE, type=ExchangeType.FANOUT, durable=True
+)
+
+
+def cancel_queue(worker: str) -> RabbitQueue:
+    return RabbitQueue(f"{GENERATION_QUEUE}.cancel.{worker}", auto_delete=True)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def cancelled_error() -> HTTPException:
+    return HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Задание отменено")
+
+
+def _may_cancel(requested_by: str | None, owner: str | None) -> bool:
+    # None is a superuser, who may cancel anything
+    return requested_by is None or requested_by == owner
+
+
+async def publish_cancel(job_id: str, requested_by: str | None) -> None:
+    await broker.declare_exchange(cancel_exchange)
+    await broker_supervisor.publish(
+        {"id": job_id, "u": requested_by}, target="cancel", exchange=CANCEL_EXCHANGE
+    )
+
+
+# --- API side ---
+
+
+@dataclass
+class PendingJob:
+    owner: str | None
+    cancelled: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+@dataclass
+class CancellationStats:
+    disconnected: int = 0
+    deleted: int = 0
+    # predicted provider time that was not spent, summed over cancelled jobs
+    seconds_saved: float = 0.0
+
+    def record(self, reason: str, seconds_saved: float) -> None:
+        CANCELLED.labels(reason).inc()
+        if reason == "disconnect":
+            self.disconnected += 1
+        else:
+            self.deleted += 1
+        self.seconds_saved += max(seconds_saved, 0.0)
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "disconnected": self.disconnected,
+            "deleted": self.deleted,
+            "seconds_saved": round(self.seconds_saved, 1),
+        }
+
+
+class JobRegistry:
+    """Jobs this API process is waiting on, by id."""
+
+    def __init__(self) -> None:
+        self._jobs: dict[str, PendingJob] = {}
+        self.stats = CancellationStats()
+
+    @contextmanager
+    def track(self, job_id: str, owner: str | None) -> Iterator[PendingJob]:
+        if job_id in self._jobs:
+            raise HTTPException(
+                status_code=409, detail="Задание с таким id уже выполняется"
+            )
+        pending = self._jobs[job_id] = PendingJob(owner)
+        try:
+            yield pending
+        finally:
+            del self._jobs[job_id]
+
+    async def cancel(self, job_id: str, requested_by: str | None) -> None:
+        """
+        Stop waiting locally if the job is ours and tell the workers. A job
+        waited on by another API process learns it from the worker's reply.
+        """
+        pending = self._jobs.get(job_id)
+        if pending is not None:
+            if not _may_cancel(requested_by, pending.owner):
+                raise HTTPException(status_code=404, detail="Задание не найдено")
+            pending.cancelled.set()
+        await publish_cancel(job_id, requested_by)
+
+
+job_registry = JobRegistry()
+
+
+# --- worker side ---
+
+
+@dataclass
+class RunningJob:
+    owner: str | None
+    task: "asyncio.Task[Any]"
+
+
+class WorkerJobs:
+    def __init__(self) -> None:
+        self.running: dict[str, RunningJob] = {}
+        # job id -> (requested by, expires at)
+        self.cancelled: dict[str, tuple[str | None, float]] = {}
+        self.dropped = 0
+        self.aborted = 0
+
+    def _expire(self, now: float) -> None:
+        for job_id in [j for j, (_, until) in self.cancelled.items() if until <= now]:
+            del self.cancelled[job_id]
+
+    def cancel(self, job_id: str, requested_by: str | None) -> None:
+        now = time.monotonic()
+        self._expire(now)
+        self.cancelled[job_id] = (requested_by, now + settings.GENERATION_RPC_TIMEOUT)
+        running = self.running.get(job_id)
+        if running is not None and _may_cancel(requested_by, running.owner):
+            logger.info("Отмена выполняемого задания %s", job_id)
+            running.task.cancel()
+
+    def is_cancelled(self, job_id: str | None, owner: str | None) -> bool:
+        entry = self.cancelled.get(job_id) if job_id else None
+        return (
+            entry is not None
+            and entry[1] > time.monotonic()
+            and _may_cancel(entry[0], owner)
+        )
+
+    @contextmanager
+    def track(
+        self, job_id: str | None, owner: str | None, task: "asyncio.Task[Any]"
+    ) -> Iterator[None]:
+        if job_id is None:
+            yield
+            return
+        self.running[job_id] = RunningJob(owner, task)
+        try:
+            yield
+        finally:
+            self.running.pop(job_id, None)
+
+
+worker_jobs = WorkerJobs()
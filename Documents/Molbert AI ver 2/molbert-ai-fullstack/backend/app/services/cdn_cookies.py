@@ -0,0 +1,64 @@
+"""
+CloudFront-style signed cookies for bulk access to a user's objects.
+
+With S3_URL_MODE="signed-cookies" the bucket stays private behind a CDN at
+S3_PUBLIC_BASE_URL; links are plain URLs and the CDN admits requests carrying
+a policy that allows ``{base}/{user_id}/*`` until the cookie expires.
+"""
+
+import base64
+import json
+import time
+from functools import lru_cache
+from typing import Any
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+
+def _cdn_safe_b64(data: bytes) -> str:
+    # CloudFront's URL-safe alphabet differs from RFC 4648 base64url
+    return (
+        base64.b64encode(data)
+        .decode()
+        .replace("+", "-")
+        .replace("=", "_")
+        .replace("/", "~")
+    )
+
+
+@lru_cache
+def _private_key() -> Any:
+    import rsa
+
+    if not (settings.CDN_PRIVATE_KEY_PATH and settings.CDN_KEY_PAIR_ID):
+        raise HTTPException(status_code=503, detail="Подписанные cookie не настроены")
+    with open(settings.CDN_PRIVATE_KEY_PATH, "rb") as f:
+        return rsa.PrivateKey.load_pkcs1(f.read())
+
+
+def signed_cookies(user_id: str) -> tuple[dict[str, str], int]:
+    """Cookie name -> value for the user's prefix, and the expiry (unix time)."""
+    import rsa
+
+    expires = int(time.time()) + settings.CDN_COOKIE_TTL
+    base = str(settings.S3_PUBLIC_BASE_URL).rstrip("/")
+    policy = json.dumps(
+        {
+            "Statement": [
+                {
+                    "Resource": f"{base}/{user_id}/*",
+                    "Condition": {"DateLessThan": {"AWS:EpochTime": expires}},
+                }
+            ]
+        },
+        separators=(",", ":"),
+    ).encode()
+    signature = rsa.sign(policy, _private_key(), "SHA-1")
+    cookies = {
+        "CloudFront-Policy": _cdn_safe_b64(policy),
+        "CloudFront-Signature": _cdn_safe_b64(signature),
+        "CloudFront-Key-Pair-Id": str(settings.CDN_KEY_PAIR_ID),
+    }
+    return cookies, expires
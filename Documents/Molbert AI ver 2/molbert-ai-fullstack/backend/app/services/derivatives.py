@@ -0,0 +1,182 @@
+"""
+Resized derivatives of stored images (history thumbnails and the like).
+
+Derivatives are generated on demand in the image process pool and written back
+to the storage backend under ``derived/``. Each API process keeps an LRU index
+of the prefix and evicts once its view passes MEDIA_DERIVATIVE_CACHE_MAX_BYTES;
+the bound is per process, so with N processes the prefix can hold up to N
+times that between their evictions. URLs are
+signed like presigned S3 links, so a derivative is no easier to read than its
+source in the private URL modes.
+"""
+
+import hashlib
+import hmac
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from urllib.parse import urlencode
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.services.storage import delete_key, list_keys, put_bytes, read_bytes
+
+logger = logging.getLogger(__name__)
+
+DERIVED_PREFIX = "derived"
+# provider-hosted results have no storage key and are addressed by generation id
+GENERATION_SOURCE_PREFIX = "generation/"
+
+Image.init()
+AVIF_SUPPORTED = "AVIF" in Image.SAVE
+
+DERIVATIVE_MIME = {"avif": "image/avif", "webp": "image/webp"}
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    """'256x256' -> (256, 256); only configured sizes are served."""
+    if size not in settings.MEDIA_RESIZE_SIZES:
+        raise HTTPException(status_code=404, detail="Размер не поддерживается")
+    width, _, height = size.partition("x")
+    return int(width), int(height)
+
+
+def negotiate_format(accept: str) -> str:
+    return "avif" if AVIF_SUPPORTED and "image/avif" in accept else "webp"
+
+
+def derivative_key(source: str, width: int, height: int, fmt: str) -> str:
+    digest = hashlib.sha256(source.encode()).hexdigest()[:32]
+    return f"{DERIVED_PREFIX}/{width}x{height}/{digest[:2]}/{digest}.{fmt}"
+
+
+def derivative_signature(size: str, source: str, expires: int) -> str:
+    message = f"{size}\n{source}\n{expires}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_derivative(size: str, source: str, expires: int, sig: str) -> None:
+    if expires < time.time():
+        raise HTTPException(status_code=403, detail="Ссылка истекла")
+    if not hmac.compare_digest(derivative_signature(size, source, expires), sig):
+        raise HTTPException(status_code=403, detail="Неверная подпись ссылки")
+
+
+def thumbnail_url(source: str) -> str:
+    """
+    Signed URL of the history-size derivative of a storage key / source ref.
+    Expiry is rounded to S3_PRESIGN_BUCKET_SECONDS, as for presigned S3 URLs,
+    so the URL stays the same (and cacheable) between history reloads.
+    """
+    size = settings.HISTORY_THUMBNAIL_SIZE
+    bucket = int(time.time() // settings.S3_PRESIGN_BUCKET_SECONDS)
+    expires = bucket * settings.S3_PRESIGN_BUCKET_SECONDS + settings.S3_PRESIGN_TTL
+    query = urlencode(
+        {"expires": expires, "sig": derivative_signature(size, source, expires)}
+    )
+    path = f"/media/resize/{size}/{source}?{query}"
+    if settings.PUBLIC_API_URL:
+        return f"{str(settings.PUBLIC_API_URL).rstrip('/')}{path}"
+    return path
+
+
+def resize_sync(data: bytes, width: int, height: int, fmt: str, quality: int) -> bytes:
+    """Fit inside width x height (never upscales) and encode as WebP/AVIF."""
+    with Image.open(io.BytesIO(data)) as opened:
+        # JPEG: decode at a reduced scale; the bound is square since EXIF may rotate
+        bound = max(width, height)
+        opened.draft("RGB", (bound, bound))
+        image = ImageOps.exif_transpose(opened)
+        image.thumbnail((width, height), Image.Resampling.LANCZOS)
+        if image.mode not in {"RGB", "RGBA"}:
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        buffer = io.BytesIO()
+        save_kwargs: dict[str, Any] = {"quality": quality}
+        if fmt == "webp":
+            save_kwargs["method"] = 4
+        image.save(buffer, format=fmt.upper(), **save_kwargs)
+    return buffer.getvalue()
+
+
+class DerivativeCache:
+    """
+    Per-process LRU index over derived objects in the storage backend.
+    Blocking; call from a thread. Objects written by other API processes are
+    adopted on read, but each process only evicts what its own index holds.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        self._loaded = True
+        objects = sorted(list_keys(DERIVED_PREFIX), key=lambda obj: obj.modified)
+        for obj in objects:
+            self._entries[obj.key] = obj.size
+            self._size += obj.size
+
+    def _add(self, key: str, size: int) -> list[str]:
+        if key not in self._entries:
+            self._entries[key] = size
+            self._size += size
+        self._entries.move_to_end(key)
+        evicted: list[str] = []
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            old_key, old_size = self._entries.popitem(last=False)
+            self._size -= old_size
+            evicted.append(old_key)
+        return evicted
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+        try:
+            data = read_bytes(key)
+        except HTTPException:
+            with self._lock:
+                self.misses += 1
+                if key in self._entries:
+                    self._size -= self._entries.pop(key)
+            return None
+        with self._lock:
+            self.hits += 1
+            evicted = self._add(key, len(data))
+        self._delete(evicted)
+        return data
+
+    def put(self, key: str, data: bytes, mime: str) -> None:
+        put_bytes(key, data, mime)
+        with self._lock:
+            evicted = self._add(key, len(data))
+        self._delete(evicted)
+
+    def _delete(self, keys: list[str]) -> None:
+        for key in keys:
+            try:
+                delete_key(key)
+            except Exception as exc:  # pragma: no cover - defensive
+                logger.warning("Не удалось удалить производное %s: %s", key, exc)
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+derivative_cache = DerivativeCache(settings.MEDIA_DERIVATIVE_CACHE_MAX_BYTES)
@@ -0,0 +1,176 @@
+"""
+Size-bounded on-disk LRU of storage objects, for the S3 read-through tier.
+
+Objects are stored under the sha256 of their key; keys are immutable (uuid
+names, deterministic derivatives), so entries never need revalidation. Files
+are written to a temp name and renamed, so a crash never leaves a torn entry,
+and files left by a previous run are adopted on first use. Thread-safe.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any
+
+from app.services.source_cache import CacheStats
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self.bytes_served = 0
+        self.bytes_fetched = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        # readers that waited for another thread's fetch instead of their own
+        self.shared_fetches = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()  # digest -> size
+        self._size = 0
+        self._flights: dict[str, Future[bytes]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def _load(self) -> None:
+        self._loaded = True
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = sorted(
+            (p for p in self.root.glob("??/*") if p.is_file() and ".tmp" not in p.name),
+            key=lambda p: p.stat().st_mtime,
+        )
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.name] = size
+            self._size += size
+
+    def _evict(self) -> list[Path]:
+        victims: list[Path] = []
+        while self._size > self.max_bytes and self._entries:
+            digest, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            self.evicted_bytes += size
+            victims.append(self._path(digest))
+        return victims
+
+    def get(self, key: str) -> bytes | None:
+        digest = self._digest(key)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if digest not in self._entries:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+        path = self._path(digest)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            with self._lock:
+                if digest in self._entries:
+                    self._size -= self._entries.pop(digest)
+                self.stats.misses += 1
+            return None
+        os.utime(path)
+        with self._lock:
+            self.stats.hits += 1
+            self.bytes_served += len(data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        digest = self._digest(key)
+        path = self._path(digest)
+        tmp = path.with_name(f"{digest}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+            tmp.replace(path)
+        except OSError as exc:
+            logger.warning("Не удалось записать в кэш хранилища: %s", exc)
+            tmp.unlink(missing_ok=True)
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if digest not in self._entries:
+                self._entries[digest] = len(data)
+                self._size += len(data)
+            self._entries.move_to_end(digest)
+            victims = self._evict()
+        for victim in victims:
+            victim.unlink(missing_ok=True)
+
+    def discard(self, key: str) -> None:
+        digest = self._digest(key)
+        with self._lock:
+            if digest in self._entries:
+                self._size -= self._entries.pop(digest)
+        self._path(digest).unlink(missing_ok=True)
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], bytes]) -> bytes:
+        """
+        Cached bytes, or the result of ``fetch`` stored in the cache. Concurrent
+        misses on one key share a single fetch (and its exception).
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = Future()
+        if not leader:
+            with self._lock:
+                self.shared_fetches += 1
+            return flight.result()
+
+        try:
+            # the previous leader may have finished between our miss and the lock
+            with self._lock:
+                cached = self._digest(key) in self._entries
+            data = self.get(key) if cached else None
+            if data is None:
+                data = fetch()
+                with self._lock:
+                    self.bytes_fetched += len(data)
+                self.put(key, data)
+            flight.set_result(data)
+            return data
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def status(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                **self.stats.as_dict(),
+                "bytes_served": self.bytes_served,
+                "bytes_fetched": self.bytes_fetched,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "shared_fetches": self.shared_fetches,
+            }
@@ -0,0 +1,75 @@
+import datetime
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.config import settings
+from app.services.histogram import Histogram
+
+
+@dataclass
+class Estimate:
+    queue_wait_seconds: float
+    service_seconds: float
+    estimated_start_at: datetime.datetime
+    estimated_completion_at: datetime.datetime
+
+
+class EtaEstimator:
+    """
+    Service-time histograms per (mode, resolution), fed by the timings the
+    worker reports back with each reply, plus the error of past predictions.
+    """
+
+    def __init__(self) -> None:
+        self._service: dict[tuple[str, str], Histogram] = {}
+        self._overall = Histogram()
+        self._errors = Histogram()
+
+    def observe_service(self, mode: str, resolution: str, seconds: float) -> None:
+        key = (mode, resolution or "")
+        self._service.setdefault(key, Histogram()).observe(seconds)
+        self._overall.observe(seconds)
+
+    def observe_prediction(self, predicted: float, actual: float) -> None:
+        self._errors.observe(abs(actual - predicted))
+
+    def mean_service_time(self) -> float:
+        return self._overall.mean or settings.GENERATION_AVG_SERVICE_SECONDS
+
+    def service_time(self, mode: str | None, resolution: str) -> float:
+        """Median for the mode and resolution; the overall mean without a mode."""
+        if mode is None:
+            return self.mean_service_time()
+        histogram = self._service.get((mode, resolution or ""))
+        if histogram is not None and histogram.count >= 5:
+            median = histogram.quantile(0.5)
+            if median is not None:
+                return median
+        return self.mean_service_time()
+
+    def estimate(
+        self, mode: str | None, resolution: str, queue_wait: float
+    ) -> Estimate:
+        service = self.service_time(mode, resolution)
+        start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            seconds=queue_wait
+        )
+        return Estimate(
+            queue_wait_seconds=queue_wait,
+            service_seconds=service,
+            estimated_start_at=start,
+            estimated_completion_at=start + datetime.timedelta(seconds=service),
+        )
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "service_time": {
+                f"{mode}/{resolution or '-'}": histogram.summary()
+                for (mode, resolution), histogram in sorted(self._service.items())
+            },
+            "overall": self._overall.summary(),
+            "prediction_abs_error": self._errors.summary(),
+        }
+
+
+eta_estimator = EtaEstimator()
@@ -11,7 +11,9 @@ class FalClient:
     @staticmethod
     def _headers() -> dict[str, str]:
         if not settings.FAL_API_KEY:
-            raise HTTPException(status_code=503, detail="FAL_API_KEY не настроен на сервере")
+            raise HTTPException(
+                status_code=503, detail="FAL_API_KEY не настроен на сервере"
+            )
         return {
             "Authorization": f"Key {settings.FAL_API_KEY}",
             "Content-Type": "application/json",
@@ -35,9 +37,13 @@ class FalClient:
         if resolution:
             payload["resolution"] = resolution
         async with httpx.AsyncClient(timeout=120) as client:
-            resp = await client.post(FalClient.BASE_TTI, headers=FalClient._headers(), json=payload)
+            resp = await client.post(
+                FalClient.BASE_TTI, headers=FalClient._headers(), json=payload
+            )
         if resp.status_code >= 400:
-            raise HTTPException(status_code=resp.status_code, detail=f"FAL error: {resp.text}")
+            raise HTTPException(
+                status_code=resp.status_code, detail=f"FAL error: {resp.text}"
+            )
         data = resp.json()
         images = data.get("images") or []
         if not images:
@@ -64,9 +70,13 @@ class FalClient:
         if resolution:
             payload["resolution"] = resolution
         async with httpx.AsyncClient(timeout=120) as client:
-            resp = await client.post(FalClient.BASE_EDIT, headers=FalClient._headers(), json=payload)
+            resp = await client.post(
+                FalClient.BASE_EDIT, headers=FalClient._headers(), json=payload
+            )
         if resp.status_code >= 400:
-            raise HTTPException(status_code=resp.status_code, detail=f"FAL error: {resp.text}")
+            raise HTTPException(
+                status_code=resp.status_code, detail=f"FAL error: {resp.text}"
+            )
         data = resp.json()
         images = data.get("images") or []
         if not images:
@@ -94,9 +104,13 @@ class FalClient:
         if resolution:
             payload["resolution"] = resolution
         async with httpx.AsyncClient(timeout=120) as client:
-            resp = await client.post(FalClient.BASE_EDIT, headers=FalClient._headers(), json=payload)
+            resp = await client.post(
+                FalClient.BASE_EDIT, headers=FalClient._headers(), json=payload
+            )
         if resp.status_code >= 400:
-            raise HTTPException(status_code=resp.status_code, detail=f"FAL error: {resp.text}")
+            raise HTTPException(
+                status_code=resp.status_code, detail=f"FAL error: {resp.text}"
+            )
         data = resp.json()
         images = data.get("images") or []
         if not images:
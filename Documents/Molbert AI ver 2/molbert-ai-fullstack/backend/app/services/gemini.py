@@ -1,77 +1,120 @@
-import asyncio
+"""
+Gemini image generation over the SDK's native async interface.
+
+One client per process: it owns the HTTP connection pool, so it is created on
+first use and reused. Images go in and come out as raw bytes, and results are
+written to storage directly instead of through a base64 data URL.
+"""
+
 import base64
+from collections.abc import Sequence
+from dataclasses import dataclass
 from typing import Any
 
 from fastapi import HTTPException, UploadFile
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types as genai_types
 
 from app.core.config import settings
 
-
-def _get_client() -> genai.Client:
-    if not settings.GEMINI_API_KEY:
-        raise HTTPException(
-            status_code=503,
-            detail="GEMINI_API_KEY is not configured on the server",
+ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+MAX_UPLOAD_SIZE_BYTES = 10 * 1024 * 1024  # 10 MB
+
+
+@dataclass
+class GeneratedImage:
+    data: bytes
+    mime: str
+
+
+class GeminiClient:
+    def __init__(self) -> None:
+        self._client: genai.Client | None = None
+
+    def _get_client(self) -> genai.Client:
+        if not settings.GEMINI_API_KEY:
+            raise HTTPException(
+                status_code=503,
+                detail="GEMINI_API_KEY is not configured on the server",
+            )
+        if self._client is None:
+            self._client = genai.Client(
+                api_key=settings.GEMINI_API_KEY,
+                http_options=genai_types.HttpOptions(
+                    timeout=int(settings.GEMINI_TIMEOUT * 1000)
+                ),
+            )
+        return self._client
+
+    async def generate(
+        self,
+        prompt: str,
+        images: Sequence[tuple[bytes, str]] = (),
+        *,
+        aspect_ratio: str | None = None,
+        resolution: str | None = None,
+        model: str | None = None,
+        context: str,
+    ) -> GeneratedImage:
+        """
+        Generate one image from a prompt and optional (bytes, mime) inputs.
+        API errors surface as HTTPException with Gemini's status code, so the
+        worker's retry policy treats 429/5xx as transient.
+        """
+        client = self._get_client()
+        contents: list[Any] = [
+            genai_types.Part.from_bytes(data=data, mime_type=mime)
+            for data, mime in images
+        ]
+        contents.append(genai_types.Part.from_text(text=prompt))
+        config = genai_types.GenerateContentConfig(
+            response_modalities=["IMAGE"],
+            image_config=genai_types.ImageConfig(
+                aspect_ratio=aspect_ratio if aspect_ratio != "auto" else None,
+                image_size=resolution,
+            ),
         )
-    return genai.Client(api_key=settings.GEMINI_API_KEY)
+        try:
+            response = await client.aio.models.generate_content(
+                model=model or settings.GEMINI_IMAGE_MODEL,
+                contents=contents,
+                config=config,
+            )
+        except genai_errors.APIError as exc:
+            raise HTTPException(
+                status_code=exc.code or 502, detail=f"Gemini error: {exc.message}"
+            )
+        return _extract_image(response, context)
 
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aio.aclose()
+            self._client = None
 
-async def _upload_to_part(upload: UploadFile) -> genai_types.Part:
-    content = await upload.read()
-    max_size = 10 * 1024 * 1024  # 10 MB
-    if len(content) > max_size:
-        raise HTTPException(
-            status_code=413, detail="Файл слишком большой. Максимум 10 МБ."
-        )
 
-    allowed_types = {
-        "image/jpeg",
-        "image/png",
-        "image/webp",
-        "image/gif",
-    }
-    mime_type = upload.content_type or "image/png"
-    if mime_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail="Неверный формат изображения. Разрешено: JPEG, PNG, WebP, GIF.",
-        )
-
-    mime_type = upload.content_type or "image/png"
-    return genai_types.Part.from_bytes(data=content, mime_type=mime_type)
+gemini_client = GeminiClient()
 
 
-def _format_image_part(image_part: Any) -> str:
-    inline_data = getattr(image_part, "inline_data", None)
-    if not inline_data:
-        raise HTTPException(
-            status_code=500, detail="Model response did not include image data"
-        )
-
-    raw_data = inline_data.data  # can be base64 str or bytes depending on SDK version
-    if isinstance(raw_data, bytes):
-        b64_data = base64.b64encode(raw_data).decode("utf-8")
-    else:
-        b64_data = raw_data
-
-    mime_type = inline_data.mime_type or "image/png"
-    return f"data:{mime_type};base64,{b64_data}"
-
-
-def _extract_image_response(
+def _extract_image(
     response: genai_types.GenerateContentResponse, context: str
-) -> str:
+) -> GeneratedImage:
     candidates = getattr(response, "candidates", None) or []
     for candidate in candidates:
         content = getattr(candidate, "content", None)
         parts = getattr(content, "parts", None) or []
         for part in parts:
-            if getattr(part, "inline_data", None):
-                return _format_image_part(part)
-
-    finish_reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+            inline_data = getattr(part, "inline_data", None)
+            if inline_data and inline_data.data:
+                data = inline_data.data
+                # the SDK decodes to bytes; older versions handed back base64 text
+                if isinstance(data, str):
+                    data = base64.b64decode(data)
+                return GeneratedImage(data, inline_data.mime_type or "image/png")
+
+    finish_reason = (
+        getattr(candidates[0], "finish_reason", None) if candidates else None
+    )
     raise HTTPException(
         status_code=500,
         detail=(
@@ -82,19 +125,22 @@ def _extract_image_response(
 
 
 async def generate_image_with_prompt(
-    upload: UploadFile, prompt: str, *, model: str = "gemini-2.0-flash", context: str
-) -> str:
+    upload: UploadFile, prompt: str, *, model: str | None = None, context: str
+) -> GeneratedImage:
     """
-    Send an image + text prompt to Gemini and return a data URL.
+    Send an uploaded image + text prompt to Gemini and return the image bytes.
     """
-    client = _get_client()
-    image_part = await _upload_to_part(upload)
-    text_part = genai_types.Part.from_text(prompt)
-
-    response = await asyncio.to_thread(
-        client.models.generate_content,
-        model=model,
-        contents=[image_part, text_part],
+    content = await upload.read()
+    if len(content) > MAX_UPLOAD_SIZE_BYTES:
+        raise HTTPException(
+            status_code=413, detail="Файл слишком большой. Максимум 10 МБ."
+        )
+    mime_type = upload.content_type or "image/png"
+    if mime_type not in ALLOWED_MIME_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail="Неверный формат изображения. Разрешено: JPEG, PNG, WebP, GIF.",
+        )
+    return await gemini_client.generate(
+        prompt, [(content, mime_type)], model=model, context=context
     )
-
-    return _extract_image_response(response, context=context)
@@ -0,0 +1,83 @@
+import bisect
+import math
+from collections.abc import Sequence
+from typing import Any
+
+# Log-spaced upper bounds in seconds; generation jobs live between ~5 s and a few minutes
+SERVICE_TIME_BUCKETS: tuple[float, ...] = (
+    1,
+    2,
+    3,
+    5,
+    8,
+    13,
+    20,
+    30,
+    45,
+    60,
+    90,
+    120,
+    180,
+    300,
+    math.inf,
+)
+# Broker/storage round-trips, from sub-millisecond to a few seconds
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    math.inf,
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram: O(log buckets) to observe, O(buckets) to query."""
+
+    def __init__(self, buckets: Sequence[float] = SERVICE_TIME_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        index = min(bisect.bisect_left(self.buckets, value), len(self.buckets) - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q: float) -> float | None:
+        """Linear interpolation inside the bucket that holds the q-th observation."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                if math.isinf(upper):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-2]
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+        }
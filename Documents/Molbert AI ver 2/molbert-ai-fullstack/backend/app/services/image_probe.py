@@ -0,0 +1,148 @@
+"""
+Header-only image probing: dimensions of PNG/JPEG/WebP without decoding pixels.
+"""
+
+import math
+import struct
+from dataclasses import dataclass
+
+# Aspect ratios accepted by fal nano-banana-pro
+SUPPORTED_ASPECT_RATIOS = (
+    "21:9",
+    "16:9",
+    "3:2",
+    "4:3",
+    "5:4",
+    "1:1",
+    "4:5",
+    "3:4",
+    "2:3",
+    "9:16",
+)
+
+# JPEG start-of-frame markers carry the dimensions (DHT/JPG/DAC share the range)
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class ProbeError(ValueError):
+    pass
+
+
+@dataclass
+class ImageInfo:
+    format: str
+    # Dimensions as displayed, i.e. after applying EXIF orientation
+    width: int
+    height: int
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+
+def _png_size(data: bytes) -> tuple[int, int]:
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        raise ProbeError("PNG без заголовка IHDR")
+    width, height = struct.unpack(">II", data[16:24])
+    return int(width), int(height)
+
+
+def _exif_orientation(segment: bytes) -> int:
+    """Orientation tag (0x0112) from an APP1 Exif segment payload, 1 if absent."""
+    if not segment.startswith(b"Exif\x00\x00") or len(segment) < 14:
+        return 1
+    tiff = segment[6:]
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None:
+        return 1
+    (ifd_offset,) = struct.unpack(endian + "I", tiff[4:8])
+    if ifd_offset + 2 > len(tiff):
+        return 1
+    (entries,) = struct.unpack(endian + "H", tiff[ifd_offset : ifd_offset + 2])
+    for index in range(entries):
+        entry = ifd_offset + 2 + index * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, _, _, value = struct.unpack(endian + "HHIH", tiff[entry : entry + 10])
+        if tag == 0x0112:
+            return int(value)
+    return 1
+
+
+def _jpeg_size(data: bytes) -> tuple[int, int, int]:
+    orientation = 1
+    offset = 2
+    length = len(data)
+    while offset + 4 <= length:
+        if data[offset] != 0xFF:
+            raise ProbeError("Повреждённый JPEG")
+        marker = data[offset + 1]
+        if marker == 0xFF:  # fill byte
+            offset += 1
+            continue
+        if marker in {0xD8, 0x01} or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        (segment_length,) = struct.unpack(">H", data[offset + 2 : offset + 4])
+        segment = data[offset + 4 : offset + 2 + segment_length]
+        if marker == 0xE1:
+            orientation = _exif_orientation(segment)
+        elif marker in _JPEG_SOF_MARKERS:
+            if len(segment) < 5:
+                break
+            height, width = struct.unpack(">HH", segment[1:5])
+            return int(width), int(height), orientation
+        elif marker in {0xD9, 0xDA}:
+            break
+        offset += 2 + segment_length
+    raise ProbeError("JPEG без размеров кадра")
+
+
+def _webp_size(data: bytes) -> tuple[int, int]:
+    chunk = data[12:16]
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return width, height
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25:
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    raise ProbeError("WebP без размеров кадра")
+
+
+def probe_image(data: bytes) -> ImageInfo:
+    """
+    Read format and dimensions from the image header only.
+    Raises ProbeError for unsupported or truncated headers.
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        width, height = _png_size(data)
+        info = ImageInfo("png", width, height)
+    elif data.startswith(b"\xff\xd8"):
+        width, height, orientation = _jpeg_size(data)
+        # Orientations 5-8 rotate by 90°, so the displayed image is transposed
+        if orientation in {5, 6, 7, 8}:
+            width, height = height, width
+        info = ImageInfo("jpeg", width, height)
+    elif data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+        width, height = _webp_size(data)
+        info = ImageInfo("webp", width, height)
+    else:
+        raise ProbeError("Неизвестный формат изображения")
+    if info.width <= 0 or info.height <= 0:
+        raise ProbeError("Некорректные размеры изображения")
+    return info
+
+
+def closest_aspect_ratio(width: int, height: int) -> str:
+    """Supported aspect ratio closest to width/height, compared on a log scale."""
+    target = math.log(width / height)
+
+    def distance(ratio: str) -> float:
+        w, h = ratio.split(":")
+        return abs(math.log(int(w) / int(h)) - target)
+
+    return min(SUPPORTED_ASPECT_RATIOS, key=distance)
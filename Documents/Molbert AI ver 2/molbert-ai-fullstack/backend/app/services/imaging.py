@@ -0,0 +1,170 @@
+import asyncio
+import io
+import logging
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, TypeVar, cast
+
+import numpy as np
+import numpy.typing as npt
+from PIL import ExifTags, Image, ImageOps
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Uploads are already bounded by header probing; keep Pillow's own guard in line
+Image.MAX_IMAGE_PIXELS = settings.UPLOAD_MAX_PIXELS
+
+# Long edge in pixels for the resolutions fal accepts
+RESOLUTION_LONG_EDGE = {"1K": 1024, "2K": 2048, "4K": 4096}
+
+FORMAT_MIME = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+# HxWx3 (or HxWx1) float32 pixels in [0, 1], as the local filters work on them
+FloatImage = npt.NDArray[np.float32]
+
+_LUMA_WEIGHTS = np.array([0.2126, 0.7152, 0.0722], np.float32)
+
+_pool: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+
+
+def _get_pool() -> tuple[ProcessPoolExecutor, asyncio.Semaphore]:
+    """
+    Lazily start the decode pool. The semaphore bounds queued work to twice the
+    pool size so a burst of uploads waits in the event loop instead of piling
+    pixel buffers into the executor queue.
+    """
+    global _pool, _slots
+    if _pool is None or _slots is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+        _slots = asyncio.Semaphore(settings.IMAGE_PROCESS_WORKERS * 2)
+    return _pool, _slots
+
+
+async def run_in_image_pool(func: Callable[..., T], *args: Any) -> T:
+    pool, slots = _get_pool()
+    async with slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, func, *args)
+
+
+def shutdown_image_pool() -> None:
+    global _pool, _slots
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+    _slots = None
+
+
+@dataclass
+class NormalizedImage:
+    data: bytes
+    mime: str
+    width: int
+    height: int
+    # new size / oriented source size, for mapping client pixel coordinates
+    scale: float
+    original_size: int
+    seconds: float = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - len(self.data)
+
+
+def _normalize_sync(
+    data: bytes, mime: str, long_edge: int, fmt: str, quality: int
+) -> NormalizedImage:
+    with Image.open(io.BytesIO(data)) as opened:
+        # exif_transpose returns a copy even without an orientation tag
+        rotated = opened.getexif().get(ExifTags.Base.Orientation, 1) != 1
+        image = ImageOps.exif_transpose(opened)
+        width, height = image.size
+        scale = min(1.0, long_edge / max(width, height))
+        if scale >= 1.0 and not rotated and mime == FORMAT_MIME[fmt]:
+            # Already small enough and in the target format: keep original bytes
+            return NormalizedImage(data, mime, width, height, 1.0, len(data))
+
+        if scale < 1.0:
+            image = image.resize(
+                (max(1, round(width * scale)), max(1, round(height * scale))),
+                Image.Resampling.LANCZOS,
+            )
+        if fmt == "jpeg" and image.mode not in {"RGB", "L"}:
+            image = image.convert("RGB")
+        elif image.mode not in {"RGB", "RGBA", "L", "LA"}:
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        buffer = io.BytesIO()
+        save_kwargs: dict[str, Any] = {"quality": quality}
+        if fmt == "jpeg":
+            save_kwargs.update(optimize=True, progressive=True)
+        elif fmt == "webp":
+            save_kwargs.update(method=4)
+        image.save(buffer, format=fmt.upper(), **save_kwargs)
+        encoded = buffer.getvalue()
+
+    if scale >= 1.0 and not rotated and len(encoded) >= len(data):
+        # Re-encoding did not help; fal gets the original
+        return NormalizedImage(data, mime, width, height, 1.0, len(data))
+    new_width, new_height = image.size
+    return NormalizedImage(
+        encoded, FORMAT_MIME[fmt], new_width, new_height, scale, len(data)
+    )
+
+
+async def normalize_upload(data: bytes, mime: str, resolution: str) -> NormalizedImage:
+    """
+    Apply EXIF orientation, downscale to the long edge of the requested
+    resolution and re-encode, in the image process pool.
+    """
+    long_edge = RESOLUTION_LONG_EDGE.get(resolution, RESOLUTION_LONG_EDGE["4K"])
+    started = time.perf_counter()
+    result = await run_in_image_pool(
+        _normalize_sync,
+        data,
+        mime,
+        long_edge,
+        settings.UPLOAD_NORMALIZE_FORMAT,
+        settings.UPLOAD_NORMALIZE_QUALITY,
+    )
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def luminance(rgb: FloatImage) -> FloatImage:
+    """Rec. 709 luma of an HxWx3 image, kept as HxWx1 so it broadcasts."""
+    return cast(FloatImage, (rgb @ _LUMA_WEIGHTS)[..., None])
+
+
+def decode_rgb(data: bytes, long_edge: int) -> tuple[FloatImage, Image.Image | None]:
+    """
+    Oriented source, downscaled to ``long_edge``, as float RGB plus its alpha
+    channel (None for opaque images).
+    """
+    with Image.open(io.BytesIO(data)) as opened:
+        image = ImageOps.exif_transpose(opened)
+        if max(image.size) > long_edge:
+            image.thumbnail((long_edge, long_edge), Image.Resampling.LANCZOS)
+        alpha = image.getchannel("A") if "A" in image.getbands() else None
+        rgb = np.asarray(image.convert("RGB"), dtype=np.float32) / 255.0
+    return rgb, alpha
+
+
+def encode_rgb(rgb: FloatImage, alpha: Image.Image | None, output_format: str) -> bytes:
+    """Encode float RGB (clipped to [0, 1]) in the requested output format."""
+    pixels = (np.clip(rgb, 0, 1) * 255 + 0.5).astype(np.uint8)
+    result = Image.fromarray(pixels, "RGB")
+    fmt = "JPEG" if output_format in {"jpg", "jpeg"} else output_format.upper()
+    if alpha is not None and fmt != "JPEG":
+        result.putalpha(alpha)
+    buffer = io.BytesIO()
+    save_kwargs: dict[str, Any] = {"quality": 92} if fmt in {"JPEG", "WEBP"} else {}
+    result.save(buffer, format=fmt, **save_kwargs)
+    return buffer.getvalue()
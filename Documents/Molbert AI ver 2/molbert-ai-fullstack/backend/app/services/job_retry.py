@@ -0,0 +1,158 @@
+import asyncio
+import datetime
+import logging
+import random
+import time
+from typing import Any
+
+import httpx
+from fastapi import HTTPException
+from faststream.rabbit import RabbitQueue
+from faststream.rabbit.message import RabbitMessage
+
+from app.broker import GENERATION_DLQ, GENERATION_QUEUE, broker
+from app.core.config import settings
+from app.services.broker_connection import broker_supervisor
+
+logger = logging.getLogger(__name__)
+
+ATTEMPT_HEADER = "x-attempt"
+ERROR_CODE_HEADER = "x-error-code"
+ERROR_DETAIL_HEADER = "x-error-detail"
+FAILED_AT_HEADER = "x-failed-at"
+# unix time after which the API no longer waits for the reply
+DEADLINE_HEADER = "x-deadline"
+
+# fal rate limits, gateway errors and timeouts are worth another try;
+# validation errors and content refusals are not.
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+dead_letter_queue = RabbitQueue(GENERATION_DLQ, durable=True)
+
+
+def retry_queue(attempt: int) -> RabbitQueue:
+    """
+    Delay queue for the given retry attempt.
+    Messages sit there until their per-message expiration passes and are then
+    dead-lettered back into the main generation queue.
+    One queue per attempt keeps similar delays together, so head-of-line
+    blocking on expiration is bounded by the jitter spread.
+    """
+    return RabbitQueue(
+        f"{GENERATION_QUEUE}.retry.{attempt}",
+        durable=True,
+        arguments={
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": GENERATION_QUEUE,
+        },
+    )
+
+
+async def declare_retry_topology() -> None:
+    for attempt in range(1, settings.GENERATION_RETRY_MAX_ATTEMPTS + 1):
+        await broker.declare_queue(retry_queue(attempt))
+    await broker.declare_queue(dead_letter_queue)
+
+
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, HTTPException):
+        return exc.status_code in TRANSIENT_STATUS_CODES
+    return isinstance(exc, httpx.TransportError | asyncio.TimeoutError)
+
+
+def describe_error(exc: Exception) -> tuple[int, str]:
+    if isinstance(exc, HTTPException):
+        return exc.status_code, str(exc.detail)
+    if isinstance(exc, httpx.TimeoutException | asyncio.TimeoutError):
+        return 504, f"Таймаут внешнего сервиса: {exc!r}"
+    return 500, str(exc) or repr(exc)
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with "equal jitter": half of the window is fixed,
+    the other half is random, so retries never fire back-to-back but still
+    spread out instead of arriving in synchronized waves.
+    """
+    window = min(
+        settings.GENERATION_RETRY_MAX_DELAY,
+        settings.GENERATION_RETRY_BASE_DELAY * 2 ** (attempt - 1),
+    )
+    return float(window / 2 + random.uniform(0, window / 2))
+
+
+def attempts_made(message: RabbitMessage) -> int:
+    try:
+        return int((message.headers or {}).get(ATTEMPT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def deadline_headers(timeout: float) -> dict[str, Any]:
+    return {DEADLINE_HEADER: time.time() + timeout}
+
+
+def time_left(message: RabbitMessage) -> float | None:
+    """Seconds until the caller stops waiting; None for jobs nobody waits on."""
+    try:
+        return float((message.headers or {})[DEADLINE_HEADER]) - time.time()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def schedule_retry(
+    payload: dict[str, Any], message: RabbitMessage, attempt: int
+) -> float | None:
+    """
+    Republish the job into the delay queue for ``attempt``.
+    reply_to/correlation_id are kept, so the final worker reply still reaches
+    the API caller that is waiting on the original RPC request.
+    Returns the delay, or None when the caller's deadline leaves no room for
+    the delay plus an average attempt: the job then fails now instead of
+    being paid for after the caller has given up.
+    """
+    delay = backoff_delay(attempt)
+    left = time_left(message)
+    if left is not None and left < delay + settings.GENERATION_AVG_SERVICE_SECONDS:
+        return None
+    await broker_supervisor.publish(
+        payload,
+        target="retry",
+        routing_key=retry_queue(attempt).name,
+        headers={**(message.headers or {}), ATTEMPT_HEADER: attempt},
+        correlation_id=message.correlation_id,
+        reply_to=message.reply_to,
+        expiration=delay,
+    )
+    return delay
+
+
+async def dead_letter(
+    payload: dict[str, Any],
+    message: RabbitMessage,
+    *,
+    code: int,
+    detail: str,
+    attempts: int,
+) -> None:
+    """
+    Park a failed job in the dead-letter queue for later inspection/replay.
+    reply_to is dropped on purpose: by the time a job is replayed nobody waits for it.
+    """
+    headers = {
+        **(message.headers or {}),
+        ATTEMPT_HEADER: attempts,
+        ERROR_CODE_HEADER: code,
+        ERROR_DETAIL_HEADER: detail[:1000],
+        FAILED_AT_HEADER: datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    try:
+        await broker_supervisor.publish(
+            payload,
+            target="dlq",
+            routing_key=GENERATION_DLQ,
+            headers=headers,
+            correlation_id=message.correlation_id,
+        )
+    except Exception as exc:  # pragma: no cover - defensive
+        logger.exception("Не удалось отправить задание в DLQ: %s", exc)
@@ -0,0 +1,109 @@
+import uuid
+from dataclasses import dataclass, field
+from typing import Any
+
+import orjson
+from fastapi import HTTPException
+
+from app.services.prompts import render_prompt
+from app.services.storage import local_path, to_public_url
+
+JOB_SCHEMA_VERSION = 2
+
+
+@dataclass
+class GenerationJob:
+    """
+    Compact generation job as published by the API.
+
+    Prompt templates are referenced by id and rendered in the worker, and
+    sources travel as storage keys instead of absolute URLs/filesystem paths.
+    """
+
+    mode: str
+    template: str
+    params: dict[str, Any]
+    source_keys: list[str] = field(default_factory=list)
+    aspect_ratio: str = "auto"
+    output_format: str = "png"
+    resolution: str | None = None
+    # user id, so the worker can store results it produces itself
+    owner: str | None = None
+    # mode-specific switches, e.g. {"crop": True} for region edits
+    options: dict[str, Any] = field(default_factory=dict)
+    # lets the job be cancelled (DELETE /images/jobs/{id}, client disconnect)
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def to_message(self) -> dict[str, Any]:
+        message: dict[str, Any] = {
+            "v": JOB_SCHEMA_VERSION,
+            "id": self.job_id,
+            "m": self.mode,
+            "t": self.template,
+            "p": self.params,
+            "ar": self.aspect_ratio,
+            "of": self.output_format,
+        }
+        if self.source_keys:
+            message["k"] = self.source_keys
+        if self.resolution:
+            message["r"] = self.resolution
+        if self.owner:
+            message["u"] = self.owner
+        if self.options:
+            message["o"] = self.options
+        return message
+
+    def encode(self) -> bytes:
+        return orjson.dumps(self.to_message())
+
+
+def job_mode(message: dict[str, Any]) -> str:
+    return str(message.get("m") or message.get("mode") or "")
+
+
+def job_id(message: dict[str, Any]) -> str | None:
+    # v1 messages have no id and cannot be cancelled
+    return message.get("id")
+
+
+def job_owner(message: dict[str, Any]) -> str | None:
+    return message.get("u") or message.get("owner")
+
+
+def expand_job(message: dict[str, Any]) -> dict[str, Any]:
+    """
+    Turn a queued message into the worker's working payload.
+
+    v1 messages (full prompt text, image_url/image_path) pass through untouched,
+    so messages queued before the rollout keep working.
+    """
+    version = message.get("v", 1)
+    if version == 1:
+        return message
+    if version != JOB_SCHEMA_VERSION:
+        raise HTTPException(
+            status_code=400, detail=f"Неподдерживаемая версия задания {version}"
+        )
+
+    params = message.get("p") or {}
+    payload: dict[str, Any] = {
+        "mode": message["m"],
+        "prompt": render_prompt(message["t"], params),
+        "template": message["t"],
+        "params": params,
+        "aspect_ratio": message.get("ar", "auto"),
+        "output_format": message.get("of", "png"),
+        "resolution": message.get("r"),
+        "owner": message.get("u"),
+        "options": message.get("o") or {},
+    }
+    keys: list[str] = message.get("k") or []
+    if keys:
+        urls = [to_public_url(key) for key in keys]
+        payload["image_url"] = urls[0]
+        payload["image_path"] = local_path(keys[0])
+        if payload["mode"] == "compose":
+            payload["image_urls"] = urls
+            payload["image_paths"] = [local_path(key) for key in keys]
+    return payload
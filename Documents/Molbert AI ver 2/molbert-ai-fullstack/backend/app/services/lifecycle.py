@@ -0,0 +1,266 @@
+"""
+Storage lifecycle: retention, orphan sweeping and purging deleted users.
+
+A sweep streams the storage listing in batches. Per batch, two indexed IN
+queries tell which keys are still referenced by a generation log and which
+owners still exist; then, with one batched delete, it removes
+  * objects of deleted users,
+  * unreferenced objects (failed jobs, abandoned uploads),
+  * referenced objects older than their prefix's retention, together with the
+    generation log rows whose result they were.
+Objects younger than the grace period, derivatives (they have their own LRU)
+and names outside the storage naming scheme are never touched. The last
+processed key is checkpointed after every batch, so an interrupted sweep
+resumes where it stopped.
+
+Reconciliation rescans the whole listing and resets the per-user usage
+counters to what is actually stored.
+"""
+
+import dataclasses
+import json
+import logging
+import time
+import uuid
+from pathlib import Path
+
+from fastapi import HTTPException
+from sqlmodel import Session, col, delete, or_, select
+
+from app.core.config import settings
+from app.models import GenerationLog, User
+from app.services.storage import (
+    LocalStorageBackend,
+    S3StorageBackend,
+    StoredObject,
+    delete_keys,
+    get_backend,
+    is_remote,
+    list_keys,
+    storage_key,
+)
+from app.services.storage_usage import (
+    forget_uploads,
+    record_usage,
+    set_usage,
+    usage_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+
+@dataclasses.dataclass
+class SweepReport:
+    scanned: int = 0
+    deleted_orphans: int = 0
+    deleted_expired: int = 0
+    deleted_owner_gone: int = 0
+    deleted_logs: int = 0
+    last_key: str | None = None
+
+
+def parse_key(key: str) -> tuple[str, uuid.UUID] | None:
+    """
+    (prefix, owner id) of a key written by the storage backends:
+    ``{user}/{prefix}-{uuid}.ext`` on S3, ``[ab/cd/]{prefix}-{user}-{uuid}.ext``
+    on local disk. None for anything else.
+    """
+    name = key.rsplit("/", 1)[-1]
+    prefix, sep, rest = name.partition("-")
+    if not sep:
+        return None
+    first = key.split("/", 1)[0]
+    for candidate in (first, rest[:36]):
+        try:
+            return prefix, uuid.UUID(candidate)
+        except ValueError:
+            continue
+    return None
+
+
+def _reference_forms(key: str) -> list[str]:
+    """Values a generation log may hold for a key (local rows can hold paths)."""
+    backend = get_backend()
+    if not isinstance(backend, LocalStorageBackend):
+        return [key]
+    name = key.rsplit("/", 1)[-1]
+    base = backend.base_path
+    return list(dict.fromkeys([key, name, str(base / key), str(base / name)]))
+
+
+def _process_batch(
+    session: Session, batch: list[StoredObject], report: SweepReport, dry_run: bool
+) -> None:
+    now = time.time()
+    grace = settings.STORAGE_ORPHAN_GRACE_HOURS * 3600
+    retention = settings.STORAGE_RETENTION_DAYS
+    candidates: list[tuple[StoredObject, str, uuid.UUID]] = []
+    for obj in batch:
+        parsed = parse_key(obj.key)
+        if parsed and parsed[0] in retention and now - obj.modified >= grace:
+            candidates.append((obj, *parsed))
+    if not candidates:
+        return
+
+    owners = {owner for _, _, owner in candidates}
+    live = set(session.exec(select(User.id).where(col(User.id).in_(owners))).all())
+    forms = {
+        form: obj.key for obj, _, _ in candidates for form in _reference_forms(obj.key)
+    }
+    referenced: set[str] = set()
+    results: dict[str, list[uuid.UUID]] = {}
+    query = select(GenerationLog.id, GenerationLog.file_path, GenerationLog.source_key)
+    rows = session.exec(
+        query.where(
+            or_(
+                col(GenerationLog.file_path).in_(forms),
+                col(GenerationLog.source_key).in_(forms),
+            )
+        )
+    ).all()
+    for log_id, file_path, source_key in rows:
+        if file_path in forms:
+            referenced.add(forms[file_path])
+            results.setdefault(forms[file_path], []).append(log_id)
+        if source_key in forms:
+            referenced.add(forms[source_key])
+
+    doomed: list[str] = []
+    expired_logs: list[uuid.UUID] = []
+    freed: dict[uuid.UUID, tuple[int, int]] = {}
+    for obj, prefix, owner in candidates:
+        if owner not in live:
+            report.deleted_owner_gone += 1
+        elif obj.key not in referenced:
+            report.deleted_orphans += 1
+        elif retention[prefix] and now - obj.modified > retention[prefix] * DAY:
+            report.deleted_expired += 1
+            expired_logs.extend(results.get(obj.key, []))
+        else:
+            continue
+        doomed.append(obj.key)
+        if owner in live:
+            size, count = freed.get(owner, (0, 0))
+            freed[owner] = (size - obj.size, count - 1)
+
+    report.deleted_logs += len(expired_logs)
+    if dry_run:
+        return
+    # rows first: a log must never point at a deleted result
+    if expired_logs:
+        statement = delete(GenerationLog).where(col(GenerationLog.id).in_(expired_logs))
+        session.exec(statement)  # type: ignore
+        session.commit()
+    delete_keys(doomed)
+    record_usage(freed)
+    forget_uploads(session, doomed)
+
+
+def _load_checkpoint(path: Path) -> SweepReport:
+    try:
+        return SweepReport(**json.loads(path.read_text()))
+    except (OSError, ValueError, TypeError):
+        return SweepReport()
+
+
+def _save_checkpoint(path: Path, report: SweepReport) -> None:
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(dataclasses.asdict(report)))
+    tmp.replace(path)
+
+
+def sweep(
+    session: Session, *, batch_size: int, dry_run: bool = False, restart: bool = False
+) -> SweepReport:
+    checkpoint = Path(settings.STORAGE_SWEEP_CHECKPOINT)
+    report = SweepReport() if restart or dry_run else _load_checkpoint(checkpoint)
+    if report.last_key:
+        logger.info("Продолжаем обход после %s", report.last_key)
+
+    def flush(batch: list[StoredObject]) -> None:
+        _process_batch(session, batch, report, dry_run)
+        report.scanned += len(batch)
+        report.last_key = batch[-1].key
+        if not dry_run:
+            _save_checkpoint(checkpoint, report)
+        logger.info("Обход хранилища: %s", dataclasses.asdict(report))
+
+    batch: list[StoredObject] = []
+    for obj in list_keys("", start_after=report.last_key):
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    if not dry_run:
+        checkpoint.unlink(missing_ok=True)
+    return report
+
+
+def user_storage_refs(session: Session, user_id: uuid.UUID) -> list[str]:
+    """Storage keys referenced by a user's generation logs (streamed)."""
+    # yield_per streams through a server-side cursor instead of loading all rows
+    rows = session.exec(
+        select(GenerationLog.file_path, GenerationLog.source_key)
+        .where(GenerationLog.user_id == user_id)
+        .execution_options(yield_per=1000)
+    )
+    keys: set[str] = set()
+    for file_path, source_key in rows:
+        for ref in (file_path, source_key):
+            if ref and not is_remote(ref):
+                keys.add(ref)
+    return sorted(keys)
+
+
+def purge_user_files(user_id: str, refs: list[str]) -> None:
+    """
+    Delete a removed user's files (background task). On S3 everything under
+    the user's prefix goes; on local disk the referenced files do, and the
+    rest is left to the next sweep, which would otherwise need a full scan.
+    """
+    keys: set[str] = set()
+    for ref in refs:
+        try:
+            keys.add(storage_key(ref))
+        except HTTPException:
+            # a path outside the current storage root
+            continue
+    if isinstance(get_backend(), S3StorageBackend):
+        keys.update(obj.key for obj in list_keys(user_id))
+    deleted = delete_keys(sorted(keys))
+    logger.info("Удалены файлы пользователя %s: %s", user_id, deleted)
+
+
+def reconcile_usage(session: Session) -> int:
+    """
+    Recount every user's bytes/objects from a full listing. Writes that land
+    during the scan are carried over as the difference between the counters
+    before and after it. Returns the number of users updated.
+    """
+    before = usage_snapshot(session)
+    scanned: dict[uuid.UUID, tuple[int, int]] = {}
+    for obj in list_keys(""):
+        parsed = parse_key(obj.key)
+        if parsed is None:
+            continue
+        size, count = scanned.get(parsed[1], (0, 0))
+        scanned[parsed[1]] = (size + obj.size, count + 1)
+
+    after = usage_snapshot(session)
+    users = set(session.exec(select(User.id)).all())
+    usage: dict[uuid.UUID, tuple[int, int]] = {}
+    for user_id in (scanned.keys() | after.keys()) & users:
+        size, count = scanned.get(user_id, (0, 0))
+        old_size, old_count = before.get(user_id, (0, 0))
+        new_size, new_count = after.get(user_id, (0, 0))
+        usage[user_id] = (
+            size + new_size - old_size,
+            count + new_count - old_count,
+        )
+    set_usage(usage)
+    logger.info("Учёт хранилища пересчитан для %s пользователей", len(usage))
+    return len(usage)
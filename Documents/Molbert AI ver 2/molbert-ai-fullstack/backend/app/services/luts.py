@@ -0,0 +1,164 @@
+"""
+3D-LUT colour presets for /images/filter.
+
+Built-in looks are baked into LUTs on first use; extra presets can be dropped
+into LUT_PRESETS_DIR as Adobe/Resolve ``.cube`` files (file stem = preset id).
+"""
+
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import cast
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.imaging import FloatImage, decode_rgb, encode_rgb, luminance
+
+logger = logging.getLogger(__name__)
+
+BUILTIN_LUT_SIZE = 33
+
+
+class LutError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class LutPreset:
+    id: str
+    name: str
+    description: str
+    # shape (N, N, N, 3), indexed [r, g, b]
+    table: FloatImage
+
+
+def parse_cube(text: str) -> FloatImage:
+    """Parse a .cube file into an [r, g, b] indexed table in [0, 1]."""
+    size = 0
+    rows: list[list[float]] = []
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith("#"):
+            continue
+        keyword, _, rest = line.partition(" ")
+        if keyword == "LUT_3D_SIZE":
+            size = int(rest)
+        elif keyword in {"DOMAIN_MIN", "DOMAIN_MAX"}:
+            expected = 0.0 if keyword == "DOMAIN_MIN" else 1.0
+            if any(float(v) != expected for v in rest.split()):
+                raise LutError("Поддерживается только домен 0..1")
+        elif keyword == "LUT_1D_SIZE":
+            raise LutError("1D LUT не поддерживается")
+        elif keyword in {"TITLE", "LUT_3D_INPUT_RANGE"}:
+            continue
+        else:
+            rows.append([float(v) for v in line.split()])
+    if size < 2 or len(rows) != size**3:
+        raise LutError("Некорректный размер LUT")
+    table = np.array(rows, np.float32)
+    # .cube lists red fastest, so the flat order reshapes to [b, g, r]
+    return np.clip(table.reshape(size, size, size, 3).transpose(2, 1, 0, 3), 0, 1)
+
+
+def apply_lut(rgb: FloatImage, table: FloatImage) -> FloatImage:
+    """Vectorized trilinear interpolation of a float32 HxWx3 image in [0, 1]."""
+    size = table.shape[0]
+    scaled = np.clip(rgb, 0, 1) * (size - 1)
+    base = np.minimum(scaled.astype(np.int32), size - 2)
+    frac = scaled - base
+    r0, g0, b0 = base[..., 0], base[..., 1], base[..., 2]
+    r1, g1, b1 = r0 + 1, g0 + 1, b0 + 1
+    fr, fg, fb = frac[..., 0:1], frac[..., 1:2], frac[..., 2:3]
+
+    c00 = table[r0, g0, b0] * (1 - fr) + table[r1, g0, b0] * fr
+    c10 = table[r0, g1, b0] * (1 - fr) + table[r1, g1, b0] * fr
+    c01 = table[r0, g0, b1] * (1 - fr) + table[r1, g0, b1] * fr
+    c11 = table[r0, g1, b1] * (1 - fr) + table[r1, g1, b1] * fr
+    c0 = c00 * (1 - fg) + c10 * fg
+    c1 = c01 * (1 - fg) + c11 * fg
+    return cast(FloatImage, c0 * (1 - fb) + c1 * fb)
+
+
+def _identity(size: int) -> FloatImage:
+    axis = np.linspace(0, 1, size, dtype=np.float32)
+    r, g, b = np.meshgrid(axis, axis, axis, indexing="ij")
+    return np.stack([r, g, b], axis=-1)
+
+
+def _s_curve(x: FloatImage, amount: float) -> FloatImage:
+    """Contrast curve anchored at 0, 0.5 and 1; slope at mid-grey is 1 + amount."""
+    return cast(FloatImage, x - amount * np.sin(2 * np.pi * x) / (2 * np.pi))
+
+
+def _black_and_white(rgb: FloatImage) -> FloatImage:
+    return np.repeat(_s_curve(luminance(rgb), 0.3), 3, axis=-1)
+
+
+def _sepia(rgb: FloatImage) -> FloatImage:
+    matrix = np.array(
+        [[0.393, 0.769, 0.189], [0.349, 0.686, 0.168], [0.272, 0.534, 0.131]],
+        np.float32,
+    )
+    return rgb @ matrix.T
+
+
+def _film(rgb: FloatImage) -> FloatImage:
+    # lifted blacks, gentle S-curve, slightly warm and muted
+    luma = luminance(rgb)
+    muted = luma + (rgb - luma) * 0.85
+    lifted = 0.06 + _s_curve(muted, 0.2) * 0.9
+    return lifted * np.array([1.03, 1.0, 0.94], np.float32)
+
+
+def _teal_orange(rgb: FloatImage) -> FloatImage:
+    luma = luminance(rgb)
+    teal = np.array([0.0, 0.45, 0.5], np.float32)
+    orange = np.array([1.0, 0.6, 0.3], np.float32)
+    shadows = np.clip(1 - luma * 2, 0, 1) * 0.25
+    highlights = np.clip(luma * 2 - 1, 0, 1) * 0.2
+    toned = rgb * (1 - shadows - highlights) + teal * shadows + orange * highlights
+    toned_luma = luminance(toned)
+    return cast(FloatImage, toned_luma + (toned - toned_luma) * 1.15)
+
+
+_BUILTINS: dict[str, tuple[str, str, Callable[[FloatImage], FloatImage]]] = {
+    "bw": ("Чёрно-белый", "Монохром с мягкой S-кривой", _black_and_white),
+    "sepia": ("Сепия", "Классическое тонирование сепией", _sepia),
+    "film": ("Плёнка", "Приподнятые тени, тёплый приглушённый цвет", _film),
+    "teal-orange": ("Teal & Orange", "Бирюзовые тени и тёплые света", _teal_orange),
+}
+
+
+@lru_cache
+def get_presets() -> dict[str, LutPreset]:
+    """Preset catalogue; built once per process (API and image pool workers)."""
+    identity = _identity(BUILTIN_LUT_SIZE)
+    presets = {
+        preset_id: LutPreset(
+            preset_id, name, description, np.clip(transform(identity), 0, 1)
+        )
+        for preset_id, (name, description, transform) in _BUILTINS.items()
+    }
+    if settings.LUT_PRESETS_DIR:
+        for path in sorted(Path(settings.LUT_PRESETS_DIR).glob("*.cube")):
+            try:
+                table = parse_cube(path.read_text())
+            except (LutError, ValueError) as exc:
+                logger.warning("Пропущен LUT %s: %s", path.name, exc)
+                continue
+            presets[path.stem] = LutPreset(path.stem, path.stem, "", table)
+    return presets
+
+
+def apply_preset_sync(
+    data: bytes, preset_id: str, strength: float, long_edge: int, output_format: str
+) -> bytes:
+    preset = get_presets()[preset_id]
+    rgb, alpha = decode_rgb(data, long_edge)
+    graded = apply_lut(rgb, preset.table)
+    if strength < 1:
+        graded = rgb + (graded - rgb) * strength
+    return encode_rgb(graded, alpha, output_format)
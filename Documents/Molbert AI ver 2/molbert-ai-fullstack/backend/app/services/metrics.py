@@ -0,0 +1,180 @@
+"""
+Prometheus metrics of the API and the worker.
+
+With several uvicorn workers each process writes its samples to files in
+PROMETHEUS_MULTIPROC_DIR and /metrics merges them; the directory has to be
+emptied before the server starts (scripts/start.sh does). Without the variable
+a process serves its own registry. Labels only take values from closed sets
+(route templates, modes, resolutions, providers, storage operations), never
+ids, keys or raw paths, so the number of series stays bounded.
+"""
+
+import os
+import time
+from collections.abc import Collection
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.histogram import LATENCY_BUCKETS, SERVICE_TIME_BUCKETS
+
+if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    # e.g. `fastapi run --reload`, which does not go through scripts/start.sh
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+# API requests span both: millisecond lookups and minute-long generations
+REQUEST_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    20,
+    30,
+    60,
+    120,
+    300,
+)
+SIZE_BUCKETS = tuple(float(2**n) for n in range(14, 27))  # 16 KiB .. 64 MiB
+
+MODES = frozenset(
+    {"text-to-image", "compose", "edit", "filter", "adjust", "region-edit"}
+)
+RESOLUTIONS = frozenset({"1K", "2K", "4K"})
+METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+
+def bounded(value: object, allowed: Collection[str]) -> str:
+    """`value` if it is one of `allowed`, else "other"."""
+    text = str(value) if value is not None else ""
+    return text if text in allowed else "other"
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "API request latency per route template",
+    ["method", "route", "status"],
+    buckets=REQUEST_BUCKETS,
+)
+DB_POOL_CHECKOUT = Histogram(
+    "db_pool_checkout_seconds",
+    "Wait for a database connection from the pool",
+    buckets=LATENCY_BUCKETS,
+)
+BROKER_PUBLISH = Histogram(
+    "broker_publish_seconds",
+    "RabbitMQ publish latency (until confirmed)",
+    ["target"],
+    buckets=LATENCY_BUCKETS,
+)
+BROKER_RPC = Histogram(
+    "broker_rpc_seconds",
+    "Generation RPC round-trip: publish to worker reply",
+    ["mode"],
+    buckets=SERVICE_TIME_BUCKETS,
+)
+QUEUE_WAIT = Histogram(
+    "generation_queue_wait_seconds",
+    "Time a generation job spent queued (round-trip minus service time)",
+    ["mode"],
+    buckets=SERVICE_TIME_BUCKETS,
+)
+SERVICE_TIME = Histogram(
+    "generation_service_seconds",
+    "Time a worker spent on a generation job",
+    ["mode"],
+    buckets=SERVICE_TIME_BUCKETS,
+)
+PROVIDER_LATENCY = Histogram(
+    "generation_provider_seconds",
+    "Latency of one provider call (fal, Gemini)",
+    ["provider", "mode", "resolution", "outcome"],
+    buckets=SERVICE_TIME_BUCKETS,
+)
+CANCELLED = Counter(
+    "generation_cancelled_total",
+    "Cancelled generation jobs",
+    ["reason"],
+)
+UPLOAD_SIZE = Histogram(
+    "upload_size_bytes",
+    "Size of accepted source uploads",
+    ["kind"],
+    buckets=SIZE_BUCKETS,
+)
+STORAGE_LATENCY = Histogram(
+    "storage_operation_seconds",
+    "Storage backend operation latency",
+    ["operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def _registry() -> CollectorRegistry:
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)  # type: ignore[no-untyped-call]
+    return registry
+
+
+def render() -> tuple[bytes, str]:
+    """Exposition body and content type for /metrics."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_server(port: int) -> None:
+    """Serve /metrics from a background thread (the worker has no HTTP app)."""
+    start_http_server(port, registry=_registry())
+
+
+class MetricsMiddleware:
+    """
+    Request latency per route template. Plain ASGI rather than
+    BaseHTTPMiddleware, so streamed responses and disconnect detection in the
+    routes are left alone.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router stores the matched route in the scope; mounts
+            # (/media) only set their root_path
+            route = scope.get("route")
+            template = (
+                getattr(route, "path", None) or scope.get("root_path") or "unmatched"
+            )
+            REQUEST_LATENCY.labels(
+                bounded(scope["method"], METHODS), template, f"{status // 100}xx"
+            ).observe(time.perf_counter() - started)
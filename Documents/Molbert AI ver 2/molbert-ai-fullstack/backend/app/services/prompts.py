@@ -0,0 +1,71 @@
+from typing import Any
+
+from fastapi import HTTPException
+
+RETOUCH_TEMPLATE = """You are an expert photo editor AI. Apply a localized, realistic edit to the provided image.
+User Request: "{user_prompt}"
+Edit Location: Focus around pixel coordinates (x: {x}, y: {y}).
+
+Guidelines:
+- Keep the edit natural and seamless.
+- Do not change the rest of the image outside the localized area.
+- Accept standard skin tone changes (tan, lighter, darker).
+- Refuse requests that change fundamental race/ethnicity.
+
+Return only the final edited image."""
+
+
+FILTER_TEMPLATE = """You are an expert photo editor AI. Apply a stylistic filter to the entire image.
+Filter Request: "{user_prompt}"
+
+Guidelines:
+- Adjust colors/style without changing composition.
+- Do not change a person's race/ethnicity.
+
+Return only the final filtered image."""
+
+
+ADJUST_TEMPLATE = """You are an expert photo editor AI. Apply a global adjustment to the image.
+Adjustment Request: "{user_prompt}"
+
+Guidelines:
+- The whole image should be adjusted and remain photorealistic.
+- Accept standard skin tone changes (tan, lighter, darker).
+- Refuse requests that change fundamental race/ethnicity.
+
+Return only the final adjusted image."""
+
+
+COMPOSE_TEMPLATE = """You are an expert photo compositor AI. Transform or compose the provided image based on the user's creative request.
+User Request: "{user_prompt}"
+
+Guidelines:
+- Creatively transform, remix, or compose the image as requested.
+- You may combine elements, change style, add artistic effects, or create variations.
+- Maintain high quality and coherent composition.
+- Be creative while respecting the user's intent.
+
+Return only the final composed image."""
+
+
+# Job messages carry only the template id; bump the suffix when wording changes
+# so in-flight messages keep rendering with the text they were queued with.
+TEMPLATES: dict[str, str] = {
+    "retouch.v1": RETOUCH_TEMPLATE,
+    "filter.v1": FILTER_TEMPLATE,
+    "adjust.v1": ADJUST_TEMPLATE,
+    "compose.v1": COMPOSE_TEMPLATE,
+    "plain.v1": "{user_prompt}",
+}
+
+
+def render_prompt(template_id: str, params: dict[str, Any]) -> str:
+    template = TEMPLATES.get(template_id)
+    if template is None:
+        raise HTTPException(status_code=400, detail=f"Неизвестный шаблон {template_id}")
+    try:
+        return template.format(**params)
+    except KeyError as exc:
+        raise HTTPException(
+            status_code=400, detail=f"Не хватает параметра шаблона {exc}"
+        ) from exc
@@ -0,0 +1,263 @@
+"""
+Provider routing for the generation worker.
+
+Each provider keeps a service-time histogram per mode and a sliding window of
+outcomes. A job goes to the configured provider with the lowest median for
+its mode; a provider whose transient-error rate crosses the threshold sits
+out a cool-down. With hedging on, a second request goes to the runner-up once
+the first has run past its p95, and whichever finishes first wins while the
+other is cancelled. Hedges draw from a token budget that refills by a fixed
+fraction of the primary requests, so they can add at most that share of
+extra spend.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any, TypeVar
+
+from app.core.config import settings
+from app.services import job_retry
+from app.services.histogram import Histogram
+from app.services.metrics import MODES, PROVIDER_LATENCY, RESOLUTIONS, bounded
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# below this many samples a provider's latency for a mode is not trusted
+MIN_SAMPLES = 5
+
+
+def is_configured(provider: str) -> bool:
+    if provider == "fal":
+        return bool(settings.FAL_API_KEY)
+    if provider == "gemini":
+        return bool(settings.GEMINI_API_KEY)
+    return False
+
+
+class ProviderStats:
+    def __init__(self) -> None:
+        self.latency: dict[str, Histogram] = {}
+        self.outcomes: deque[bool] = deque(maxlen=settings.GENERATION_PROVIDER_WINDOW)
+        self.unhealthy_until = 0.0
+        self.wins = 0
+        self.cancelled = 0
+
+    def observe(self, mode: str, seconds: float) -> None:
+        self.latency.setdefault(mode, Histogram()).observe(seconds)
+
+    def quantile(self, mode: str, q: float) -> float | None:
+        histogram = self.latency.get(mode)
+        if histogram is None or histogram.count < MIN_SAMPLES:
+            return None
+        return histogram.quantile(q)
+
+    def record(self, ok: bool) -> None:
+        self.outcomes.append(ok)
+        if len(self.outcomes) < MIN_SAMPLES:
+            return
+        if self.error_rate >= settings.GENERATION_PROVIDER_ERROR_RATE:
+            self.unhealthy_until = (
+                time.monotonic() + settings.GENERATION_PROVIDER_COOLDOWN
+            )
+            # start over once the cool-down ends
+            self.outcomes.clear()
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+
+class HedgeBudget:
+    """Token bucket: every primary request adds `ratio` tokens, a hedge costs one."""
+
+    def __init__(self, ratio: float, burst: float) -> None:
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.spent = 0
+        self.denied = 0
+
+    def deposit(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            self.denied += 1
+            return False
+        self.tokens -= 1
+        self.spent += 1
+        return True
+
+
+class ProviderRouter:
+    def __init__(self) -> None:
+        self.stats: dict[str, ProviderStats] = {}
+        self.budget = HedgeBudget(
+            settings.GENERATION_HEDGE_BUDGET, settings.GENERATION_HEDGE_BURST
+        )
+
+    def _stats(self, provider: str) -> ProviderStats:
+        return self.stats.setdefault(provider, ProviderStats())
+
+    def rank(self, mode: str, candidates: list[str]) -> list[str]:
+        """
+        Healthy providers by median latency for the mode. Without enough
+        samples a provider is assumed to take the average service time, and
+        ties go to GENERATION_PROVIDER. If every provider is cooling down,
+        all of them are candidates again.
+        """
+        healthy = [p for p in candidates if self._stats(p).healthy] or candidates
+
+        def key(provider: str) -> tuple[float, bool]:
+            median = self._stats(provider).quantile(mode, 0.5)
+            estimate = (
+                settings.GENERATION_AVG_SERVICE_SECONDS if median is None else median
+            )
+            return estimate, provider != settings.GENERATION_PROVIDER
+
+        return sorted(healthy, key=key)
+
+    def hedge_delay(self, provider: str, mode: str) -> float | None:
+        return self._stats(provider).quantile(mode, settings.GENERATION_HEDGE_QUANTILE)
+
+    async def _call(
+        self,
+        provider: str,
+        mode: str,
+        resolution: str | None,
+        call: Callable[[], Awaitable[T]],
+    ) -> T:
+        stats = self._stats(provider)
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await call()
+            outcome = "ok"
+        except asyncio.CancelledError:
+            stats.cancelled += 1
+            outcome = "cancelled"
+            raise
+        except Exception as exc:
+            if job_retry.is_transient(exc):
+                stats.record(False)
+            raise
+        finally:
+            PROVIDER_LATENCY.labels(
+                provider,
+                bounded(mode, MODES),
+                bounded(resolution, RESOLUTIONS),
+                outcome,
+            ).observe(time.perf_counter() - started)
+        stats.observe(mode, time.perf_counter() - started)
+        stats.record(True)
+        return result
+
+    async def run(
+        self,
+        mode: str,
+        calls: Mapping[str, Callable[[], Awaitable[T]]],
+        *,
+        resolution: str | None = None,
+    ) -> tuple[str, T]:
+        """
+        Run a job through the best provider (hedging if enabled) and return
+        (provider, result). `calls` maps a provider name to a coroutine
+        factory doing the job on that provider.
+        """
+        candidates: list[str] = [
+            p for p in settings.GENERATION_PROVIDERS if p in calls and is_configured(p)
+        ]
+        if not candidates:
+            # let the preferred provider report why it cannot run
+            candidates = [settings.GENERATION_PROVIDER]
+        ranked = self.rank(mode, candidates)
+        primary = ranked[0]
+        self.budget.deposit()
+        first = asyncio.create_task(
+            self._call(primary, mode, resolution, calls[primary])
+        )
+        tasks = {first: primary}
+        starts = {first: time.perf_counter()}
+        try:
+            delay = None
+            if settings.GENERATION_HEDGE_ENABLED and len(ranked) > 1:
+                delay = self.hedge_delay(primary, mode)
+            if delay is not None:
+                done, _ = await asyncio.wait({first}, timeout=delay)
+                if not done and self.budget.try_spend():
+                    backup = ranked[1]
+                    logger.info(
+                        "%s: %s дольше %.1f с, отправляем запрос в %s",
+                        mode,
+                        primary,
+                        delay,
+                        backup,
+                    )
+                    second = self._call(backup, mode, resolution, calls[backup])
+                    hedge = asyncio.create_task(second)
+                    tasks[hedge] = backup
+                    starts[hedge] = time.perf_counter()
+            return await self._first_success(mode, tasks, starts)
+        finally:
+            # the loser, or everything if we were cancelled ourselves
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _first_success(
+        self,
+        mode: str,
+        tasks: dict["asyncio.Task[T]", str],
+        starts: dict["asyncio.Task[T]", float],
+    ) -> tuple[str, T]:
+        pending = set(tasks)
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                exc = task.exception()
+                if exc is None:
+                    self._stats(tasks[task]).wins += 1
+                    for loser in pending:
+                        # a lost hedge ran at least this long
+                        elapsed = time.perf_counter() - starts[loser]
+                        self._stats(tasks[loser]).observe(mode, elapsed)
+                    return tasks[task], task.result()
+                error = error or exc
+        assert error is not None
+        raise error
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "providers": {
+                provider: {
+                    "healthy": stats.healthy,
+                    "error_rate": round(stats.error_rate, 3),
+                    "wins": stats.wins,
+                    "cancelled": stats.cancelled,
+                    "latency": {
+                        mode: histogram.summary()
+                        for mode, histogram in stats.latency.items()
+                    },
+                }
+                for provider, stats in self.stats.items()
+            },
+            "hedges": {"spent": self.budget.spent, "denied": self.budget.denied},
+        }
+
+
+provider_router = ProviderRouter()
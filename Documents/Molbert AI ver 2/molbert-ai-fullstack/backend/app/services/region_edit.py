@@ -0,0 +1,97 @@
+"""
+Crop-and-composite helpers for localized edits.
+
+Only a window around the edit point is sent to fal; the edited window is then
+blended back into the untouched original with a feathered mask. Coordinates
+are those of the image as displayed, so sources are used with their EXIF
+orientation applied (direct uploads are not normalized on the way in).
+"""
+
+import io
+
+import numpy as np
+import numpy.typing as npt
+from PIL import ExifTags, Image, ImageOps
+
+Box = tuple[int, int, int, int]  # left, top, right, bottom
+
+
+def crop_window(width: int, height: int, x: int, y: int, size: int) -> Box:
+    """Square window of ``size`` centred on (x, y), shifted to stay inside the image."""
+    crop_w, crop_h = min(size, width), min(size, height)
+    left = min(max(x - crop_w // 2, 0), width - crop_w)
+    top = min(max(y - crop_h // 2, 0), height - crop_h)
+    return left, top, left + crop_w, top + crop_h
+
+
+def feather_mask(
+    box: Box, width: int, height: int, feather: int
+) -> npt.NDArray[np.float32]:
+    """
+    Blend weights for the window: 1 inside, ramping to 0 over ``feather``
+    pixels towards window edges. Edges that touch the image border are not
+    feathered, there is nothing to blend with there.
+    """
+    left, top, right, bottom = box
+    crop_w, crop_h = right - left, bottom - top
+    feather = max(feather, 1)
+    xs = np.arange(crop_w, dtype=np.float32)
+    ys = np.arange(crop_h, dtype=np.float32)
+    from_left = xs + 1 if left > 0 else np.full(crop_w, np.inf, np.float32)
+    from_right = crop_w - xs if right < width else np.full(crop_w, np.inf, np.float32)
+    from_top = ys + 1 if top > 0 else np.full(crop_h, np.inf, np.float32)
+    from_bottom = (
+        crop_h - ys if bottom < height else np.full(crop_h, np.inf, np.float32)
+    )
+    ramp_x = np.clip(np.minimum(from_left, from_right) / feather, 0.0, 1.0)
+    ramp_y = np.clip(np.minimum(from_top, from_bottom) / feather, 0.0, 1.0)
+    return np.minimum.outer(ramp_y, ramp_x)
+
+
+def _upright(data: bytes) -> Image.Image:
+    with Image.open(io.BytesIO(data)) as opened:
+        # a transposed copy, loaded before the file closes
+        return ImageOps.exif_transpose(opened)
+
+
+def image_size(data: bytes) -> tuple[int, int]:
+    """Displayed size, from the header only."""
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        # orientations 5-8 swap the axes
+        if image.getexif().get(ExifTags.Base.Orientation, 1) in {5, 6, 7, 8}:
+            return height, width
+        return width, height
+
+
+def crop_sync(data: bytes, box: Box) -> bytes:
+    cropped = _upright(data).convert("RGB").crop(box)
+    buffer = io.BytesIO()
+    cropped.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def composite_sync(
+    original: bytes, edited: bytes, box: Box, feather: int, output_format: str
+) -> bytes:
+    """Resize the edited window to the crop size and blend it into the original."""
+    left, top, right, bottom = box
+    base = np.asarray(_upright(original).convert("RGB"), dtype=np.float32)
+    with Image.open(io.BytesIO(edited)) as patch_image:
+        patch = np.asarray(
+            patch_image.convert("RGB").resize(
+                (right - left, bottom - top), Image.Resampling.LANCZOS
+            ),
+            dtype=np.float32,
+        )
+
+    height, width = base.shape[:2]
+    alpha = feather_mask(box, width, height, feather)[..., None]
+    region = base[top:bottom, left:right]
+    base[top:bottom, left:right] = region + (patch - region) * alpha
+
+    result = Image.fromarray(np.clip(base + 0.5, 0, 255).astype(np.uint8), "RGB")
+    buffer = io.BytesIO()
+    fmt = "JPEG" if output_format in {"jpg", "jpeg"} else output_format.upper()
+    result.save(buffer, format=fmt)
+    return buffer.getvalue()
@@ -0,0 +1,191 @@
+"""
+Worker-local, size-bounded on-disk LRU cache of source images.
+
+Sources are stored by content digest, so the same bytes referenced by several
+keys are kept once. References (storage keys / provider URLs) are immutable,
+which makes the reference -> digest index safe to keep in memory; it is
+rebuilt as jobs arrive after a restart. URLs a source was published under for
+fal are remembered per digest for SOURCE_CACHE_URL_TTL.
+
+get/put do blocking disk work and are called from the worker's threadpool;
+the in-memory index is guarded by a lock, file reads, hashing and writes
+happen outside it.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_ratio(self) -> float | None:
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+    def as_dict(self) -> dict[str, Any]:
+        ratio = self.hit_ratio
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(ratio, 3) if ratio is not None else None,
+        }
+
+
+class SourceCache:
+    def __init__(self, root: Path, max_bytes: int, url_ttl: float) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.url_ttl = url_ttl
+        self.stats = CacheStats()
+        self.url_stats = CacheStats()
+        self._entries: OrderedDict[str, int] = OrderedDict()  # digest -> size
+        self._size = 0
+        self._digests: dict[str, str] = {}  # reference -> digest
+        self._urls: dict[str, tuple[str, float]] = {}  # digest -> (url, expires)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def _load(self) -> None:
+        """Adopt files left by a previous run, oldest access first."""
+        self._loaded = True
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = sorted(
+            (p for p in self.root.glob("??/*") if p.is_file() and ".tmp" not in p.name),
+            key=lambda p: p.stat().st_mtime,
+        )
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.name] = size
+            self._size += size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            digest, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._urls.pop(digest, None)
+            self._path(digest).unlink(missing_ok=True)
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+    def get(self, reference: str) -> bytes | None:
+        self._ensure_loaded()
+        with self._lock:
+            digest = self._digests.get(reference)
+            if digest is None or digest not in self._entries:
+                self.stats.misses += 1
+                return None
+        path = self._path(digest)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            # evicted by another thread meanwhile, or removed from disk
+            with self._lock:
+                self._size -= self._entries.pop(digest, 0)
+                self.stats.misses += 1
+            return None
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+            self.stats.hits += 1
+        return data
+
+    def put(self, reference: str, data: bytes) -> str:
+        self._ensure_loaded()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._digests[reference] = digest
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return digest
+        if len(data) > self.max_bytes:
+            return digest
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # unique per writer: two threads may store the same digest at once
+        tmp = path.with_name(f"{digest}.{uuid.uuid4().hex}.tmp")
+        try:
+            tmp.write_bytes(data)
+            tmp.replace(path)
+        except OSError as exc:
+            tmp.unlink(missing_ok=True)
+            logger.warning("Не удалось записать в кэш источников: %s", exc)
+            return digest
+        with self._lock:
+            if digest not in self._entries:
+                self._entries[digest] = len(data)
+                self._size += len(data)
+                self._evict()
+        return digest
+
+    def digest_of(self, reference: str) -> str | None:
+        return self._digests.get(reference)
+
+    def published_url(self, digest: str) -> str | None:
+        entry = self._urls.get(digest)
+        if entry is None or entry[1] < time.monotonic():
+            self._urls.pop(digest, None)
+            self.url_stats.misses += 1
+            return None
+        self.url_stats.hits += 1
+        return entry[0]
+
+    def remember_url(self, digest: str, url: str) -> None:
+        self._urls[digest] = (url, time.monotonic() + self.url_ttl)
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "sources": self.stats.as_dict(),
+            "published_urls": self.url_stats.as_dict(),
+        }
+
+
+source_cache = SourceCache(
+    Path(settings.SOURCE_CACHE_DIR),
+    settings.SOURCE_CACHE_MAX_BYTES,
+    settings.SOURCE_CACHE_URL_TTL,
+)
+
+# API side: latest cumulative counters reported by each worker in its replies
+_worker_stats: dict[str, CacheStats] = {}
+
+
+def record_worker_stats(worker: str, hits: int, misses: int) -> None:
+    _worker_stats[worker] = CacheStats(hits, misses)
+
+
+def worker_cache_report() -> dict[str, Any]:
+    total = CacheStats(
+        sum(s.hits for s in _worker_stats.values()),
+        sum(s.misses for s in _worker_stats.values()),
+    )
+    return {
+        **total.as_dict(),
+        "workers": {name: s.as_dict() for name, s in _worker_stats.items()},
+    }
@@ -1,45 +1,221 @@
 import base64
+import io
+import logging
+import os
+import threading
+import time
 import uuid
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Protocol
+from typing import Any, Protocol, cast
 
-import boto3
+import boto3  # type: ignore[import-untyped]
+from boto3.s3.transfer import TransferConfig  # type: ignore[import-untyped]
+from botocore.config import Config  # type: ignore[import-untyped]
 from fastapi import HTTPException
 
 from app.core.config import settings
+from app.services.disk_cache import DiskCache
+from app.services.histogram import LATENCY_BUCKETS, Histogram
+from app.services.metrics import STORAGE_LATENCY
+from app.services.storage_usage import record_write
+
+logger = logging.getLogger(__name__)
+
+# DeleteObjects accepts at most 1000 keys per request
+S3_DELETE_BATCH_SIZE = 1000
+
+
+EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/webp": ".webp",
+}
+
+
+@dataclass
+class StoredObject:
+    key: str
+    size: int
+    # modification time, unix seconds
+    modified: float
+    # changes whenever the object is rewritten (S3 ETag; mtime and size locally)
+    etag: str | None = None
 
 
 class StorageBackend(Protocol):
     def save(self, data: bytes, mime: str, user_id: str, prefix: str) -> str: ...
 
+    def new_key(self, mime: str, user_id: str, prefix: str) -> str: ...
+
     def to_public_url(self, stored_path: str) -> str: ...
 
+    def to_key(self, stored_path: str) -> str: ...
+
+    def local_path(self, key: str) -> str | None: ...
+
+    def owns(self, key: str, user_id: str) -> bool: ...
+
+    def read(self, key: str) -> bytes: ...
+
+    def put(self, key: str, data: bytes, mime: str) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    def delete_many(self, keys: list[str]) -> int: ...
+
+    def list(
+        self, prefix: str, start_after: str | None = None
+    ) -> Iterator[StoredObject]: ...
+
+    def stat(self, key: str) -> StoredObject: ...
+
+    def read_range(self, key: str, start: int, length: int) -> bytes: ...
+
+
+def shard_dir(name: str) -> str | None:
+    """
+    Two-level shard directory ("ab/cd") for a stored file name ending in a
+    uuid4, which is random enough to spread files evenly. None for other names.
+    """
+    try:
+        digest = uuid.UUID(Path(name).stem[-36:]).hex
+    except ValueError:
+        return None
+    return f"{digest[:2]}/{digest[2:4]}"
+
 
 class LocalStorageBackend:
+    """
+    Files live under ``ab/cd/{prefix}-{user_id}-{uuid}.ext``. Files from the old
+    flat layout stay readable by their flat key/path: lookups fall back to the
+    shard directory once ``python -m app.storage_migrate`` has moved them.
+    """
+
     def __init__(self, base_path: Path) -> None:
         self.base_path = base_path.resolve()
         self.base_path.mkdir(parents=True, exist_ok=True)
 
+    def new_key(self, mime: str, user_id: str, prefix: str) -> str:
+        name = f"{prefix}-{user_id}-{uuid.uuid4()}{EXTENSIONS.get(mime, '.png')}"
+        return f"{shard_dir(name)}/{name}"
+
     def save(self, data: bytes, mime: str, user_id: str, prefix: str) -> str:
-        ext = {
-            "image/png": ".png",
-            "image/jpeg": ".jpg",
-            "image/jpg": ".jpg",
-            "image/webp": ".webp",
-        }.get(mime, ".png")
-        filename = f"{prefix}-{user_id}-{uuid.uuid4()}{ext}"
-        file_path = self.base_path / filename
+        file_path = self.base_path / self.new_key(mime, user_id, prefix)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
         with open(file_path, "wb") as f:
             f.write(data)
         return str(file_path)
 
-    def to_public_url(self, stored_path: str) -> str:
-        if isinstance(stored_path, str) and stored_path.startswith("http"):
-            return stored_path
+    def _resolve(self, stored_path: str) -> Path:
+        # stored paths are absolute; storage keys are relative to base_path
+        path = Path(stored_path)
+        if not path.is_absolute():
+            path = self.base_path / path
+        return path.resolve()
+
+    def _locate(self, stored_path: str) -> Path:
+        """Path inside base_path, following a flat-layout file to its shard."""
+        key = self.to_key(stored_path)
+        path = self.base_path / key
+        if "/" not in key and not path.exists():
+            shard = shard_dir(key)
+            if shard:
+                moved = self.base_path / shard / key
+                if moved.exists():
+                    return moved
+        return path
+
+    def to_key(self, stored_path: str) -> str:
         try:
-            relative = Path(stored_path).resolve().relative_to(self.base_path)
+            return self._resolve(stored_path).relative_to(self.base_path).as_posix()
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid stored file path")
+
+    def local_path(self, key: str) -> str | None:
+        return str(self._locate(key))
+
+    def owns(self, key: str, user_id: str) -> bool:
+        return f"-{user_id}-" in Path(self.to_key(key)).name
+
+    def read(self, key: str) -> bytes:
+        path = self._locate(key)
+        if not path.is_file():
+            raise HTTPException(status_code=404, detail="Файл не найден")
+        return path.read_bytes()
+
+    def put(self, key: str, data: bytes, mime: str) -> None:
+        path = self.base_path / self.to_key(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+
+    def delete(self, key: str) -> None:
+        self._locate(key).unlink(missing_ok=True)
+
+    def delete_many(self, keys: list[str]) -> int:
+        # unlink is a metadata round-trip each; overlap them
+        with ThreadPoolExecutor(settings.STORAGE_DELETE_WORKERS) as pool:
+            list(pool.map(self.delete, keys))
+        return len(keys)
+
+    def list(
+        self, prefix: str, start_after: str | None = None
+    ) -> Iterator[StoredObject]:
+        root = self.base_path / prefix if prefix else self.base_path
+        if not root.is_dir():
+            return
+        yield from self._walk(
+            root, tuple(start_after.split("/")) if start_after else ()
+        )
+
+    def _walk(self, directory: Path, after: tuple[str, ...]) -> Iterator[StoredObject]:
+        # Sorted depth-first walk: keys come out in path-component order, so a
+        # listing can resume after a checkpointed key, skipping whole shards.
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        for entry in entries:
+            if entry.name.endswith(".tmp") or entry.name.startswith("."):
+                continue
+            parts = Path(entry.path).relative_to(self.base_path).parts
+            if parts < after[: len(parts)]:
+                continue
+            if entry.is_dir():
+                yield from self._walk(Path(entry.path), after)
+            elif parts > after:
+                stat = entry.stat()
+                yield StoredObject("/".join(parts), stat.st_size, stat.st_mtime)
+
+    def stat(self, key: str) -> StoredObject:
+        path = self._locate(key)
+        if not path.is_file():
+            raise HTTPException(status_code=404, detail="Файл не найден")
+        stat = path.stat()
+        return StoredObject(
+            self.to_key(key),
+            stat.st_size,
+            stat.st_mtime,
+            f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+        )
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        path = self._locate(key)
+        if not path.is_file():
+            raise HTTPException(status_code=404, detail="Файл не найден")
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(length)
+
+    def to_public_url(self, stored_path: str) -> str:
+        if isinstance(stored_path, str) and stored_path.startswith("http"):
+            return stored_path
+        relative = Path(self.to_key(stored_path))
         # если задан PUBLIC_API_URL, возвращаем абсолютную ссылку (нужно для внешних API)
         if settings.PUBLIC_API_URL:
             base = str(settings.PUBLIC_API_URL).rstrip("/")
@@ -59,39 +235,320 @@ class S3StorageBackend:
                 status_code=503, detail="S3 хранилище не настроено на сервере"
             )
         self.bucket = settings.S3_BUCKET
-        self.public_base = settings.S3_PUBLIC_BASE_URL or f"{settings.S3_ENDPOINT_URL}/{self.bucket}"
+        self.public_base = (
+            settings.S3_PUBLIC_BASE_URL or f"{settings.S3_ENDPOINT_URL}/{self.bucket}"
+        )
+        # boto3 clients are thread-safe; one client (and its connection pool)
+        # is shared by all threadpool workers of the process
         self.client = boto3.client(
             "s3",
             endpoint_url=str(settings.S3_ENDPOINT_URL),
             aws_access_key_id=settings.S3_ACCESS_KEY,
             aws_secret_access_key=settings.S3_SECRET_KEY,
             region_name=settings.S3_REGION,
+            config=Config(
+                max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                retries={"mode": "adaptive", "max_attempts": settings.S3_MAX_ATTEMPTS},
+                tcp_keepalive=True,
+                connect_timeout=settings.S3_CONNECT_TIMEOUT,
+                read_timeout=settings.S3_READ_TIMEOUT,
+                # SigV2 presigned URLs leave Content-Length and If-None-Match unsigned
+                signature_version="s3v4",
+            ),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=settings.S3_MULTIPART_CONCURRENCY,
+        )
+        # Signing is local (no network call), but botocore still costs a few
+        # hundred microseconds per URL. Within one expiry bucket the same URL
+        # is reused, which also keeps it stable for browser caches.
+        self._presigned_get = lru_cache(maxsize=settings.S3_PRESIGN_CACHE_SIZE)(
+            self._sign_get
+        )
+
+    def _sign_get(self, key: str, expiry_bucket: int) -> str:
+        return cast(
+            str,
+            self.client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": self.bucket, "Key": key},
+                ExpiresIn=settings.S3_PRESIGN_TTL,
+            ),
         )
 
+    def new_key(self, mime: str, user_id: str, prefix: str) -> str:
+        return f"{user_id}/{prefix}-{uuid.uuid4()}{EXTENSIONS.get(mime, '.png')}"
+
     def save(self, data: bytes, mime: str, user_id: str, prefix: str) -> str:
-        ext = {
-            "image/png": ".png",
-            "image/jpeg": ".jpg",
-            "image/jpg": ".jpg",
-            "image/webp": ".webp",
-        }.get(mime, ".png")
-        key = f"{user_id}/{prefix}-{uuid.uuid4()}{ext}"
-        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=mime)
+        key = self.new_key(mime, user_id, prefix)
+        self.put(key, data, mime)
         return key
 
     def to_public_url(self, stored_path: str) -> str:
         if stored_path.startswith("http"):
             return stored_path
+        if settings.S3_URL_MODE == "presigned":
+            bucket = int(time.time() // settings.S3_PRESIGN_BUCKET_SECONDS)
+            return self._presigned_get(stored_path, bucket)
+        # "public", or "signed-cookies" where the CDN checks the cookies
         return f"{self.public_base}/{stored_path}"
 
+    def to_key(self, stored_path: str) -> str:
+        return stored_path
+
+    def local_path(self, key: str) -> str | None:
+        return None
+
+    def owns(self, key: str, user_id: str) -> bool:
+        return key.startswith(f"{user_id}/")
+
+    def read(self, key: str) -> bytes:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except self.client.exceptions.NoSuchKey:
+            raise HTTPException(status_code=404, detail="Файл не найден")
+        return cast(bytes, response["Body"].read())
+
+    def put(self, key: str, data: bytes, mime: str) -> None:
+        if len(data) < settings.S3_MULTIPART_THRESHOLD:
+            # the transfer manager spins up threads; not worth it for one request
+            self.client.put_object(
+                Bucket=self.bucket, Key=key, Body=data, ContentType=mime
+            )
+            return
+        self.client.upload_fileobj(
+            io.BytesIO(data),
+            self.bucket,
+            key,
+            ExtraArgs={"ContentType": mime},
+            Config=self.transfer_config,
+        )
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_many(self, keys: list[str]) -> int:
+        deleted = 0
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[start : start + S3_DELETE_BATCH_SIZE]
+            response = self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+            errors = response.get("Errors", [])
+            for error in errors:
+                logger.warning(
+                    "Не удалось удалить %s: %s", error.get("Key"), error.get("Message")
+                )
+            deleted += len(batch) - len(errors)
+        return deleted
+
+    def list(
+        self, prefix: str, start_after: str | None = None
+    ) -> Iterator[StoredObject]:
+        # S3 lists keys in lexicographic order, which StartAfter resumes
+        params: dict[str, Any] = {
+            "Bucket": self.bucket,
+            "Prefix": f"{prefix}/" if prefix else "",
+        }
+        if start_after:
+            params["StartAfter"] = start_after
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(**params):
+            for item in page.get("Contents", []):
+                yield StoredObject(
+                    item["Key"], item["Size"], item["LastModified"].timestamp()
+                )
+
+    def stat(self, key: str) -> StoredObject:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except self.client.exceptions.ClientError:
+            raise HTTPException(status_code=404, detail="Файл не найден")
+        return StoredObject(
+            key, head["ContentLength"], head["LastModified"].timestamp(), head["ETag"]
+        )
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=key, Range=f"bytes={start}-{start + length - 1}"
+            )
+        except self.client.exceptions.ClientError:
+            raise HTTPException(status_code=404, detail="Файл не найден")
+        return cast(bytes, response["Body"].read())
+
+    def presigned_post(
+        self, key: str, mime: str, max_size: int, expires_in: int
+    ) -> dict[str, Any]:
+        """
+        Browser form upload straight to the bucket; S3 itself enforces the
+        key, content type and size range.
+        """
+        return cast(
+            dict[str, Any],
+            self.client.generate_presigned_post(
+                Bucket=self.bucket,
+                Key=key,
+                Fields={"Content-Type": mime},
+                Conditions=[
+                    {"Content-Type": mime},
+                    ["content-length-range", 1, max_size],
+                ],
+                ExpiresIn=expires_in,
+            ),
+        )
+
+    def presigned_put(self, key: str, mime: str, size: int, expires_in: int) -> str:
+        """
+        Presigned PUT; Content-Type and Content-Length are signed, so the
+        client must send exactly the declared size. If-None-Match: * is
+        signed too, so the URL cannot overwrite the object once it exists.
+        """
+        return cast(
+            str,
+            self.client.generate_presigned_url(
+                "put_object",
+                Params={
+                    "Bucket": self.bucket,
+                    "Key": key,
+                    "ContentType": mime,
+                    "ContentLength": size,
+                    "IfNoneMatch": "*",
+                },
+                ExpiresIn=expires_in,
+            ),
+        )
+
+
+class CachedS3StorageBackend(S3StorageBackend):
+    """
+    S3 with a local disk tier: reads go through a size-bounded LRU on local
+    disk, and concurrent misses on a key share one download. Writes always
+    reach S3 before returning, since workers and fal fetch objects from the
+    bucket right away; STORAGE_CACHE_WRITE_THROUGH also keeps a local copy.
+    """
 
-def _get_backend() -> StorageBackend:
+    def __init__(self, cache: DiskCache) -> None:
+        super().__init__()
+        self.cache = cache
+
+    def read(self, key: str) -> bytes:
+        return self.cache.get_or_fetch(key, partial(super().read, key))
+
+    def read_range(self, key: str, start: int, length: int) -> bytes:
+        data = self.cache.get(key)
+        if data is not None:
+            return data[start : start + length]
+        # header sniffing of fresh uploads; not worth caching the whole object
+        return super().read_range(key, start, length)
+
+    def put(self, key: str, data: bytes, mime: str) -> None:
+        super().put(key, data, mime)
+        if settings.STORAGE_CACHE_WRITE_THROUGH:
+            self.cache.put(key, data)
+
+    def delete(self, key: str) -> None:
+        super().delete(key)
+        self.cache.discard(key)
+
+    def delete_many(self, keys: list[str]) -> int:
+        deleted = super().delete_many(keys)
+        for key in keys:
+            self.cache.discard(key)
+        return deleted
+
+
+class OperationMetrics:
+    """Latency histograms and error counts per storage operation (thread-safe)."""
+
+    def __init__(self) -> None:
+        self._latency: dict[str, Histogram] = {}
+        self._errors: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, operation: str) -> Iterator[None]:
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            STORAGE_LATENCY.labels(operation, "error" if failed else "ok").observe(
+                elapsed
+            )
+            with self._lock:
+                histogram = self._latency.get(operation)
+                if histogram is None:
+                    histogram = self._latency[operation] = Histogram(LATENCY_BUCKETS)
+                histogram.observe(elapsed)
+                if failed:
+                    self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def report(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                operation: {
+                    **histogram.summary(),
+                    "errors": self._errors.get(operation, 0),
+                }
+                for operation, histogram in sorted(self._latency.items())
+            }
+
+
+storage_metrics = OperationMetrics()
+
+
+def _create_backend() -> StorageBackend:
     if settings.STORAGE_BACKEND == "s3":
+        if settings.STORAGE_CACHE_DIR:
+            cache = DiskCache(
+                Path(settings.STORAGE_CACHE_DIR), settings.STORAGE_CACHE_MAX_BYTES
+            )
+            return CachedS3StorageBackend(cache)
         return S3StorageBackend()
     return LocalStorageBackend(Path(settings.STORAGE_PATH))
 
 
-_backend = _get_backend()
+_backend: StorageBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> StorageBackend:
+    """
+    Storage backend, built on first use so that importing the module never
+    touches the network or fails on missing S3 settings (a misconfigured
+    backend answers 503 on first use and is retried on the next call).
+    """
+    global _backend
+    backend = _backend
+    if backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+            backend = _backend
+    return backend
+
+
+def storage_status() -> dict[str, Any]:
+    """
+    Backend kind, per-operation latency and the disk tier, for the admin
+    status endpoint.
+    """
+    status: dict[str, Any] = {
+        "backend": settings.STORAGE_BACKEND,
+        "initialized": _backend is not None,
+        "operations": storage_metrics.report(),
+    }
+    if isinstance(_backend, CachedS3StorageBackend):
+        status["cache"] = _backend.cache.status()
+    return status
 
 
 def save_data_url(data_url: str, user_id: str, *, prefix: str = "image") -> str:
@@ -114,18 +571,136 @@ def save_data_url(data_url: str, user_id: str, *, prefix: str = "image") -> str:
     except Exception as exc:  # pragma: no cover - defensive
         raise HTTPException(status_code=400, detail="Invalid base64 image") from exc
 
-    return _backend.save(binary, mime, user_id, prefix)
+    with storage_metrics.timed("save"):
+        stored_path = get_backend().save(binary, mime, user_id, prefix)
+    record_write(user_id, len(binary))
+    return stored_path
 
 
 def save_bytes(data: bytes, mime: str, user_id: str, *, prefix: str = "image") -> str:
     """
     Persist raw bytes to storage and return stored path/key.
     """
-    return _backend.save(data, mime, user_id, prefix)
+    with storage_metrics.timed("save"):
+        stored_path = get_backend().save(data, mime, user_id, prefix)
+    record_write(user_id, len(data))
+    return stored_path
 
 
 def to_public_url(stored_path: str) -> str:
     """
     Convert stored path/key to a public URL (absolute for S3, /media for local).
     """
-    return _backend.to_public_url(stored_path)
+    return get_backend().to_public_url(stored_path)
+
+
+def storage_key(stored_path: str) -> str:
+    """
+    Backend-relative key for a stored path (relative path for local, object key for S3).
+    """
+    return get_backend().to_key(stored_path)
+
+
+def local_path(key: str) -> str | None:
+    """
+    Filesystem path for a key when the backend is local disk, else None.
+    """
+    if is_remote(key):
+        return None
+    return get_backend().local_path(key)
+
+
+def is_remote(stored_path: str) -> bool:
+    """
+    True for results kept at the provider (fal URLs) rather than in our storage.
+    """
+    return stored_path.startswith(("http://", "https://"))
+
+
+def owns_key(key: str, user_id: str) -> bool:
+    """
+    Whether a storage key was written for this user (keys embed the user id).
+    """
+    return not is_remote(key) and get_backend().owns(key, user_id)
+
+
+def read_bytes(key: str) -> bytes:
+    """
+    Read a stored object (blocking).
+    """
+    with storage_metrics.timed("read"):
+        return get_backend().read(key)
+
+
+def put_bytes(key: str, data: bytes, mime: str) -> None:
+    """
+    Write an object under an explicit key (blocking), e.g. derived images.
+    """
+    with storage_metrics.timed("put"):
+        get_backend().put(key, data, mime)
+
+
+def delete_key(key: str) -> None:
+    with storage_metrics.timed("delete"):
+        get_backend().delete(key)
+
+
+def delete_keys(keys: list[str]) -> int:
+    """
+    Delete many objects (blocking): DeleteObjects batches on S3, parallel
+    unlinks on local disk. Returns the number of deleted keys.
+    """
+    if not keys:
+        return 0
+    with storage_metrics.timed("delete_many"):
+        return get_backend().delete_many(keys)
+
+
+def list_keys(prefix: str, start_after: str | None = None) -> Iterator[StoredObject]:
+    """
+    Objects under a key prefix ("derived" lists "derived/...", "" lists all),
+    in a stable order that ``start_after`` (a previously listed key) resumes.
+    """
+    return get_backend().list(prefix, start_after)
+
+
+def new_key(mime: str, user_id: str, *, prefix: str = "image") -> str:
+    """
+    Fresh key in the backend's naming scheme, for objects written by clients.
+    """
+    return get_backend().new_key(mime, user_id, prefix)
+
+
+def stat_key(key: str) -> StoredObject:
+    with storage_metrics.timed("stat"):
+        return get_backend().stat(key)
+
+
+def read_range(key: str, start: int, length: int) -> bytes:
+    """
+    Read part of a stored object (blocking), e.g. to sniff a header.
+    """
+    with storage_metrics.timed("read_range"):
+        return get_backend().read_range(key, start, length)
+
+
+def presigned_post(
+    key: str, mime: str, max_size: int, expires_in: int
+) -> dict[str, Any] | None:
+    """
+    Presigned S3 POST for a direct browser upload; None for local storage.
+    """
+    backend = get_backend()
+    if isinstance(backend, S3StorageBackend):
+        return backend.presigned_post(key, mime, max_size, expires_in)
+    return None
+
+
+def presigned_put(key: str, mime: str, size: int, expires_in: int) -> str | None:
+    """
+    Presigned S3 PUT for a direct browser upload; None for local storage.
+    """
+    backend = get_backend()
+    if isinstance(backend, S3StorageBackend):
+        return backend.presigned_put(key, mime, size, expires_in)
+    return None
@@ -0,0 +1,170 @@
+"""
+Per-user storage usage counters.
+
+Writes through the storage module, finalized direct uploads and lifecycle
+deletes each apply their delta with one UPSERT, so keeping the counters costs
+a single round-trip and quota checks are a primary-key lookup. A finalized
+upload is counted together with a marker row keyed on its storage key, so it
+is counted once however often it is finalized. Counters can still drift (a
+process dying between the write and the update); the reconciliation scan in
+app.services.lifecycle corrects them.
+"""
+
+import datetime
+import logging
+import uuid
+from collections.abc import Mapping
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, col, delete, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import (
+    CountedUpload,
+    StorageUsage,
+    StorageUsagePublic,
+    StorageUsagesPublic,
+    User,
+)
+
+logger = logging.getLogger(__name__)
+
+# user id -> (bytes, objects)
+Usage = Mapping[uuid.UUID, tuple[int, int]]
+
+
+def _upsert_statement(usage: Usage, *, absolute: bool) -> Any:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    statement = insert(StorageUsage).values(
+        [
+            {"user_id": user_id, "bytes": size, "objects": count, "updated_at": now}
+            for user_id, (size, count) in usage.items()
+        ]
+    )
+    table = StorageUsage.__table__.c  # type: ignore[attr-defined]
+    excluded = statement.excluded
+
+    def merged(column: str) -> Any:
+        return excluded[column] if absolute else table[column] + excluded[column]
+
+    return statement.on_conflict_do_update(
+        index_elements=[table.user_id],
+        set_={
+            "bytes": merged("bytes"),
+            "objects": merged("objects"),
+            "updated_at": excluded.updated_at,
+        },
+    )
+
+
+def _upsert(usage: Usage, *, absolute: bool) -> None:
+    if not usage:
+        return
+    with engine.begin() as connection:
+        connection.execute(_upsert_statement(usage, absolute=absolute))
+
+
+def record_usage(deltas: Usage) -> None:
+    """
+    Add byte/object deltas. Never raises: a failed update only means drift
+    until the next reconciliation (or an already deleted user).
+    """
+    try:
+        _upsert(deltas, absolute=False)
+    except SQLAlchemyError as exc:
+        logger.warning("Не удалось обновить учёт хранилища: %s", exc)
+
+
+def record_write(user_id: str, size: int) -> None:
+    try:
+        owner = uuid.UUID(user_id)
+    except ValueError:
+        # objects written without an owner are not attributed to anyone
+        return
+    record_usage({owner: (size, 1)})
+
+
+def record_upload(key: str, user_id: str, size: int) -> None:
+    """
+    Count a finalized direct upload exactly once. The marker row and the
+    delta commit together, so finalizing the same key again (from another
+    API process, or after the in-memory memo forgot it) adds nothing.
+    """
+    try:
+        owner = uuid.UUID(user_id)
+    except ValueError:
+        return
+    marker = (
+        insert(CountedUpload)
+        .values(key=key, user_id=owner)
+        .on_conflict_do_nothing(index_elements=["key"])
+        .returning(CountedUpload.__table__.c.key)  # type: ignore[attr-defined]
+    )
+    try:
+        with engine.begin() as connection:
+            if connection.execute(marker).first() is None:
+                return
+            connection.execute(_upsert_statement({owner: (size, 1)}, absolute=False))
+    except SQLAlchemyError as exc:
+        logger.warning("Не удалось обновить учёт хранилища: %s", exc)
+
+
+def forget_uploads(session: Session, keys: list[str]) -> None:
+    """Drop the markers of deleted objects."""
+    if not keys:
+        return
+    statement = delete(CountedUpload).where(col(CountedUpload.key).in_(keys))
+    session.exec(statement)  # type: ignore
+    session.commit()
+
+
+def set_usage(usage: Usage) -> None:
+    _upsert(usage, absolute=True)
+
+
+def usage_snapshot(session: Session) -> dict[uuid.UUID, tuple[int, int]]:
+    rows = session.exec(
+        select(StorageUsage.user_id, StorageUsage.bytes, StorageUsage.objects)
+    ).all()
+    return {user_id: (size, count) for user_id, size, count in rows}
+
+
+def check_quota(session: Session, user: User, incoming: int) -> None:
+    """Reject a write that would take the user over their plan's quota."""
+    quota = settings.STORAGE_QUOTA_BYTES.get(user.plan)
+    if quota is None or user.is_superuser:
+        return
+    usage = session.get(StorageUsage, user.id)
+    used = usage.bytes if usage else 0
+    if used + incoming > quota:
+        raise HTTPException(
+            status_code=413,
+            detail=(
+                "Превышена квота хранилища: "
+                f"занято {used // 2**20} из {quota // 2**20} МБ"
+            ),
+        )
+
+
+def top_consumers(session: Session, limit: int) -> StorageUsagesPublic:
+    rows = session.exec(
+        select(StorageUsage, User.email)
+        .join(User, col(User.id) == col(StorageUsage.user_id))
+        .order_by(col(StorageUsage.bytes).desc())
+        .limit(limit)
+    ).all()
+    data = [
+        StorageUsagePublic(
+            user_id=usage.user_id,
+            email=email,
+            bytes=usage.bytes,
+            objects=usage.objects,
+            updated_at=usage.updated_at,
+        )
+        for usage, email in rows
+    ]
+    return StorageUsagesPublic(data=data, count=len(data))
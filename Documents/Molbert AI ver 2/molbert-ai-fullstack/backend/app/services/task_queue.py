@@ -1,69 +1,171 @@
 import asyncio
 import logging
+import time
+from collections.abc import Awaitable
 from typing import Any
 
-from fastapi import HTTPException
+from fastapi import HTTPException, Request
 
-from app.broker import broker
+from app.broker import GENERATION_QUEUE, broker
+from app.core.config import settings
+from app.services import job_retry
+from app.services.admission import admission
+from app.services.affinity import affinity_exchange, affinity_key
+from app.services.broker_connection import broker_supervisor
+from app.services.cancellation import (
+    JobCancelled,
+    PendingJob,
+    cancelled_error,
+    job_registry,
+    publish_cancel,
+)
+from app.services.eta import Estimate, eta_estimator
+from app.services.jobs import GenerationJob
+from app.services.metrics import (
+    BROKER_RPC,
+    MODES,
+    QUEUE_WAIT,
+    SERVICE_TIME,
+    bounded,
+)
+from app.services.source_cache import record_worker_stats
 
 logger = logging.getLogger(__name__)
 
 
-async def _ensure_broker_connected() -> None:
+async def _wait_for_reply(
+    rpc: Awaitable[Any], pending: PendingJob, request: Request | None
+) -> Any:
     """
-    Make sure the broker connection is alive.
-    Calling connect() repeatedly is safe; it will noop if already connected.
+    Await the RPC, giving up when the job is cancelled (JobCancelled("delete"))
+    or the client disconnects (JobCancelled("disconnect")).
     """
+    reply = asyncio.ensure_future(rpc)
+    cancelled = asyncio.ensure_future(pending.cancelled.wait())
     try:
-        await broker.connect()
-    except Exception as exc:  # pragma: no cover - defensive
-        logger.exception("Не удалось подключиться к брокеру RabbitMQ: %s", exc)
-        raise HTTPException(status_code=503, detail="Очередь недоступна") from exc
+        while True:
+            done, _ = await asyncio.wait(
+                {reply, cancelled},
+                timeout=settings.GENERATION_DISCONNECT_POLL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if reply in done:
+                return reply.result()
+            if cancelled in done:
+                raise JobCancelled("delete")
+            if request is not None and await request.is_disconnected():
+                raise JobCancelled("disconnect")
+    finally:
+        reply.cancel()
+        cancelled.cancel()
+
+
+async def _on_cancelled(
+    job: GenerationJob, reason: str, predicted: Estimate, started: float
+) -> None:
+    elapsed = time.monotonic() - started
+    running = max(elapsed - predicted.queue_wait_seconds, 0.0)
+    job_registry.stats.record(reason, predicted.service_seconds - running)
+    logger.info("Задание %s отменено (%s) через %.1f с", job.job_id, reason, elapsed)
+    if reason == "disconnect":
+        # a DELETE has already told the workers
+        try:
+            await publish_cancel(job.job_id, job.owner)
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.warning("Не удалось разослать отмену %s: %s", job.job_id, exc)
 
 
 async def process_generation_task(
-    payload: dict[str, Any],
+    job: GenerationJob,
     *,
-    timeout: float = 120.0,
-    retries: int = 2,
+    request: Request | None = None,
+    timeout: float | None = None,
 ) -> str:
     """
     Publish generation payload to RabbitMQ and wait for the worker reply (RPC style).
-    Retries on transport/timeout errors.
+    Transient failures are retried broker-side by the worker (delay queues with
+    jittered backoff), so a single request is made here. The timeout travels
+    with the job as a deadline, and the worker stops retrying once another
+    attempt would not finish before it. With a request, the job is cancelled
+    when its client disconnects.
     """
-    await _ensure_broker_connected()
+    broker_supervisor.ensure_connected()
+    timeout = timeout or settings.GENERATION_RPC_TIMEOUT
+    mode = job.mode
+    resolution = job.resolution or ""
+    predicted = eta_estimator.estimate(
+        mode, resolution, queue_wait=await admission.queue_wait()
+    )
+    started = time.monotonic()
 
-    last_error: Exception | None = None
-    for attempt in range(1, retries + 2):
-        try:
-            logger.info("Отправка задания в очередь (попытка %s): %s", attempt, payload.get("mode"))
-            response_msg = await asyncio.wait_for(
-                broker.request(payload, queue="generation", timeout=timeout),
+    # jobs of one session go to the same worker, whose source cache is warm
+    session_key = affinity_key(job)
+    route: dict[str, Any] = (
+        {"exchange": affinity_exchange, "routing_key": session_key}
+        if session_key
+        else {"queue": GENERATION_QUEUE}
+    )
+
+    logger.info("Отправка задания в очередь: %s", mode)
+    try:
+        with admission.track(), job_registry.track(job.job_id, job.owner) as pending:
+            rpc = asyncio.wait_for(
+                broker.request(
+                    job.encode(),
+                    timeout=timeout,
+                    content_type="application/json",
+                    headers=job_retry.deadline_headers(timeout),
+                    **route,
+                ),
                 timeout=timeout,
             )
-            response = await response_msg.decode() if response_msg else None
-            if isinstance(response, dict) and response.get("status") == "ok":
-                file_url = response.get("file_url")
-                if not file_url:
-                    raise HTTPException(status_code=500, detail="Пустой ответ от воркера")
-                return file_url
+            response_msg = await _wait_for_reply(rpc, pending, request)
+        round_trip = time.monotonic() - started
+        broker_supervisor.rpc_latency.observe(round_trip)
+        BROKER_RPC.labels(bounded(mode, MODES)).observe(round_trip)
+    except JobCancelled as exc:
+        await _on_cancelled(job, str(exc), predicted, started)
+        raise cancelled_error()
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        logger.warning("Таймаут ожидания ответа от воркера")
+        raise HTTPException(status_code=504, detail="Воркер не ответил вовремя")
+    except Exception as exc:  # pragma: no cover - defensive
+        logger.exception("Ошибка при отправке задания в очередь: %s", exc)
+        raise HTTPException(status_code=503, detail="Очередь недоступна") from exc
 
-            detail = ""
-            code = 500
-            if isinstance(response, dict):
-                detail = response.get("detail") or "Ошибка воркера"
-                code = int(response.get("code") or 500)
-            raise HTTPException(status_code=code, detail=detail)
-        except asyncio.TimeoutError as exc:
-            last_error = exc
-            logger.warning("Таймаут ожидания ответа от воркера")
-        except Exception as exc:  # pragma: no cover - defensive
-            last_error = exc
-            logger.exception("Ошибка при отправке задания в очередь: %s", exc)
+    response = await response_msg.decode() if response_msg else None
+    if isinstance(response, dict) and response.get("status") == "ok":
+        file_url = response.get("file_url")
+        if not file_url:
+            raise HTTPException(status_code=500, detail="Пустой ответ от воркера")
+        service_seconds = response.get("service_seconds")
+        if isinstance(service_seconds, int | float):
+            eta_estimator.observe_service(mode, resolution, float(service_seconds))
+            SERVICE_TIME.labels(bounded(mode, MODES)).observe(service_seconds)
+            QUEUE_WAIT.labels(bounded(mode, MODES)).observe(
+                max(round_trip - service_seconds, 0.0)
+            )
+        cache = response.get("cache")
+        if isinstance(cache, dict) and response.get("worker"):
+            record_worker_stats(
+                str(response["worker"]), int(cache["hits"]), int(cache["misses"])
+            )
+        eta_estimator.observe_prediction(
+            predicted.queue_wait_seconds + predicted.service_seconds,
+            time.monotonic() - started,
+        )
+        return file_url
 
-        await asyncio.sleep(1)
+    if isinstance(response, dict) and response.get("status") == "cancelled":
+        # cancelled through another API process
+        await _on_cancelled(job, "delete", predicted, started)
+        raise cancelled_error()
 
-    raise HTTPException(
-        status_code=504,
-        detail=f"Воркер недоступен ({last_error})",
-    )
+    detail = "Ошибка воркера"
+    code = 500
+    if isinstance(response, dict):
+        detail = response.get("detail") or detail
+        code = int(response.get("code") or 500)
+    raise HTTPException(status_code=code, detail=detail)
@@ -0,0 +1,201 @@
+"""
+Direct-to-storage uploads.
+
+The browser asks for an upload intent, sends the file straight to the bucket
+(presigned S3 POST/PUT) or, for local storage, to a signed backend URL that
+streams it to disk, and then finalizes the key. Finalization checks size,
+magic bytes and dimensions from a ranged read of the object header; the
+generation routes accept the finalized key in place of a multipart file.
+"""
+
+import datetime
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from pathlib import PurePosixPath
+from typing import Literal
+from urllib.parse import urlencode
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.models import UploadIntent
+from app.services.image_probe import ImageInfo, ProbeError, probe_image
+from app.services.metrics import UPLOAD_SIZE
+from app.services.storage import (
+    delete_key,
+    new_key,
+    owns_key,
+    presigned_post,
+    presigned_put,
+    read_range,
+    stat_key,
+)
+from app.services.storage_usage import record_upload
+
+ALLOWED_MIME_TYPES = {"image/png", "image/jpeg", "image/webp"}
+MAX_UPLOAD_SIZE_BYTES = 10 * 1024 * 1024  # 10 MB
+UPLOAD_PREFIX = "upload"
+
+# JPEG dimensions sit after EXIF/ICC segments, which can be large
+HEADER_PROBE_BYTES = 256 * 1024
+
+_FORMAT_SUFFIX = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+
+
+def _check_declared(mime: str, size: int) -> None:
+    if mime not in ALLOWED_MIME_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail="Неверный формат изображения. Разрешено: PNG, JPEG, WebP.",
+        )
+    if not 0 < size <= MAX_UPLOAD_SIZE_BYTES:
+        raise HTTPException(
+            status_code=413, detail="Файл слишком большой. Максимум 10 МБ."
+        )
+
+
+def local_upload_signature(key: str, mime: str, size: int, expires: int) -> str:
+    message = f"{key}\n{mime}\n{size}\n{expires}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_local_upload(key: str, mime: str, size: int, expires: int, sig: str) -> None:
+    if expires < time.time():
+        raise HTTPException(status_code=403, detail="Ссылка для загрузки истекла")
+    expected = local_upload_signature(key, mime, size, expires)
+    if not hmac.compare_digest(expected, sig):
+        raise HTTPException(status_code=403, detail="Неверная подпись загрузки")
+
+
+def create_intent(
+    user_id: str, mime: str, size: int, method: Literal["post", "put"] = "post"
+) -> UploadIntent:
+    _check_declared(mime, size)
+    key = new_key(mime, user_id, prefix=UPLOAD_PREFIX)
+    ttl = settings.UPLOAD_INTENT_TTL
+    expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=ttl
+    )
+
+    if method == "post":
+        post = presigned_post(key, mime, MAX_UPLOAD_SIZE_BYTES, ttl)
+        if post is not None:
+            return UploadIntent(
+                key=key,
+                method="POST",
+                url=post["url"],
+                fields=post["fields"],
+                expires_at=expires_at,
+            )
+    headers = {"Content-Type": mime}
+    put_url = presigned_put(key, mime, size, ttl)
+    if put_url is not None:
+        # signed into the URL: the upload may only create the object
+        headers["If-None-Match"] = "*"
+    else:
+        # local storage: signed PUT to the backend, streamed to disk
+        expires = int(expires_at.timestamp())
+        sig = local_upload_signature(key, mime, size, expires)
+        base = (
+            str(settings.PUBLIC_API_URL).rstrip("/") if settings.PUBLIC_API_URL else ""
+        )
+        query = urlencode({"mime": mime, "size": size, "expires": expires, "sig": sig})
+        put_url = f"{base}{settings.API_V1_STR}/uploads/local/{key}?{query}"
+    return UploadIntent(
+        key=key,
+        method="PUT",
+        url=put_url,
+        headers=headers,
+        expires_at=expires_at,
+    )
+
+
+class _ValidatedKeys:
+    """
+    Per-process memo of finalized keys and the object version that passed,
+    so routes only stat the object instead of re-reading its header.
+    """
+
+    def __init__(self, capacity: int = 4096) -> None:
+        self.capacity = capacity
+        self._items: OrderedDict[str, tuple[ImageInfo, str | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[ImageInfo, str | None] | None:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+            return entry
+
+    def add(self, key: str, info: ImageInfo, etag: str | None) -> None:
+        with self._lock:
+            self._items[key] = (info, etag)
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+
+_validated = _ValidatedKeys()
+
+
+def is_upload_key(key: str) -> bool:
+    return key.rsplit("/", 1)[-1].startswith(f"{UPLOAD_PREFIX}-")
+
+
+def finalize_upload(key: str, user_id: str) -> tuple[ImageInfo, int]:
+    """
+    Validate an uploaded object (blocking). Invalid objects are deleted.
+    Returns the probed image info and the object size.
+
+    Every use stats the object: an upload rewritten after it was validated
+    (a presigned POST stays usable until it expires) is deleted and rejected
+    rather than trusted from the memo.
+    """
+    if not is_upload_key(key) or not owns_key(key, user_id):
+        raise HTTPException(status_code=404, detail="Загрузка не найдена")
+    obj = stat_key(key)
+    cached = _validated.get(key)
+    if cached is not None:
+        info, etag = cached
+        if etag is not None and etag == obj.etag:
+            return info, obj.size
+        _validated.forget(key)
+        delete_key(key)
+        raise HTTPException(status_code=409, detail="Загрузка изменена после проверки")
+
+    try:
+        if obj.size > MAX_UPLOAD_SIZE_BYTES:
+            raise HTTPException(
+                status_code=413, detail="Файл слишком большой. Максимум 10 МБ."
+            )
+        header = read_range(key, 0, HEADER_PROBE_BYTES)
+        try:
+            info = probe_image(header)
+        except ProbeError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        # the key extension was chosen from the declared content type
+        if _FORMAT_SUFFIX[info.format] != PurePosixPath(key).suffix:
+            raise HTTPException(
+                status_code=400, detail="Содержимое не совпадает с форматом"
+            )
+        if info.pixels > settings.UPLOAD_MAX_PIXELS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Изображение слишком большое: {info.width}×{info.height} пикселей",
+            )
+    except HTTPException:
+        delete_key(key)
+        raise
+    _validated.add(key, info, obj.etag)
+    # direct uploads bypass save_bytes, so they are counted once validated
+    record_upload(key, user_id, obj.size)
+    UPLOAD_SIZE.labels("direct").observe(obj.size)
+    return info, obj.size
@@ -0,0 +1,55 @@
+"""
+Apply storage retention and delete orphaned files.
+
+    python -m app.storage_lifecycle [sweep] [--batch-size 1000] [--restart] [--dry-run]
+    python -m app.storage_lifecycle reconcile
+
+Run it from cron; an interrupted sweep resumes from its checkpoint
+(STORAGE_SWEEP_CHECKPOINT) unless --restart is given. Policies are set with
+STORAGE_RETENTION_DAYS and STORAGE_ORPHAN_GRACE_HOURS. ``reconcile`` recounts
+the per-user storage usage counters from a full listing.
+"""
+
+import argparse
+import dataclasses
+import json
+import logging
+import sys
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.services.lifecycle import reconcile_usage, sweep
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Storage lifecycle sweep")
+    parser.add_argument(
+        "command", nargs="?", choices=["sweep", "reconcile"], default="sweep"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.STORAGE_SWEEP_BATCH_SIZE
+    )
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only report what would be deleted"
+    )
+    args = parser.parse_args()
+    with Session(engine) as session:
+        if args.command == "reconcile":
+            reconcile_usage(session)
+            return
+        report = sweep(
+            session,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+            restart=args.restart,
+        )
+    sys.stdout.write(json.dumps(dataclasses.asdict(report), ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
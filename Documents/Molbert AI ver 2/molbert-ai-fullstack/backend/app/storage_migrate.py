@@ -0,0 +1,132 @@
+"""
+Move local storage from the flat layout into shard directories.
+
+    python -m app.storage_migrate [--batch-size 500] [--limit 0] [--pause 0.2] [--dry-run]
+
+Safe to run while the API serves traffic and to interrupt at any point: each
+file is moved with an atomic rename, and flat keys/paths still resolve to the
+moved file (storage lookups and /media fall back to the shard directory).
+After every batch the generation log rows pointing at the moved files are
+rewritten to the sharded key, so the fallback is only needed in between.
+"""
+
+import argparse
+import logging
+import os
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import GenerationLog
+from app.services.storage import shard_dir
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _flat_files(base: Path) -> Iterator[str]:
+    # scandir does not stat every entry, which matters with millions of files
+    with os.scandir(base) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                if shard_dir(entry.name):
+                    yield entry.name
+
+
+def move_batch(base: Path, names: list[str]) -> dict[str, str]:
+    """Rename flat files into their shard directories; returns name -> new key."""
+    moved: dict[str, str] = {}
+    for name in names:
+        key = f"{shard_dir(name)}/{name}"
+        target = base / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(base / name, target)
+        except FileNotFoundError:
+            # deleted (or moved by another run) since the listing
+            continue
+        moved[name] = key
+    return moved
+
+
+def _rewrite(value: str, base: Path, moved: dict[str, str]) -> str | None:
+    """New value for a stored path/key that points at a moved file, else None."""
+    path = Path(value)
+    if path.is_absolute():
+        if path.parent != base or path.name not in moved:
+            return None
+        return str(base / moved[path.name])
+    return moved.get(value)
+
+
+def update_logs(session: Session, base: Path, moved: dict[str, str]) -> int:
+    """Point generation log rows at the sharded keys, in one transaction."""
+    stored = [*moved, *(str(base / name) for name in moved)]
+    rows = session.exec(
+        select(GenerationLog).where(
+            col(GenerationLog.file_path).in_(stored)
+            | col(GenerationLog.source_key).in_(stored)
+        )
+    ).all()
+    for row in rows:
+        file_path = _rewrite(row.file_path, base, moved)
+        if file_path:
+            row.file_path = file_path
+        source_key = row.source_key and _rewrite(row.source_key, base, moved)
+        if source_key:
+            row.source_key = source_key
+        session.add(row)
+    session.commit()
+    return len(rows)
+
+
+def migrate(batch_size: int, limit: int, pause: float, dry_run: bool) -> None:
+    if settings.STORAGE_BACKEND != "local":
+        logger.info("Миграция нужна только для локального хранилища")
+        return
+    base = Path(settings.STORAGE_PATH).resolve()
+    files = rows = 0
+    batch: list[str] = []
+
+    def flush() -> None:
+        nonlocal files, rows
+        if dry_run:
+            files += len(batch)
+        else:
+            moved = move_batch(base, batch)
+            with Session(engine) as session:
+                rows += update_logs(session, base, moved)
+            files += len(moved)
+        batch.clear()
+        logger.info("Перенесено файлов: %s, обновлено записей: %s", files, rows)
+        # leave disk bandwidth to the live service
+        time.sleep(pause)
+
+    # the listing is a live iterator; renamed files leave the directory behind it
+    for name in _flat_files(base):
+        batch.append(name)
+        if len(batch) >= batch_size:
+            flush()
+        if limit and files + len(batch) >= limit:
+            break
+    if batch:
+        flush()
+    logger.info("Готово: файлов %s, записей %s", files, rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shard the local storage layout")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=0, help="stop after N files")
+    parser.add_argument("--pause", type=float, default=0.2)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    migrate(args.batch_size, args.limit, args.pause, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,78 @@
+import asyncio
 import logging
+import time
+from functools import partial
 from io import BytesIO
 from pathlib import Path
+from typing import Any
 from urllib.parse import urlparse
 
 import httpx
 
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from faststream import FastStream
+from faststream.exceptions import AckMessage
+from faststream.rabbit.annotations import RabbitMessage
 
-from app.broker import broker
+from app.broker import GENERATION_QUEUE, broker
 from app.core.config import settings
+from app.services import affinity, job_retry, region_edit
+from app.services.broker_connection import broker_supervisor
+from app.services.cancellation import (
+    CLIENT_CLOSED_REQUEST,
+    JobCancelled,
+    cancel_exchange,
+    cancel_queue,
+    worker_jobs,
+)
 from app.services.fal import FalClient
+from app.services.gemini import gemini_client
+from app.services.image_probe import ProbeError, closest_aspect_ratio, probe_image
+from app.services.imaging import run_in_image_pool
+from app.services.jobs import expand_job, job_id, job_mode, job_owner
+from app.services.metrics import CANCELLED, start_server
+from app.services.prompts import render_prompt
+from app.services.providers import provider_router
+from app.services.source_cache import source_cache
+from app.services.storage import local_path, save_bytes, storage_key, to_public_url
 
 logger = logging.getLogger(__name__)
 
+WORKER_ID = affinity.worker_id()
 
-async def _public_image_url(image_url: str | None, image_path: str | None) -> str | None:
-    """
-    Ensure the image URL is reachable by fal. If it's a local /media path,
-    try to re-upload to a temporary hosting (file.io).
-    """
-    if not image_url:
-        return None
-    parsed = urlparse(image_url)
-    is_http = parsed.scheme in {"http", "https"}
-    host = parsed.hostname or ""
-    is_local_host = host in {"localhost", "127.0.0.1", "backend"} or host.endswith(
-        ".local"
-    )
-    needs_rehost = (
-        not is_http
-        or is_local_host
-        or settings.STORAGE_BACKEND == "local"
-        or image_url.startswith("/media/")
+
+async def _save(data: bytes, mime: str, owner: str, prefix: str) -> str:
+    """save_bytes off the event loop: the upload and the usage UPSERT block."""
+    return await run_in_threadpool(
+        partial(save_bytes, prefix=prefix), data, mime, owner
     )
 
-    if not needs_rehost:
-        return image_url
 
-    file_bytes: bytes | None = None
+async def _read_image_bytes(image_url: str, image_path: str | None) -> bytes | None:
+    """
+    Read source bytes from the worker cache, the shared storage path or,
+    as a last resort, by downloading them from the backend service. Disk work
+    (whole-file reads and writes, hashing, the cache's first-use scan) runs in
+    the threadpool.
+    """
+    file_bytes = await run_in_threadpool(source_cache.get, image_url)
+    if file_bytes is not None:
+        return file_bytes
 
     if image_path:
         path = Path(image_path)
         if path.exists():
             try:
-                file_bytes = path.read_bytes()
+                file_bytes = await run_in_threadpool(path.read_bytes)
             except Exception as exc:  # pragma: no cover - defensive
                 logger.warning("Не удалось прочитать файл %s: %s", path, exc)
 
     # Fall back to downloading from backend service if we couldn't read from disk
     if file_bytes is None:
+        parsed = urlparse(image_url)
         internal_url = image_url
-        if is_local_host:
+        if _is_local_host(parsed.hostname or ""):
             path_only = parsed.path or ""
             if path_only.startswith("//"):
                 path_only = path_only[1:]
@@ -73,9 +94,58 @@ async def _public_image_url(image_url: str | None, image_path: str | None) -> st
         except Exception as exc:  # pragma: no cover - defensive
             logger.warning("Не удалось скачать изображение %s: %s", internal_url, exc)
 
+    if file_bytes is not None:
+        await run_in_threadpool(source_cache.put, image_url, file_bytes)
+    return file_bytes
+
+
+def _is_local_host(host: str) -> bool:
+    return host in {"localhost", "127.0.0.1", "backend"} or host.endswith(".local")
+
+
+async def _public_image_url(
+    image_url: str | None, image_path: str | None
+) -> str | None:
+    """
+    Ensure the image URL is reachable by fal. If it's a local /media path,
+    try to re-upload to a temporary hosting (file.io).
+    """
+    if not image_url:
+        return None
+    parsed = urlparse(image_url)
+    is_http = parsed.scheme in {"http", "https"}
+    # Results chained from an earlier step may already live at the provider
+    # (no local path); those are reachable as they are
+    needs_rehost = (
+        not is_http
+        or _is_local_host(parsed.hostname or "")
+        or (settings.STORAGE_BACKEND == "local" and image_path is not None)
+        or image_url.startswith("/media/")
+        or parsed.path.startswith("/media/")
+    )
+
+    if not needs_rehost:
+        return image_url
+
+    file_bytes = await _read_image_bytes(image_url, image_path)
     if file_bytes is None:
         return image_url
 
+    digest = source_cache.digest_of(image_url)
+    if digest is not None:
+        published = source_cache.published_url(digest)
+        if published:
+            return published
+    link = await _rehost(file_bytes)
+    if link is None:
+        return image_url
+    # file.io links are single-download, only tmpfiles links can be reused
+    if digest is not None and "tmpfiles.org" in link:
+        source_cache.remember_url(digest, link)
+    return link
+
+
+async def _rehost(file_bytes: bytes) -> str | None:
     # Attempt 1: tmpfiles.org (works without auth, returns direct URL)
     try:
         async with httpx.AsyncClient(timeout=30, follow_redirects=True) as client:
@@ -97,9 +167,7 @@ async def _public_image_url(image_url: str | None, image_path: str | None) -> st
                 return direct
             logger.warning("tmpfiles response without link: %s", data)
         else:
-            logger.warning(
-                "tmpfiles upload failed: %s %s", resp.status_code, resp.text
-            )
+            logger.warning("tmpfiles upload failed: %s %s", resp.status_code, resp.text)
     except Exception as exc:  # pragma: no cover - defensive
         logger.warning("Не удалось перезалить файл на tmpfiles: %s", exc)
 
@@ -121,72 +189,335 @@ async def _public_image_url(image_url: str | None, image_path: str | None) -> st
     except Exception as exc:  # pragma: no cover - defensive
         logger.warning("Не удалось перезалить файл на file.io: %s", exc)
 
-    return image_url
+    return None
 
 
-@broker.subscriber("generation")
-async def handle_generation(payload: dict) -> dict:
-    mode = payload.get("mode")
-    logger.info("Получено задание %s", mode)
+def _sniff_mime(data: bytes) -> str:
     try:
-        if mode == "text-to-image":
-            fal_url = await FalClient.text_to_image(
-                payload["prompt"],
-                aspect_ratio=payload.get("aspect_ratio", "1:1"),
-                output_format=payload.get("output_format", "png"),
-                resolution=payload.get("resolution"),
-            )
-        elif mode == "compose":
-            # Handle multiple images for compose mode
-            image_urls = payload.get("image_urls", [])
-            public_urls: list[str] = []
-            for url in image_urls:
-                public_url = await _public_image_url(url, None)
-                if public_url:
-                    public_urls.append(public_url)
-            if not public_urls:
-                # Fallback to single image
-                image_url = await _public_image_url(
-                    payload.get("image_url"), payload.get("image_path")
-                )
-                if image_url:
-                    public_urls = [image_url]
-            if not public_urls:
-                raise HTTPException(status_code=400, detail="Нет изображений для compose")
-            fal_url = await FalClient.compose_images(
-                payload["prompt"],
-                public_urls,
-                aspect_ratio=payload.get("aspect_ratio", "auto"),
-                output_format=payload.get("output_format", "png"),
-                resolution=payload.get("resolution"),
+        return f"image/{probe_image(data).format}"
+    except ProbeError:
+        return "image/png"
+
+
+async def _generate_gemini(payload: dict[str, Any]) -> str:
+    """
+    Same modes through Gemini. Sources are sent inline as bytes (no rehosting)
+    and the result is written straight to storage. Returns a storage key.
+    """
+    mode = payload.get("mode")
+    if mode == "compose":
+        image_urls = payload.get("image_urls") or [payload.get("image_url")]
+        image_paths = payload.get("image_paths")
+        if not payload.get("image_urls"):
+            image_paths = [payload.get("image_path")]
+        image_paths = image_paths or [None] * len(image_urls)
+        refs = [
+            (url, path)
+            for url, path in zip(image_urls, image_paths, strict=True)
+            if url
+        ]
+        if not refs:
+            raise HTTPException(status_code=400, detail="Нет изображений для compose")
+    elif mode in {"edit", "filter", "adjust"}:
+        refs = [(payload["image_url"], payload.get("image_path"))]
+    elif mode == "text-to-image":
+        refs = []
+    else:
+        raise HTTPException(status_code=400, detail=f"Неизвестный режим {mode}")
+
+    images: list[tuple[bytes, str]] = []
+    for url, path in refs:
+        data = await _read_image_bytes(url, path)
+        if data is None:
+            raise HTTPException(
+                status_code=502, detail="Не удалось прочитать исходное изображение"
             )
-        elif mode in {"edit", "filter", "adjust"}:
+        images.append((data, _sniff_mime(data)))
+    image = await gemini_client.generate(
+        payload["prompt"],
+        images,
+        aspect_ratio=payload.get("aspect_ratio"),
+        resolution=payload.get("resolution"),
+        context=mode,
+    )
+    owner = payload.get("owner") or "worker"
+    return storage_key(await _save(image.data, image.mime, owner, "result"))
+
+
+async def _generate(message: dict[str, Any]) -> tuple[str, str]:
+    """(provider, result URL or storage key) for a queued job."""
+    payload = expand_job(message)
+    mode = payload.get("mode")
+    if mode == "edit" and (payload.get("options") or {}).get("crop"):
+        return await _region_edit(payload)
+    return await provider_router.run(
+        str(mode),
+        {
+            "fal": partial(_generate_fal, payload),
+            "gemini": partial(_generate_gemini, payload),
+        },
+        resolution=payload.get("resolution"),
+    )
+
+
+async def _generate_fal(payload: dict[str, Any]) -> str:
+    mode = payload.get("mode")
+    if mode == "text-to-image":
+        return await FalClient.text_to_image(
+            payload["prompt"],
+            aspect_ratio=payload.get("aspect_ratio", "1:1"),
+            output_format=payload.get("output_format", "png"),
+            resolution=payload.get("resolution"),
+        )
+    if mode == "compose":
+        # Handle multiple images for compose mode
+        image_urls = payload.get("image_urls", [])
+        image_paths = payload.get("image_paths") or [None] * len(image_urls)
+        public_urls: list[str] = []
+        for url, path in zip(image_urls, image_paths, strict=True):
+            public_url = await _public_image_url(url, path)
+            if public_url:
+                public_urls.append(public_url)
+        if not public_urls:
+            # Fallback to single image
             image_url = await _public_image_url(
                 payload.get("image_url"), payload.get("image_path")
             )
-            fal_url = await FalClient.edit_image(
-                payload["prompt"],
-                image_url or payload["image_url"],
-                aspect_ratio=payload.get("aspect_ratio", "auto"),
-                output_format=payload.get("output_format", "png"),
-                resolution=payload.get("resolution"),
-            )
+            if image_url:
+                public_urls = [image_url]
+        if not public_urls:
+            raise HTTPException(status_code=400, detail="Нет изображений для compose")
+        return await FalClient.compose_images(
+            payload["prompt"],
+            public_urls,
+            aspect_ratio=payload.get("aspect_ratio", "auto"),
+            output_format=payload.get("output_format", "png"),
+            resolution=payload.get("resolution"),
+        )
+    if mode in {"edit", "filter", "adjust"}:
+        image_url = await _public_image_url(
+            payload.get("image_url"), payload.get("image_path")
+        )
+        return await FalClient.edit_image(
+            payload["prompt"],
+            image_url or payload["image_url"],
+            aspect_ratio=payload.get("aspect_ratio", "auto"),
+            output_format=payload.get("output_format", "png"),
+            resolution=payload.get("resolution"),
+        )
+    raise HTTPException(status_code=400, detail=f"Неизвестный режим {mode}")
+
+
+async def _fal_edit_crop(
+    prompt: str, crop: bytes, owner: str, aspect_ratio: str
+) -> bytes:
+    crop_key = storage_key(await _save(crop, "image/png", owner, "crop"))
+    crop_url = await _public_image_url(to_public_url(crop_key), local_path(crop_key))
+    fal_url = await FalClient.edit_image(
+        prompt,
+        crop_url or to_public_url(crop_key),
+        aspect_ratio=aspect_ratio,
+        output_format="png",
+        resolution="1K",
+    )
+    async with httpx.AsyncClient(timeout=60) as client:
+        resp = await client.get(fal_url)
+    if resp.status_code != 200:
+        raise HTTPException(status_code=502, detail="Не удалось скачать результат FAL")
+    return resp.content
+
+
+async def _gemini_edit_crop(prompt: str, crop: bytes, aspect_ratio: str) -> bytes:
+    edited = await gemini_client.generate(
+        prompt,
+        [(crop, "image/png")],
+        aspect_ratio=aspect_ratio,
+        resolution="1K",
+        context="edit",
+    )
+    return edited.data
+
+
+async def _region_edit(payload: dict[str, Any]) -> tuple[str, str]:
+    """
+    Localized edit: send only a window around (x, y) to the provider at 1K and
+    blend the result back into the full-resolution original. Returns the provider
+    and a storage key.
+    """
+    params = dict(payload["params"])
+    source = await _read_image_bytes(payload["image_url"], payload.get("image_path"))
+    if source is None:
+        raise HTTPException(
+            status_code=502, detail="Не удалось прочитать исходное изображение"
+        )
+    owner = payload.get("owner") or "worker"
+
+    width, height = region_edit.image_size(source)
+    box = region_edit.crop_window(
+        width, height, int(params["x"]), int(params["y"]), settings.EDIT_CROP_SIZE
+    )
+    crop = await run_in_image_pool(region_edit.crop_sync, source, box)
+    params["x"], params["y"] = params["x"] - box[0], params["y"] - box[1]
+    prompt = render_prompt(payload["template"], params)
+    aspect_ratio = closest_aspect_ratio(box[2] - box[0], box[3] - box[1])
+    provider, edited_bytes = await provider_router.run(
+        "region-edit",
+        {
+            "fal": partial(_fal_edit_crop, prompt, crop, owner, aspect_ratio),
+            "gemini": partial(_gemini_edit_crop, prompt, crop, aspect_ratio),
+        },
+        resolution="1K",
+    )
+
+    output_format = payload.get("output_format") or "png"
+    composite = await run_in_image_pool(
+        region_edit.composite_sync,
+        source,
+        edited_bytes,
+        box,
+        settings.EDIT_CROP_FEATHER,
+        output_format,
+    )
+    mime = (
+        "image/jpeg" if output_format in {"jpg", "jpeg"} else f"image/{output_format}"
+    )
+    return provider, storage_key(await _save(composite, mime, owner, "result"))
+
+
+async def _run_cancellable(payload: dict[str, Any]) -> tuple[str, str]:
+    """_generate as a task that a cancellation message can stop."""
+    task = asyncio.create_task(_generate(payload))
+    with worker_jobs.track(job_id(payload), job_owner(payload), task):
+        try:
+            await asyncio.wait({task})
+        finally:
+            # no-op once done; stops the job if the handler itself is cancelled
+            task.cancel()
+    if task.cancelled():
+        raise JobCancelled()
+    return task.result()
+
+
+CANCELLED_REPLY = {
+    "status": "cancelled",
+    "code": CLIENT_CLOSED_REQUEST,
+    "detail": "Задание отменено",
+}
+
+
+@broker.subscriber(cancel_queue(WORKER_ID), cancel_exchange)
+async def handle_cancel(body: dict[str, Any]) -> None:
+    if body.get("id"):
+        worker_jobs.cancel(str(body["id"]), body.get("u"))
+
+
+@broker.subscriber(GENERATION_QUEUE)
+async def handle_generation(
+    payload: dict[str, Any], message: RabbitMessage
+) -> dict[str, Any]:
+    # payload stays in its queued (possibly compact) form so retries/DLQ republish it as-is
+    mode = job_mode(payload)
+    attempt = job_retry.attempts_made(message) + 1
+    if worker_jobs.is_cancelled(job_id(payload), job_owner(payload)):
+        worker_jobs.dropped += 1
+        CANCELLED.labels("queued").inc()
+        logger.info("Задание %s отменено до начала выполнения", mode)
+        return CANCELLED_REPLY
+    left = job_retry.time_left(message)
+    if left is not None and left <= 0:
+        # the caller has already given up; the reply goes nowhere
+        logger.warning("Задание %s пришло после дедлайна, пропускаем", mode)
+        return {"status": "error", "code": 504, "detail": "Истёк срок ожидания"}
+    logger.info("Получено задание %s (попытка %s)", mode, attempt)
+    started = time.perf_counter()
+    try:
+        provider, file_url = await _run_cancellable(payload)
+    except JobCancelled:
+        worker_jobs.aborted += 1
+        CANCELLED.labels("running").inc()
+        logger.info(
+            "Задание %s отменено через %.1f с", mode, time.perf_counter() - started
+        )
+        return CANCELLED_REPLY
+    except Exception as exc:
+        code, detail = job_retry.describe_error(exc)
+        if (
+            job_retry.is_transient(exc)
+            and attempt <= settings.GENERATION_RETRY_MAX_ATTEMPTS
+        ):
+            try:
+                delay = await job_retry.schedule_retry(payload, message, attempt)
+            except Exception as publish_exc:  # pragma: no cover - defensive
+                logger.exception("Не удалось запланировать повтор: %s", publish_exc)
+                delay = None
+            if delay is None:
+                logger.warning("Задание %s: повтор не успеет до дедлайна", mode)
+            else:
+                logger.warning(
+                    "Временная ошибка в задании %s (%s: %s), повтор через %.1f с",
+                    mode,
+                    code,
+                    detail,
+                    delay,
+                )
+                # Ack without replying: the caller keeps waiting for the retried job
+                raise AckMessage()
+
+        if isinstance(exc, HTTPException):
+            logger.warning("Ошибка HTTP при обработке %s: %s", mode, detail)
         else:
-            raise HTTPException(status_code=400, detail=f"Неизвестный режим {mode}")
+            logger.exception("Неожиданная ошибка в воркере: %s", exc)
+        await job_retry.dead_letter(
+            payload, message, code=code, detail=detail, attempts=attempt
+        )
+        return {"status": "error", "code": code, "detail": detail}
 
-        logger.info("Задание %s выполнено", mode)
-        return {"status": "ok", "file_url": fal_url}
-    except HTTPException as exc:
-        logger.warning("Ошибка HTTP при обработке %s: %s", mode, exc.detail)
-        return {"status": "error", "code": exc.status_code, "detail": exc.detail}
-    except Exception as exc:  # pragma: no cover - defensive
-        logger.exception("Неожиданная ошибка в воркере: %s", exc)
-        return {"status": "error", "code": 500, "detail": str(exc)}
+    service_seconds = time.perf_counter() - started
+    logger.info(
+        "Задание %s выполнено через %s за %.1f с", mode, provider, service_seconds
+    )
+    return {
+        "status": "ok",
+        "file_url": file_url,
+        "provider": provider,
+        "service_seconds": round(service_seconds, 3),
+        "worker": WORKER_ID,
+        "cache": {
+            "hits": source_cache.stats.hits,
+            "misses": source_cache.stats.misses,
+        },
+    }
+
+
+if settings.GENERATION_AFFINITY_ENABLED:
+    # same handler, also fed by this worker's slot on the consistent-hash ring
+    handle_generation = broker.subscriber(
+        affinity.worker_queue(WORKER_ID), affinity.affinity_exchange
+    )(handle_generation)
 
 
 app = FastStream(broker)
 
 
+@app.after_startup
+async def declare_queues() -> None:
+    await job_retry.declare_retry_topology()
+    # retries and dead letters go out on its publisher-confirm channels
+    await broker_supervisor.start(wait=True)
+
+
+@app.after_startup
+async def serve_metrics() -> None:
+    if settings.WORKER_METRICS_PORT:
+        start_server(settings.WORKER_METRICS_PORT)
+
+
+@app.after_shutdown
+async def close_clients() -> None:
+    await gemini_client.aclose()
+    await broker_supervisor.stop()
+
+
 if __name__ == "__main__":
     # запуск: python -m app.worker
     import asyncio
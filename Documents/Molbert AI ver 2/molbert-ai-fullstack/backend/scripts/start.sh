@@ -0,0 +1,11 @@
+#! /usr/bin/env bash
+
+set -e
+
+# Prometheus multiprocess mode: drop samples of processes from the last run
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+exec fastapi run --workers 4 app/main.py
@@ -0,0 +1,39 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app.core.config import Settings, settings
+from app.services.metrics import MODES, bounded
+
+
+def test_metrics_use_route_templates(client: TestClient) -> None:
+    client.get(f"{settings.API_V1_STR}/utils/health-check/")
+    client.get(f"{settings.API_V1_STR}/no-such-route/12345")
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    body = r.text
+    assert 'route="/api/v1/utils/health-check/"' in body
+    assert 'route="unmatched"' in body
+    assert "12345" not in body
+    assert "db_pool_checkout_seconds" in body
+
+
+def test_metrics_token(client: TestClient) -> None:
+    with patch("app.core.config.settings.METRICS_TOKEN", "secret"):
+        assert client.get("/metrics").status_code == 401
+        r = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        assert r.status_code == 200
+
+
+def test_label_values_are_bounded() -> None:
+    assert bounded("edit", MODES) == "edit"
+    assert bounded("../../etc", MODES) == "other"
+    assert bounded(None, MODES) == "other"
+
+
+def test_metrics_token_is_required_outside_local() -> None:
+    with pytest.raises(ValidationError, match="METRICS_TOKEN"):
+        Settings(ENVIRONMENT="staging", METRICS_TOKEN=None)
+    assert Settings(ENVIRONMENT="staging", METRICS_TOKEN="secret").METRICS_TOKEN
@@ -0,0 +1,27 @@
+from pathlib import Path
+from unittest.mock import patch
+from urllib.parse import urlsplit
+
+from fastapi.testclient import TestClient
+
+from app.services.storage import LocalStorageBackend
+from app.services.uploads import create_intent
+
+USER = "3f1e9f1c-0000-4000-8000-000000000001"
+
+
+def test_local_put_creates_the_shard_directory(
+    client: TestClient, tmp_path: Path
+) -> None:
+    data = b"\x89PNG\r\n\x1a\n" + b"\x00" * 56
+    backend = LocalStorageBackend(tmp_path)
+    with patch("app.services.storage._backend", backend):
+        intent = create_intent(USER, "image/png", len(data), "put")
+        url = urlsplit(intent.url)
+        r = client.put(f"{url.path}?{url.query}", content=data, headers=intent.headers)
+        assert r.status_code == 200, r.text
+        # the key's shard directory did not exist before the upload
+        assert (tmp_path / intent.key).read_bytes() == data
+
+        r = client.put(f"{url.path}?{url.query}", content=data, headers=intent.headers)
+        assert r.status_code == 409
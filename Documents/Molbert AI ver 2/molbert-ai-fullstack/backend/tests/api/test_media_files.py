@@ -0,0 +1,24 @@
+import pytest
+
+from app.api.media_files import parse_range
+
+
+def test_parse_range() -> None:
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=990-2000", 1000) == (990, 999)
+
+
+def test_parse_range_falls_back_to_full_file() -> None:
+    assert parse_range("bytes=0-10,20-30", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+    assert parse_range("bytes=abc", 1000) is None
+    assert parse_range("bytes=50-10", 1000) is None
+
+
+def test_parse_range_unsatisfiable() -> None:
+    with pytest.raises(ValueError):
+        parse_range("bytes=1000-", 1000)
+    with pytest.raises(ValueError):
+        parse_range("bytes=1000-1500", 1000)
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.dlq import _matches, _summary, replay
+from app.services.job_retry import ATTEMPT_HEADER, ERROR_CODE_HEADER
+from app.services.jobs import GenerationJob
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+def _message(body: bytes, headers: dict[str, Any]) -> Any:
+    return SimpleNamespace(
+        body=body,
+        headers=headers,
+        correlation_id="corr-1",
+        ack=AsyncMock(),
+        nack=AsyncMock(),
+    )
+
+
+def test_summary_reads_compact_jobs() -> None:
+    job = GenerationJob(
+        mode="edit",
+        template="edit.v1",
+        params={"user_prompt": "sky"},
+        owner="user-1",
+        job_id="job-1",
+    )
+    message = _message(job.encode(), {ATTEMPT_HEADER: 3, ERROR_CODE_HEADER: 429})
+
+    summary = _summary(message)
+
+    assert summary["mode"] == "edit"
+    assert summary["job_id"] == "job-1"
+    assert summary["owner"] == "user-1"
+    assert _matches(summary, "edit", 429)
+    assert not _matches(summary, "compose", None)
+
+
+def test_summary_reads_v1_jobs() -> None:
+    message = _message(b'{"mode": "compose", "owner": "user-2"}', {})
+    summary = _summary(message)
+    assert (summary["mode"], summary["owner"], summary["job_id"]) == (
+        "compose",
+        "user-2",
+        None,
+    )
+    assert _summary(_message(b"not json", {}))["mode"] is None
+
+
+@pytest.mark.anyio
+async def test_replay_needs_force() -> None:
+    job = GenerationJob(mode="edit", template="edit.v1", params={})
+    message = _message(job.encode(), {})
+    with (
+        patch("app.dlq._fetch", AsyncMock(return_value=[message])),
+        patch("app.dlq.broker.publish", AsyncMock()) as publish,
+    ):
+        await replay(10, "edit", None, force=False)
+        publish.assert_not_awaited()
+        message.nack.assert_awaited_once_with(requeue=True)
+
+        await replay(10, "edit", None, force=True)
+        publish.assert_awaited_once()
+        message.ack.assert_awaited_once()
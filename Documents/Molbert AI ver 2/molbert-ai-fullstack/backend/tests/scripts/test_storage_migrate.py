@@ -0,0 +1,27 @@
+import uuid
+from pathlib import Path
+
+from app.services.storage import shard_dir
+from app.storage_migrate import _rewrite, move_batch
+
+
+def test_move_batch_shards_files_and_skips_missing(tmp_path: Path) -> None:
+    name = f"result-u-{uuid.uuid4()}.png"
+    (tmp_path / name).write_bytes(b"data")
+    gone = f"result-u-{uuid.uuid4()}.png"
+
+    moved = move_batch(tmp_path, [name, gone])
+
+    assert moved == {name: f"{shard_dir(name)}/{name}"}
+    assert (tmp_path / moved[name]).read_bytes() == b"data"
+    assert not (tmp_path / name).exists()
+
+
+def test_rewrite_keeps_the_stored_form(tmp_path: Path) -> None:
+    moved = {"a.png": "ab/cd/a.png"}
+    assert _rewrite("a.png", tmp_path, moved) == "ab/cd/a.png"
+    assert _rewrite(str(tmp_path / "a.png"), tmp_path, moved) == str(
+        tmp_path / "ab/cd/a.png"
+    )
+    assert _rewrite("https://fal.media/a.png", tmp_path, moved) is None
+    assert _rewrite("b.png", tmp_path, moved) is None
@@ -0,0 +1,35 @@
+import numpy as np
+
+from app.services.adjustments import apply_plan, classify_adjustment
+
+
+def test_classifier_recognises_plain_requests() -> None:
+    assert classify_adjustment("Make it brighter and more contrast") == {
+        "brightness": 0.15,
+        "contrast": 0.25,
+    }
+    assert classify_adjustment("Пожалуйста, сделай теплее") == {"white_balance": 0.1}
+    assert classify_adjustment("чуть темнее")["brightness"] < 0  # type: ignore[index]
+
+
+def test_classifier_leaves_ambiguous_requests_to_fal() -> None:
+    assert classify_adjustment("add a sunset in the background") is None
+    assert classify_adjustment("brighter and remove the car") is None
+    assert classify_adjustment("") is None
+
+
+def test_apply_plan_moves_pixels_in_the_expected_direction() -> None:
+    rgb = np.full((4, 4, 3), 0.5, dtype=np.float32)
+    rgb[..., 0] = 0.6
+    assert apply_plan(rgb, {"brightness": 0.2}).mean() > rgb.mean()
+    assert apply_plan(rgb, {"brightness": -0.2}).mean() < rgb.mean()
+
+    warm = apply_plan(rgb, {"white_balance": 0.1})
+    assert warm[..., 0].mean() > rgb[..., 0].mean()
+    assert warm[..., 2].mean() < rgb[..., 2].mean()
+
+    gray = apply_plan(rgb, {"saturation": -1.0})
+    assert np.allclose(gray[..., 0], gray[..., 1], atol=1e-6)
+
+    out = apply_plan(rgb, {"contrast": 5.0, "brightness": 1.0})
+    assert out.min() >= 0.0 and out.max() <= 1.0
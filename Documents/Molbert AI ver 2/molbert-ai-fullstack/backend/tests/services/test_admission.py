@@ -0,0 +1,47 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.admission import AdmissionController, QueueSnapshot
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+def _controller_with(snapshot: QueueSnapshot | None) -> AdmissionController:
+    controller = AdmissionController()
+
+    async def fake_snapshot() -> QueueSnapshot | None:
+        return snapshot
+
+    controller.snapshot = fake_snapshot  # type: ignore[method-assign]
+    return controller
+
+
+def test_expected_wait_uses_larger_backlog() -> None:
+    controller = AdmissionController()
+    with patch("app.core.config.settings.GENERATION_AVG_SERVICE_SECONDS", 10.0):
+        snapshot = QueueSnapshot(depth=8, consumers=2, in_flight=3, taken_at=0)
+        assert controller.expected_wait(snapshot) == 40.0
+        snapshot = QueueSnapshot(depth=1, consumers=1, in_flight=5, taken_at=0)
+        assert controller.expected_wait(snapshot) == 50.0
+
+
+@pytest.mark.anyio
+async def test_rejects_with_retry_after_when_overloaded() -> None:
+    controller = _controller_with(
+        QueueSnapshot(depth=100, consumers=1, in_flight=0, taken_at=0)
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        await controller.check(None)  # type: ignore[arg-type]
+    assert exc_info.value.status_code == 503
+    assert int(exc_info.value.headers["Retry-After"]) >= 1
+
+
+@pytest.mark.anyio
+async def test_fails_open_when_broker_state_unknown() -> None:
+    controller = _controller_with(None)
+    await controller.check(None)  # type: ignore[arg-type]
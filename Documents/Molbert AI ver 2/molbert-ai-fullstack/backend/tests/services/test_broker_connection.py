@@ -0,0 +1,52 @@
+from contextlib import asynccontextmanager
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.broker_connection import BrokerSupervisor
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+def _supervisor(channel: Any) -> BrokerSupervisor:
+    supervisor = BrokerSupervisor()
+    supervisor.connected = True
+
+    @asynccontextmanager
+    async def acquire() -> Any:
+        yield channel
+
+    supervisor._channel_pool = MagicMock(acquire=acquire)
+    return supervisor
+
+
+@pytest.mark.anyio
+async def test_publish_to_queue_and_exchange() -> None:
+    channel = MagicMock()
+    channel.default_exchange.publish = AsyncMock()
+    fanout = MagicMock(publish=AsyncMock())
+    channel.get_exchange = AsyncMock(return_value=fanout)
+    supervisor = _supervisor(channel)
+
+    await supervisor.publish({"a": 1}, target="retry", routing_key="q", expiration=2.5)
+    message = channel.default_exchange.publish.await_args.args[0]
+    assert message.body == b'{"a":1}'
+    assert channel.default_exchange.publish.await_args.kwargs == {"routing_key": "q"}
+
+    await supervisor.publish({"id": "x"}, target="cancel", exchange="generation.cancel")
+    channel.get_exchange.assert_awaited_once_with("generation.cancel", ensure=False)
+    fanout.publish.assert_awaited_once()
+    assert supervisor.publish_latency.count == 2
+
+
+@pytest.mark.anyio
+async def test_publish_fails_fast_when_disconnected() -> None:
+    supervisor = BrokerSupervisor()
+    with pytest.raises(HTTPException) as exc_info:
+        await supervisor.publish({}, target="retry", routing_key="q")
+    assert exc_info.value.status_code == 503
@@ -0,0 +1,97 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.cancellation import JobCancelled, JobRegistry, WorkerJobs
+from app.services.task_queue import _wait_for_reply
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+class FakeRequest:
+    def __init__(self) -> None:
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+@pytest.mark.anyio
+async def test_worker_cancels_running_job_of_owner() -> None:
+    jobs = WorkerJobs()
+    task = asyncio.create_task(asyncio.sleep(10))
+    with jobs.track("job-1", "alice", task):
+        jobs.cancel("job-1", "mallory")
+        await asyncio.sleep(0)
+        assert not task.cancelled()
+        jobs.cancel("job-1", "alice")
+        await asyncio.sleep(0)
+        assert task.cancelled()
+    assert "job-1" not in jobs.running
+
+
+def test_worker_remembers_cancelled_ids() -> None:
+    jobs = WorkerJobs()
+    jobs.cancel("job-2", None)
+    assert jobs.is_cancelled("job-2", "alice")
+    assert not jobs.is_cancelled("job-3", "alice")
+    assert not jobs.is_cancelled(None, "alice")
+    with patch("app.core.config.settings.GENERATION_RPC_TIMEOUT", 0):
+        jobs.cancel("job-4", None)
+    assert not jobs.is_cancelled("job-4", "alice")
+
+
+@pytest.mark.anyio
+async def test_delete_stops_the_wait() -> None:
+    registry = JobRegistry()
+    with (
+        patch("app.services.cancellation.publish_cancel", AsyncMock()) as publish,
+        registry.track("job-5", "alice") as pending,
+    ):
+        waiting = asyncio.create_task(_wait_for_reply(asyncio.sleep(10), pending, None))
+        await asyncio.sleep(0)
+        await registry.cancel("job-5", "alice")
+        with pytest.raises(JobCancelled) as exc_info:
+            await waiting
+    assert str(exc_info.value) == "delete"
+    publish.assert_awaited_once_with("job-5", "alice")
+
+
+@pytest.mark.anyio
+async def test_only_the_owner_may_cancel() -> None:
+    registry = JobRegistry()
+    with registry.track("job-6", "alice"):
+        with pytest.raises(HTTPException) as exc_info:
+            await registry.cancel("job-6", "mallory")
+    assert exc_info.value.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_disconnect_stops_the_wait() -> None:
+    registry = JobRegistry()
+    request = FakeRequest()
+    with (
+        patch("app.core.config.settings.GENERATION_DISCONNECT_POLL", 0.01),
+        registry.track("job-7", "alice") as pending,
+    ):
+        waiting = asyncio.create_task(
+            _wait_for_reply(asyncio.sleep(10), pending, request)  # type: ignore[arg-type]
+        )
+        request.disconnected = True
+        with pytest.raises(JobCancelled) as exc_info:
+            await waiting
+    assert str(exc_info.value) == "disconnect"
+
+
+def test_duplicate_job_id_is_rejected() -> None:
+    registry = JobRegistry()
+    with registry.track("job-8", "alice"):
+        with pytest.raises(HTTPException) as exc_info:
+            with registry.track("job-8", "alice"):
+                pass
+    assert exc_info.value.status_code == 409
@@ -0,0 +1,100 @@
+import time
+from pathlib import Path
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import derivatives
+from app.services.derivatives import (
+    DerivativeCache,
+    derivative_key,
+    derivative_signature,
+    parse_size,
+    thumbnail_url,
+    verify_derivative,
+)
+from app.services.storage import LocalStorageBackend
+
+
+class FakeStorage:
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+
+    def read(self, key: str) -> bytes:
+        if key not in self.objects:
+            raise HTTPException(status_code=404)
+        return self.objects[key]
+
+    def put(self, key: str, data: bytes, mime: str) -> None:
+        self.objects[key] = data
+
+    def delete(self, key: str) -> None:
+        self.objects.pop(key, None)
+
+
+def test_parse_size_only_allows_configured_sizes() -> None:
+    with patch.object(derivatives.settings, "MEDIA_RESIZE_SIZES", ["256x256"]):
+        assert parse_size("256x256") == (256, 256)
+        with pytest.raises(HTTPException):
+            parse_size("4000x4000")
+
+
+def test_derivative_key_depends_on_size_and_format() -> None:
+    key = derivative_key("u/result-1.png", 256, 256, "webp")
+    assert key.startswith("derived/256x256/") and key.endswith(".webp")
+    assert key == derivative_key("u/result-1.png", 256, 256, "webp")
+    assert key != derivative_key("u/result-1.png", 256, 256, "avif")
+
+
+def test_thumbnail_urls_are_signed_for_their_key() -> None:
+    url = urlsplit(thumbnail_url("u/result-1.png"))
+    size, key = url.path.removeprefix("/media/resize/").split("/", 1)
+    query = {name: values[0] for name, values in parse_qs(url.query).items()}
+    expires = int(query["expires"])
+    assert expires > time.time()
+    verify_derivative(size, key, expires, query["sig"])
+    with pytest.raises(HTTPException) as exc_info:
+        verify_derivative(size, "u/other.png", expires, query["sig"])
+    assert exc_info.value.status_code == 403
+    past = int(time.time()) - 1
+    with pytest.raises(HTTPException):
+        verify_derivative(size, key, past, derivative_signature(size, key, past))
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    storage = FakeStorage()
+    with (
+        patch.object(derivatives, "read_bytes", storage.read),
+        patch.object(derivatives, "put_bytes", storage.put),
+        patch.object(derivatives, "delete_key", storage.delete),
+        patch.object(derivatives, "list_keys", lambda prefix: iter(())),
+    ):
+        cache = DerivativeCache(max_bytes=10)
+        assert cache.get("derived/a") is None
+        cache.put("derived/a", b"aaaa", "image/webp")
+        cache.put("derived/b", b"bbbb", "image/webp")
+        assert cache.get("derived/a") == b"aaaa"
+        cache.put("derived/c", b"cccc", "image/webp")
+
+    assert set(storage.objects) == {"derived/a", "derived/c"}
+    assert cache.status()["bytes"] == 8
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_oversized_sources_are_refused_before_reading(tmp_path: Path) -> None:
+    from app.api.routes import media
+
+    backend = LocalStorageBackend(tmp_path)
+    key = "image/ab/big.png"
+    backend.put(key, b"\x00" * 64, "image/png")
+    with (
+        patch("app.services.storage._backend", backend),
+        patch.object(media, "MAX_SOURCE_BYTES", 32),
+        patch.object(backend, "read", side_effect=AssertionError) as read,
+    ):
+        with pytest.raises(HTTPException) as exc:
+            media._read_stored(key)
+        assert exc.value.status_code == 413
+        read.assert_not_called()
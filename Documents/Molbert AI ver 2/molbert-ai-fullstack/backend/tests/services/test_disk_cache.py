@@ -0,0 +1,66 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app.services.disk_cache import DiskCache
+
+
+def test_lru_eviction_by_size(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path, max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"  # a is now most recent
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    status = cache.status()
+    assert status["evictions"] == 1
+    assert status["bytes"] == 8
+    assert status["bytes_served"] == 8
+
+
+def test_entries_survive_restart(tmp_path: Path) -> None:
+    DiskCache(tmp_path, max_bytes=100).put("u/a.png", b"data")
+    assert DiskCache(tmp_path, max_bytes=100).get("u/a.png") == b"data"
+    assert not list(tmp_path.glob("**/*.tmp"))
+
+
+def test_concurrent_misses_share_one_fetch(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path, max_bytes=100)
+    calls = 0
+    release = threading.Event()
+
+    def fetch() -> bytes:
+        nonlocal calls
+        calls += 1
+        release.wait(5)
+        return b"data"
+
+    results: list[bytes] = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_fetch("k", fetch)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == [b"data"] * 4
+    assert calls == 1
+    assert cache.status()["bytes_fetched"] == 4
+
+
+def test_failed_fetch_is_not_cached(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path, max_bytes=100)
+
+    def fetch() -> bytes:
+        raise RuntimeError("s3 down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_fetch("k", fetch)
+    assert cache.get_or_fetch("k", lambda: b"ok") == b"ok"
@@ -0,0 +1,40 @@
+from app.services.eta import EtaEstimator
+from app.services.histogram import Histogram
+
+
+def test_histogram_quantiles() -> None:
+    histogram = Histogram()
+    assert histogram.quantile(0.5) is None
+    for value in [4, 4, 4, 4, 25]:
+        histogram.observe(value)
+    assert histogram.count == 5
+    assert histogram.mean == 8.2
+    median = histogram.quantile(0.5)
+    assert median is not None and 3 <= median <= 5
+    p90 = histogram.quantile(0.9)
+    assert p90 is not None and 20 <= p90 <= 30
+
+
+def test_estimate_uses_per_mode_median_once_warm() -> None:
+    estimator = EtaEstimator()
+    for _ in range(5):
+        estimator.observe_service("edit", "1K", 10.0)
+        estimator.observe_service("compose", "4K", 100.0)
+    edit = estimator.estimate("edit", "1K", queue_wait=30.0)
+    compose = estimator.estimate("compose", "4K", queue_wait=30.0)
+    assert edit.service_seconds < compose.service_seconds
+    assert (edit.estimated_completion_at - edit.estimated_start_at).total_seconds() == (
+        edit.service_seconds
+    )
+    # Unknown key falls back to the overall mean
+    assert estimator.service_time("filter", "2K") == 55.0
+    # so does an estimate without a mode (/users/me/usage)
+    assert estimator.service_time(None, "") == 55.0
+
+
+def test_report_tracks_prediction_error() -> None:
+    estimator = EtaEstimator()
+    estimator.observe_prediction(predicted=20.0, actual=26.0)
+    report = estimator.report()
+    assert report["prediction_abs_error"]["count"] == 1
+    assert report["prediction_abs_error"]["mean"] == 6.0
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
+
+from app.services.gemini import GeminiClient
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+def _client_returning(generate: AsyncMock) -> GeminiClient:
+    client = GeminiClient()
+    client._client = SimpleNamespace(  # type: ignore[assignment]
+        aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate))
+    )
+    return client
+
+
+def _image_response(data: bytes, mime: str) -> genai_types.GenerateContentResponse:
+    part = genai_types.Part.from_bytes(data=data, mime_type=mime)
+    return genai_types.GenerateContentResponse(
+        candidates=[genai_types.Candidate(content=genai_types.Content(parts=[part]))]
+    )
+
+
+@pytest.mark.anyio
+async def test_generate_returns_raw_bytes() -> None:
+    generate = AsyncMock(return_value=_image_response(b"\x89PNG-data", "image/png"))
+    client = _client_returning(generate)
+    with patch("app.core.config.settings.GEMINI_API_KEY", "key"):
+        image = await client.generate(
+            "a cat", [(b"src", "image/jpeg")], aspect_ratio="auto", context="edit"
+        )
+    assert image.data == b"\x89PNG-data"
+    assert image.mime == "image/png"
+    config = generate.call_args.kwargs["config"]
+    assert config.image_config.aspect_ratio is None
+    assert len(generate.call_args.kwargs["contents"]) == 2
+
+
+@pytest.mark.anyio
+async def test_api_errors_keep_their_status_code() -> None:
+    error = genai_errors.APIError(429, {"error": {"message": "quota"}})
+    client = _client_returning(AsyncMock(side_effect=error))
+    with patch("app.core.config.settings.GEMINI_API_KEY", "key"):
+        with pytest.raises(HTTPException) as exc_info:
+            await client.generate("a cat", context="text-to-image")
+    assert exc_info.value.status_code == 429
+
+
+@pytest.mark.anyio
+async def test_missing_key_is_unavailable() -> None:
+    with patch("app.core.config.settings.GEMINI_API_KEY", None):
+        with pytest.raises(HTTPException) as exc_info:
+            await GeminiClient().generate("a cat", context="text-to-image")
+    assert exc_info.value.status_code == 503
@@ -0,0 +1,77 @@
+import struct
+import zlib
+
+import pytest
+
+from app.services.image_probe import ProbeError, closest_aspect_ratio, probe_image
+
+
+def _png_header(width: int, height: int) -> bytes:
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", len(ihdr))
+        + chunk
+        + struct.pack(">I", zlib.crc32(chunk))
+    )
+
+
+def _jpeg_header(width: int, height: int, orientation: int = 1) -> bytes:
+    tiff = b"MM\x00\x2a" + struct.pack(">I", 8)
+    tiff += struct.pack(">H", 1) + struct.pack(">HHIHH", 0x0112, 3, 1, orientation, 0)
+    app1 = b"Exif\x00\x00" + tiff
+    sof = b"\x08" + struct.pack(">HH", height, width) + b"\x03" + b"\x00" * 9
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe1"
+        + struct.pack(">H", len(app1) + 2)
+        + app1
+        + b"\xff\xc0"
+        + struct.pack(">H", len(sof) + 2)
+        + sof
+    )
+
+
+def _webp_vp8x(width: int, height: int) -> bytes:
+    payload = (
+        b"\x00" * 4
+        + (width - 1).to_bytes(3, "little")
+        + (height - 1).to_bytes(3, "little")
+    )
+    return (
+        b"RIFF"
+        + struct.pack("<I", 4 + 8 + len(payload))
+        + b"WEBPVP8X"
+        + struct.pack("<I", len(payload))
+        + payload
+    )
+
+
+def test_png_bomb_dimensions_are_read_from_header() -> None:
+    info = probe_image(_png_header(50000, 50000))
+    assert (info.format, info.width, info.height) == ("png", 50000, 50000)
+    assert info.pixels == 2_500_000_000
+
+
+def test_jpeg_applies_exif_rotation() -> None:
+    assert probe_image(_jpeg_header(4000, 3000)).width == 4000
+    rotated = probe_image(_jpeg_header(4000, 3000, orientation=6))
+    assert (rotated.width, rotated.height) == (3000, 4000)
+
+
+def test_webp_extended_header() -> None:
+    info = probe_image(_webp_vp8x(1920, 1080))
+    assert (info.format, info.width, info.height) == ("webp", 1920, 1080)
+
+
+def test_rejects_truncated_header() -> None:
+    with pytest.raises(ProbeError):
+        probe_image(b"\x89PNG\r\n\x1a\n\x00")
+
+
+def test_closest_aspect_ratio() -> None:
+    assert closest_aspect_ratio(1920, 1080) == "16:9"
+    assert closest_aspect_ratio(1080, 1920) == "9:16"
+    assert closest_aspect_ratio(1000, 1010) == "1:1"
+    assert closest_aspect_ratio(4000, 3000) == "4:3"
@@ -0,0 +1,55 @@
+import io
+
+from PIL import Image
+
+from app.services.imaging import _normalize_sync, decode_rgb, encode_rgb
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_downscales_to_long_edge_and_reencodes() -> None:
+    data = _png(3000, 1500)
+    result = _normalize_sync(data, "image/png", 1024, "webp", 90)
+    assert (result.width, result.height) == (1024, 512)
+    assert result.mime == "image/webp"
+    assert abs(result.scale - 1024 / 3000) < 1e-9
+    assert result.original_size == len(data)
+    with Image.open(io.BytesIO(result.data)) as decoded:
+        assert decoded.size == (1024, 512)
+
+
+def test_small_image_in_target_format_is_untouched() -> None:
+    buffer = io.BytesIO()
+    Image.new("RGB", (200, 100)).save(buffer, format="WEBP")
+    data = buffer.getvalue()
+    result = _normalize_sync(data, "image/webp", 1024, "webp", 90)
+    assert result.data is data
+    assert result.scale == 1.0
+    assert result.bytes_saved == 0
+
+
+def test_exif_orientation_is_applied() -> None:
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90° clockwise on display
+    buffer = io.BytesIO()
+    Image.new("RGB", (200, 100)).save(buffer, format="WEBP", exif=exif)
+    result = _normalize_sync(buffer.getvalue(), "image/webp", 1024, "webp", 90)
+    assert (result.width, result.height) == (100, 200)
+
+
+def test_decode_and_encode_keep_alpha() -> None:
+    buffer = io.BytesIO()
+    Image.new("RGBA", (400, 200), (255, 0, 0, 128)).save(buffer, format="PNG")
+    rgb, alpha = decode_rgb(buffer.getvalue(), 100)
+    assert rgb.shape == (50, 100, 3)
+    assert alpha is not None
+    with Image.open(io.BytesIO(encode_rgb(rgb, alpha, "png"))) as png:
+        assert png.mode == "RGBA"
+        assert png.getpixel((0, 0)) == (255, 0, 0, 128)
+    # JPEG has no alpha channel
+    with Image.open(io.BytesIO(encode_rgb(rgb, alpha, "jpg"))) as jpeg:
+        assert jpeg.mode == "RGB"
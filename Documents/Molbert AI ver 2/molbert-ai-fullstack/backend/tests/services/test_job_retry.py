@@ -0,0 +1,84 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.services.job_retry import (
+    DEADLINE_HEADER,
+    backoff_delay,
+    deadline_headers,
+    describe_error,
+    is_transient,
+    schedule_retry,
+    time_left,
+)
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+def test_transient_errors() -> None:
+    assert is_transient(HTTPException(status_code=429, detail="rate limited"))
+    assert is_transient(HTTPException(status_code=502, detail="bad gateway"))
+    assert is_transient(httpx.ReadTimeout("timeout"))
+    assert not is_transient(HTTPException(status_code=400, detail="bad request"))
+    assert not is_transient(HTTPException(status_code=422, detail="refused"))
+    assert not is_transient(KeyError("prompt"))
+
+
+def test_describe_error() -> None:
+    assert describe_error(HTTPException(status_code=429, detail="slow down")) == (
+        429,
+        "slow down",
+    )
+    code, _ = describe_error(httpx.ConnectTimeout("timeout"))
+    assert code == 504
+
+
+def test_backoff_delay_is_jittered_and_capped() -> None:
+    with (
+        patch("app.core.config.settings.GENERATION_RETRY_BASE_DELAY", 2.0),
+        patch("app.core.config.settings.GENERATION_RETRY_MAX_DELAY", 10.0),
+    ):
+        for attempt, window in [(1, 2.0), (2, 4.0), (3, 8.0), (4, 10.0), (9, 10.0)]:
+            delays = {backoff_delay(attempt) for _ in range(50)}
+            assert all(window / 2 <= d <= window for d in delays)
+            assert len(delays) > 1
+
+
+def test_time_left_reads_the_deadline_header() -> None:
+    message = MagicMock(headers=deadline_headers(30))
+    left = time_left(message)
+    assert left is not None and 29 < left <= 30
+    assert time_left(MagicMock(headers={})) is None
+    assert time_left(MagicMock(headers={DEADLINE_HEADER: "soon"})) is None
+
+
+@pytest.mark.anyio
+async def test_no_retry_past_the_callers_deadline() -> None:
+    message = MagicMock(headers=deadline_headers(5), correlation_id="c", reply_to="r")
+    with (
+        patch("app.core.config.settings.GENERATION_AVG_SERVICE_SECONDS", 20.0),
+        patch(
+            "app.services.job_retry.broker_supervisor.publish", AsyncMock()
+        ) as publish,
+    ):
+        assert await schedule_retry({"m": "edit"}, message, 1) is None
+    publish.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_retry_goes_through_the_confirmed_pool() -> None:
+    message = MagicMock(headers={}, correlation_id="c", reply_to="r")
+    with patch(
+        "app.services.job_retry.broker_supervisor.publish", AsyncMock()
+    ) as publish:
+        delay = await schedule_retry({"m": "edit"}, message, 2)
+    assert delay is not None
+    kwargs = publish.await_args.kwargs
+    assert kwargs["routing_key"] == "generation.retry.2"
+    assert (kwargs["reply_to"], kwargs["correlation_id"]) == ("r", "c")
+    assert kwargs["expiration"] == delay
@@ -0,0 +1,57 @@
+import orjson
+
+from app.services.jobs import GenerationJob, expand_job, job_mode
+from app.services.prompts import RETOUCH_TEMPLATE
+
+
+def test_compact_message_round_trip() -> None:
+    job = GenerationJob(
+        mode="edit",
+        template="retouch.v1",
+        params={"user_prompt": "remove the cup", "x": 10, "y": 20},
+        source_keys=["source-u-1.png"],
+        resolution="1K",
+    )
+    message = orjson.loads(job.encode())
+    assert message["v"] == 2
+    assert "prompt" not in message
+    assert job_mode(message) == "edit"
+
+    payload = expand_job(message)
+    assert payload["prompt"] == RETOUCH_TEMPLATE.format(
+        user_prompt="remove the cup", x=10, y=20
+    )
+    assert payload["image_url"].endswith("/media/source-u-1.png")
+    assert payload["image_path"].endswith("source-u-1.png")
+    assert payload["resolution"] == "1K"
+
+
+def test_compose_expands_all_sources() -> None:
+    job = GenerationJob(
+        mode="compose",
+        template="compose.v1",
+        params={"user_prompt": "collage"},
+        source_keys=["a.png", "b.png"],
+    )
+    payload = expand_job(job.to_message())
+    assert len(payload["image_urls"]) == 2
+    assert len(payload["image_paths"]) == 2
+
+
+def test_legacy_message_passes_through() -> None:
+    legacy = {"mode": "text-to-image", "prompt": "a cat", "aspect_ratio": "1:1"}
+    assert expand_job(legacy) is legacy
+    assert job_mode(legacy) == "text-to-image"
+
+
+def test_chained_provider_result_is_passed_as_is() -> None:
+    fal_url = "https://v3.fal.media/files/abc/result.png"
+    job = GenerationJob(
+        mode="filter",
+        template="filter.v1",
+        params={"user_prompt": "noir"},
+        source_keys=[fal_url],
+    )
+    payload = expand_job(job.to_message())
+    assert payload["image_url"] == fal_url
+    assert payload["image_path"] is None
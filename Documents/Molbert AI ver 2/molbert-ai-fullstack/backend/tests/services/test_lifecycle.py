@@ -0,0 +1,23 @@
+import uuid
+
+from app.services.lifecycle import parse_key
+
+USER = uuid.UUID("0b6f1e7a-3c1d-4a52-9f3e-2d9c8b7a6e51")
+FILE = "5d2c1b0a-9e8f-4d7c-8b6a-1f2e3d4c5b6a"
+
+
+def test_parse_s3_keys() -> None:
+    assert parse_key(f"{USER}/result-{FILE}.png") == ("result", USER)
+    assert parse_key(f"{USER}/upload-{FILE}.webp") == ("upload", USER)
+
+
+def test_parse_local_keys() -> None:
+    assert parse_key(f"ab/cd/source-{USER}-{FILE}.png") == ("source", USER)
+    # flat layout from before sharding
+    assert parse_key(f"crop-{USER}-{FILE}.png") == ("crop", USER)
+
+
+def test_foreign_names_are_not_managed() -> None:
+    assert parse_key("derived/256x256/ab/abcdef0123.webp") is None
+    assert parse_key(f"ab/cd/result-None-{FILE}.png") is None
+    assert parse_key("notes.txt") is None
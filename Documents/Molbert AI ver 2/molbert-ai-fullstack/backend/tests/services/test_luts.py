@@ -0,0 +1,38 @@
+import numpy as np
+
+from app.services.luts import _identity, apply_lut, get_presets, parse_cube
+
+
+def _cube_text(size: int) -> str:
+    # red varies fastest, as in files exported from Resolve
+    lines = [f"LUT_3D_SIZE {size}"]
+    axis = np.linspace(0, 1, size)
+    for b in axis:
+        for g in axis:
+            for r in axis:
+                lines.append(f"{1 - r:.6f} {g:.6f} {b:.6f}")
+    return "\n".join(lines)
+
+
+def test_parse_cube_orders_table_by_red_green_blue() -> None:
+    table = parse_cube(_cube_text(3))
+    assert table.shape == (3, 3, 3, 3)
+    assert np.allclose(table[2, 0, 0], [0.0, 0.0, 0.0])
+    assert np.allclose(table[0, 2, 1], [1.0, 1.0, 0.5])
+
+
+def test_identity_lut_interpolates_exactly() -> None:
+    rng = np.random.default_rng(0)
+    rgb = rng.random((8, 8, 3), dtype=np.float32)
+    assert np.allclose(apply_lut(rgb, _identity(5)), rgb, atol=1e-5)
+
+    inverted = apply_lut(rgb, parse_cube(_cube_text(5)))
+    assert np.allclose(inverted[..., 0], 1 - rgb[..., 0], atol=1e-5)
+
+
+def test_builtin_presets() -> None:
+    presets = get_presets()
+    assert {"bw", "sepia", "film", "teal-orange"} <= presets.keys()
+    rgb = np.array([[[0.8, 0.2, 0.1]]], dtype=np.float32)
+    bw = apply_lut(rgb, presets["bw"].table)
+    assert np.allclose(bw[..., 0], bw[..., 2], atol=1e-5)
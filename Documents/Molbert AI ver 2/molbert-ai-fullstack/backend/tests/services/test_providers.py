@@ -0,0 +1,124 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.providers import HedgeBudget, ProviderRouter
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+def both_configured():
+    with (
+        patch("app.core.config.settings.FAL_API_KEY", "fal-key"),
+        patch("app.core.config.settings.GEMINI_API_KEY", "gemini-key"),
+        patch("app.core.config.settings.GENERATION_PROVIDERS", ["fal", "gemini"]),
+        patch("app.core.config.settings.GENERATION_PROVIDER", "fal"),
+    ):
+        yield
+
+
+def _train(router: ProviderRouter, provider: str, mode: str, seconds: float) -> None:
+    for _ in range(10):
+        router._stats(provider).observe(mode, seconds)
+
+
+def test_rank_prefers_lower_median_per_mode() -> None:
+    router = ProviderRouter()
+    _train(router, "fal", "edit", 40)
+    _train(router, "gemini", "edit", 10)
+    assert router.rank("edit", ["fal", "gemini"]) == ["gemini", "fal"]
+    # no data for this mode: the preferred provider goes first
+    with patch("app.core.config.settings.GENERATION_PROVIDER", "fal"):
+        assert router.rank("compose", ["fal", "gemini"]) == ["fal", "gemini"]
+
+
+def test_failing_provider_cools_down() -> None:
+    router = ProviderRouter()
+    for _ in range(10):
+        router._stats("fal").record(False)
+    assert not router._stats("fal").healthy
+    assert router.rank("edit", ["fal", "gemini"]) == ["gemini"]
+    # nobody healthy: fall back to everyone
+    for _ in range(10):
+        router._stats("gemini").record(False)
+    assert set(router.rank("edit", ["fal", "gemini"])) == {"fal", "gemini"}
+
+
+def test_hedge_budget_limits_spend() -> None:
+    budget = HedgeBudget(ratio=0.5, burst=1)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_spend()
+    assert budget.spent == 2 and budget.denied == 1
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("both_configured")
+async def test_hedged_request_cancels_the_loser() -> None:
+    router = ProviderRouter()
+    router.hedge_delay = lambda provider, mode: 0.01  # type: ignore[method-assign]
+    slow_cancelled = asyncio.Event()
+
+    async def slow() -> str:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            slow_cancelled.set()
+            raise
+        return "fal"
+
+    async def fast() -> str:
+        return "gemini"
+
+    with patch("app.core.config.settings.GENERATION_HEDGE_ENABLED", True):
+        provider, result = await router.run("edit", {"fal": slow, "gemini": fast})
+    assert (provider, result) == ("gemini", "gemini")
+    assert slow_cancelled.is_set()
+    assert router.budget.spent == 1
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("both_configured")
+async def test_no_hedge_without_budget() -> None:
+    router = ProviderRouter()
+    router.budget = HedgeBudget(ratio=0, burst=0)
+    router.hedge_delay = lambda provider, mode: 0.01  # type: ignore[method-assign]
+    calls: list[str] = []
+
+    async def fal() -> str:
+        calls.append("fal")
+        await asyncio.sleep(0.05)
+        return "fal"
+
+    async def gemini() -> str:
+        calls.append("gemini")
+        return "gemini"
+
+    with patch("app.core.config.settings.GENERATION_HEDGE_ENABLED", True):
+        assert await router.run("edit", {"fal": fal, "gemini": gemini}) == (
+            "fal",
+            "fal",
+        )
+    assert calls == ["fal"]
+    assert router.budget.denied == 1
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("both_configured")
+async def test_transient_errors_count_against_the_provider() -> None:
+    router = ProviderRouter()
+
+    async def failing() -> str:
+        raise HTTPException(status_code=503, detail="down")
+
+    with pytest.raises(HTTPException):
+        await router.run("edit", {"fal": failing})
+    assert router._stats("fal").error_rate == 1.0
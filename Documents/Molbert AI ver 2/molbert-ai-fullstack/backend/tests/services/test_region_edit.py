@@ -0,0 +1,64 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.services.region_edit import (
+    composite_sync,
+    crop_sync,
+    crop_window,
+    feather_mask,
+    image_size,
+)
+
+
+def _png(color: tuple[int, int, int], size: tuple[int, int]) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_crop_window_stays_inside_image() -> None:
+    assert crop_window(4000, 3000, 2000, 1500, 768) == (1616, 1116, 2384, 1884)
+    assert crop_window(4000, 3000, 10, 10, 768) == (0, 0, 768, 768)
+    assert crop_window(4000, 3000, 3990, 2990, 768) == (3232, 2232, 4000, 3000)
+    assert crop_window(500, 300, 250, 150, 768) == (0, 0, 500, 300)
+
+
+def test_feather_mask_ramps_only_on_inner_edges() -> None:
+    mask = feather_mask((0, 100, 200, 300), 1000, 1000, feather=10)
+    assert mask.shape == (200, 200)
+    # left edge touches the image border: no ramp there
+    assert mask[100, 0] == 1.0
+    # top/right/bottom are inside the image: ramp to ~0 at the edge
+    assert mask[0, 100] < 0.2
+    assert mask[100, 199] < 0.2
+    assert mask[100, 100] == 1.0
+
+
+def test_composite_changes_only_the_window() -> None:
+    original = _png((0, 0, 0), (400, 400))
+    edited = _png((255, 255, 255), (1024, 1024))
+    result = composite_sync(original, edited, (100, 100, 300, 300), 20, "png")
+    with Image.open(io.BytesIO(result)) as image:
+        pixels = np.asarray(image)
+    assert pixels[10, 10].tolist() == [0, 0, 0]
+    assert pixels[200, 200].tolist() == [255, 255, 255]
+    assert 0 < pixels[101, 200, 0] < 255
+
+
+def test_rotated_sources_are_cropped_as_displayed() -> None:
+    # stored 200x100: red left half, blue right half; orientation 6 turns it
+    # 90° clockwise, so it displays 100x200 with blue at the bottom
+    stored = Image.new("RGB", (200, 100), (255, 0, 0))
+    stored.paste((0, 0, 255), (100, 0, 200, 100))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    stored.save(buffer, format="JPEG", exif=exif, quality=95)
+    data = buffer.getvalue()
+
+    assert image_size(data) == (100, 200)
+    with Image.open(io.BytesIO(crop_sync(data, (0, 100, 100, 200)))) as bottom:
+        red, _, blue = bottom.getpixel((50, 50))
+    assert blue > 200 and red < 50
@@ -0,0 +1,41 @@
+from pathlib import Path
+from unittest.mock import patch
+
+from app.services.source_cache import SourceCache
+
+
+def test_lru_eviction_by_size(tmp_path: Path) -> None:
+    cache = SourceCache(tmp_path, max_bytes=10, url_ttl=60)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"  # a is now most recent
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("c") == b"cccc"
+    assert cache.stats.hits == 3 and cache.stats.misses == 1
+
+
+def test_same_content_is_stored_once(tmp_path: Path) -> None:
+    cache = SourceCache(tmp_path, max_bytes=100, url_ttl=60)
+    assert cache.put("key-1", b"same") == cache.put("key-2", b"same")
+    assert cache.status()["entries"] == 1
+    assert cache.get("key-2") == b"same"
+
+
+def test_entries_survive_restart(tmp_path: Path) -> None:
+    digest = SourceCache(tmp_path, max_bytes=100, url_ttl=60).put("a", b"data")
+    restarted = SourceCache(tmp_path, max_bytes=100, url_ttl=60)
+    restarted.put("a", b"data")
+    assert restarted.status()["entries"] == 1
+    assert restarted.digest_of("a") == digest
+
+
+def test_published_urls_expire(tmp_path: Path) -> None:
+    cache = SourceCache(tmp_path, max_bytes=100, url_ttl=60)
+    digest = cache.put("a", b"data")
+    with patch("app.services.source_cache.time.monotonic", return_value=0.0):
+        cache.remember_url(digest, "https://tmpfiles.org/dl/1/a.png")
+        assert cache.published_url(digest) == "https://tmpfiles.org/dl/1/a.png"
+    with patch("app.services.source_cache.time.monotonic", return_value=61.0):
+        assert cache.published_url(digest) is None
@@ -0,0 +1,146 @@
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.services import storage
+from app.services.cdn_cookies import _cdn_safe_b64
+from app.services.storage import LocalStorageBackend, S3StorageBackend, shard_dir
+
+
+def _s3_backend() -> S3StorageBackend:
+    with (
+        patch("app.core.config.settings.S3_BUCKET", "media"),
+        patch("app.core.config.settings.S3_ACCESS_KEY", "key"),
+        patch("app.core.config.settings.S3_SECRET_KEY", "secret"),
+        patch("app.core.config.settings.S3_ENDPOINT_URL", "http://s3.local"),
+        # .env may point public URLs at a CDN
+        patch("app.core.config.settings.S3_PUBLIC_BASE_URL", None),
+    ):
+        return S3StorageBackend()
+
+
+def test_presigned_urls_are_reused_within_an_expiry_bucket() -> None:
+    backend = _s3_backend()
+    with (
+        patch("app.core.config.settings.S3_URL_MODE", "presigned"),
+        patch("app.core.config.settings.S3_PRESIGN_BUCKET_SECONDS", 900),
+        patch.object(
+            backend.client, "generate_presigned_url", side_effect=["url-1", "url-2"]
+        ) as sign,
+        patch("app.services.storage.time.time", return_value=1000.0),
+    ):
+        assert backend.to_public_url("u/result-1.png") == "url-1"
+        assert backend.to_public_url("u/result-1.png") == "url-1"
+        assert sign.call_count == 1
+        with patch("app.services.storage.time.time", return_value=1900.0):
+            assert backend.to_public_url("u/result-1.png") == "url-2"
+        # provider URLs are never signed
+        assert (
+            backend.to_public_url("https://fal.media/x.png")
+            == "https://fal.media/x.png"
+        )
+
+
+def test_public_mode_builds_plain_urls() -> None:
+    backend = _s3_backend()
+    assert backend.to_public_url("u/result-1.png").endswith("/media/u/result-1.png")
+
+
+def test_presigned_put_cannot_overwrite() -> None:
+    backend = _s3_backend()
+    url = backend.presigned_put("u/upload-1.png", "image/png", 100, 60)
+    signed_headers = parse_qs(urlsplit(url).query)["X-Amz-SignedHeaders"][0]
+    assert {"content-length", "content-type", "if-none-match"} <= set(
+        signed_headers.split(";")
+    )
+
+
+def test_cdn_safe_base64() -> None:
+    assert _cdn_safe_b64(b"\xfb\xff\xfe") == "-~~-"
+    assert _cdn_safe_b64(b"a") == "YQ__"
+
+
+def test_backend_is_built_once_on_first_use() -> None:
+    with (
+        patch("app.services.storage._backend", None),
+        patch("app.services.storage._create_backend", return_value=object()) as create,
+    ):
+        first = storage.get_backend()
+        assert storage.get_backend() is first
+        assert create.call_count == 1
+
+
+def test_operation_metrics_count_latency_and_errors() -> None:
+    metrics = storage.OperationMetrics()
+    with metrics.timed("read"):
+        pass
+    with pytest.raises(RuntimeError), metrics.timed("read"):
+        raise RuntimeError
+    report = metrics.report()
+    assert report["read"]["count"] == 2
+    assert report["read"]["errors"] == 1
+
+
+def test_small_objects_skip_multipart_upload() -> None:
+    backend = _s3_backend()
+    with (
+        patch.object(backend.client, "put_object") as put_object,
+        patch.object(backend.client, "upload_fileobj") as upload,
+        patch("app.core.config.settings.S3_MULTIPART_THRESHOLD", 10),
+    ):
+        backend.put("u/a.png", b"small", "image/png")
+        backend.put("u/b.png", b"x" * 20, "image/png")
+    put_object.assert_called_once()
+    upload.assert_called_once()
+    assert upload.call_args.kwargs["Config"] is backend.transfer_config
+
+
+def test_local_keys_are_sharded_by_uuid(tmp_path: Path) -> None:
+    backend = LocalStorageBackend(tmp_path)
+    key = backend.new_key("image/png", "user-1", "result")
+    shard, name = key.rsplit("/", 1)
+    assert shard == shard_dir(name)
+    assert len(shard.split("/")) == 2
+    assert backend.owns(key, "user-1")
+    assert shard_dir("not-a-uuid.png") is None
+
+
+def test_flat_paths_resolve_after_the_file_is_moved(tmp_path: Path) -> None:
+    backend = LocalStorageBackend(tmp_path)
+    name = f"result-u-{uuid.uuid4()}.png"
+    flat = tmp_path / name
+    flat.write_bytes(b"data")
+    assert backend.read(str(flat)) == b"data"
+
+    moved = tmp_path / str(shard_dir(name)) / name
+    moved.parent.mkdir(parents=True)
+    flat.replace(moved)
+    assert backend.read(str(flat)) == b"data"
+    assert backend.read(name) == b"data"
+    assert backend.local_path(name) == str(moved)
+
+
+def test_local_listing_resumes_after_a_key(tmp_path: Path) -> None:
+    backend = LocalStorageBackend(tmp_path)
+    for key in ["aa/01/x.png", "aa/02/y.png", "bb/01/z.png", "flat.png"]:
+        backend.put(key, b"1", "image/png")
+    keys = [obj.key for obj in backend.list("")]
+    assert keys == ["aa/01/x.png", "aa/02/y.png", "bb/01/z.png", "flat.png"]
+    resumed = [obj.key for obj in backend.list("", start_after="aa/02/y.png")]
+    assert resumed == ["bb/01/z.png", "flat.png"]
+
+
+def test_s3_deletes_in_batches_of_1000() -> None:
+    backend = _s3_backend()
+    keys = [f"u/{i}.png" for i in range(2500)]
+    with patch.object(
+        backend.client,
+        "delete_objects",
+        side_effect=[{}, {"Errors": [{"Key": "u/1500.png"}]}, {}],
+    ) as delete_objects:
+        assert backend.delete_many(keys) == 2499
+    sizes = [len(c.kwargs["Delete"]["Objects"]) for c in delete_objects.call_args_list]
+    assert sizes == [1000, 1000, 500]
@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from app.models import StorageUsage
+from app.services.storage_usage import (
+    check_quota,
+    record_upload,
+    record_usage,
+    record_write,
+    set_usage,
+    top_consumers,
+)
+from tests.utils.user import create_random_user
+
+
+def test_writes_and_deletes_update_counters(db: Session) -> None:
+    user = create_random_user(db)
+    record_write(str(user.id), 300)
+    record_write(str(user.id), 200)
+    record_usage({user.id: (-200, -1)})
+
+    usage = db.get(StorageUsage, user.id)
+    assert usage is not None
+    db.refresh(usage)
+    assert (usage.bytes, usage.objects) == (300, 1)
+
+
+def test_writes_without_owner_are_ignored() -> None:
+    record_write("None", 100)
+
+
+def test_quota_is_checked_per_plan(db: Session) -> None:
+    user = create_random_user(db)
+    set_usage({user.id: (900, 3)})
+    with patch("app.core.config.settings.STORAGE_QUOTA_BYTES", {"free": 1000}):
+        check_quota(db, user, 100)
+        with pytest.raises(HTTPException) as exc:
+            check_quota(db, user, 101)
+    assert exc.value.status_code == 413
+    # plans without a quota are unlimited
+    check_quota(db, user, 10**9)
+
+
+def test_generations_are_refused_once_over_quota(db: Session) -> None:
+    # a generation checks with 0 bytes: its result size is not known yet
+    user = create_random_user(db)
+    with patch("app.core.config.settings.STORAGE_QUOTA_BYTES", {"free": 1000}):
+        set_usage({user.id: (1000, 3)})
+        check_quota(db, user, 0)
+        set_usage({user.id: (1001, 4)})
+        with pytest.raises(HTTPException):
+            check_quota(db, user, 0)
+
+
+def test_top_consumers_are_ordered_by_bytes(db: Session) -> None:
+    small, large = create_random_user(db), create_random_user(db)
+    set_usage({small.id: (10**12, 1), large.id: (10**13, 1)})
+    result = top_consumers(db, limit=2)
+    assert [row.email for row in result.data] == [large.email, small.email]
+
+
+def test_finalized_uploads_are_counted_once(db: Session) -> None:
+    user = create_random_user(db)
+    key = f"{user.id}/upload-1.png"
+    record_upload(key, str(user.id), 400)
+    # another API process, or the same one after its memo forgot the key
+    record_upload(key, str(user.id), 400)
+
+    usage = db.get(StorageUsage, user.id)
+    assert usage is not None
+    db.refresh(usage)
+    assert (usage.bytes, usage.objects) == (400, 1)
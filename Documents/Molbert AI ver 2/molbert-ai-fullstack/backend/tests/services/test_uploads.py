@@ -0,0 +1,102 @@
+import struct
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import uploads
+from app.services.storage import StoredObject
+from app.services.uploads import (
+    finalize_upload,
+    is_upload_key,
+    local_upload_signature,
+    verify_local_upload,
+)
+
+USER = "3f1e9f1c-0000-4000-8000-000000000001"
+
+
+def _png_header(width: int, height: int) -> bytes:
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", 13)
+        + b"IHDR"
+        + struct.pack(">II", width, height)
+        + b"\x08\x02\x00\x00\x00"
+    )
+
+
+def test_local_upload_signature() -> None:
+    expires = int(time.time()) + 60
+    sig = local_upload_signature("upload-u-1.png", "image/png", 100, expires)
+    verify_local_upload("upload-u-1.png", "image/png", 100, expires, sig)
+    with pytest.raises(HTTPException):
+        verify_local_upload("upload-u-1.png", "image/png", 101, expires, sig)
+    with pytest.raises(HTTPException):
+        past = int(time.time()) - 1
+        verify_local_upload(
+            "upload-u-1.png",
+            "image/png",
+            100,
+            past,
+            local_upload_signature("upload-u-1.png", "image/png", 100, past),
+        )
+
+
+def test_is_upload_key() -> None:
+    assert is_upload_key(f"{USER}/upload-abc.png")
+    assert is_upload_key(f"upload-{USER}-abc.png")
+    assert not is_upload_key(f"{USER}/result-abc.png")
+
+
+def _finalize(
+    key: str, header: bytes, size: int, etag: str | None = None
+) -> tuple[object, list[str]]:
+    deleted: list[str] = []
+    with (
+        patch.object(uploads, "owns_key", return_value=True),
+        patch.object(
+            uploads, "stat_key", return_value=StoredObject(key, size, 0.0, etag)
+        ),
+        patch.object(uploads, "read_range", return_value=header),
+        patch.object(uploads, "delete_key", side_effect=deleted.append),
+    ):
+        try:
+            return finalize_upload(key, USER), deleted
+        except HTTPException as exc:
+            return exc, deleted
+
+
+def test_finalize_accepts_valid_image() -> None:
+    result, deleted = _finalize(f"{USER}/upload-ok.png", _png_header(640, 480), 2048)
+    info, size = result  # type: ignore[misc]
+    assert (info.width, info.height, size) == (640, 480, 2048)
+    assert deleted == []
+
+
+def test_finalize_rejects_and_deletes_bad_uploads() -> None:
+    key = f"{USER}/upload-bad.png"
+    result, deleted = _finalize(key, b"not an image at all", 100)
+    assert isinstance(result, HTTPException) and deleted == [key]
+
+    key = f"{USER}/upload-mismatch.jpg"
+    result, deleted = _finalize(key, _png_header(10, 10), 100)
+    assert isinstance(result, HTTPException) and deleted == [key]
+
+    key = f"{USER}/upload-huge.png"
+    result, deleted = _finalize(key, _png_header(10, 10), 50 * 1024 * 1024)
+    assert isinstance(result, HTTPException) and result.status_code == 413
+
+
+def test_upload_rewritten_after_finalize_is_rejected() -> None:
+    key = f"{USER}/upload-rewritten.png"
+    result, _ = _finalize(key, _png_header(64, 64), 2048, etag="v1")
+    assert not isinstance(result, HTTPException)
+    # same object: served from the memo, no header read
+    result, deleted = _finalize(key, b"", 2048, etag="v1")
+    assert not isinstance(result, HTTPException) and deleted == []
+    # overwritten through a still-valid upload URL
+    result, deleted = _finalize(key, _png_header(64, 64), 4096, etag="v2")
+    assert isinstance(result, HTTPException) and result.status_code == 409
+    assert deleted == [key]
@@ -9,6 +9,7 @@ type GenerationEntry = {
   mode: string
   prompt: string
   file_url: string
+  thumbnail_url?: string | null
   created_at: string
 }
 
@@ -74,9 +75,18 @@ export function HistoryPanel({ open, onClose }: HistoryPanelProps) {
                     key={item.id}
                     className="flex items-center gap-4 px-4 py-3 text-sm"
                   >
-                    <div className="flex h-10 w-10 items-center justify-center rounded-lg bg-slate-100 text-[11px] font-semibold uppercase text-slate-600">
-                      {item.mode}
-                    </div>
+                    {item.thumbnail_url ? (
+                      <img
+                        src={item.thumbnail_url}
+                        alt={item.mode}
+                        loading="lazy"
+                        className="h-10 w-10 rounded-lg bg-slate-100 object-cover"
+                      />
+                    ) : (
+                      <div className="flex h-10 w-10 items-center justify-center rounded-lg bg-slate-100 text-[11px] font-semibold uppercase text-slate-600">
+                        {item.mode}
+                      </div>
+                    )}
                     <div className="flex-1">
                       <p className="line-clamp-2 font-semibold text-slate-800">
                         {item.prompt}